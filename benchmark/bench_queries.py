@@ -0,0 +1,189 @@
+#!/bin/env python
+
+import os
+import sys
+import time
+import random
+import shutil
+import logging
+import tempfile
+from argparse import ArgumentParser
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/..')
+from utils.Common  import *
+from utils.Storage import *
+import mm_trackTorque     as tt
+import mm_trackTorqueJobs as tj
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/../external/lib/python')
+from prettytable import PrettyTable
+
+## the queries of the web interface (html/cgi-bin) as (database, name, SQL statement with the placeholders of the time limits)
+QUERIES = [('tt', 'rsrc, last snapshot'        , 'SELECT * from rsrc WHERE timestamp in (SELECT max(timestamp) from rsrc) ORDER BY timestamp DESC,host'),
+           ('tt', 'rsrc, last day'             , 'SELECT * from rsrc WHERE timestamp > %(t_day)d ORDER BY timestamp DESC,host'),
+           ('tt', 'hnode, last day'            , 'SELECT * from hnode WHERE timestamp > %(t_day)d ORDER BY timestamp DESC,host'),
+           ('tt', 'summeas, last week'         , 'SELECT * from summeas WHERE timestamp > %(t_week)d ORDER BY timestamp DESC'),
+           ('tt', 'rsrc, down nodes (-s)'      , "SELECT host FROM rsrc WHERE stat = 'down' AND timestamp in (SELECT max(timestamp) from rsrc)"),
+           ('tj', 'jobs, last week'            , 'SELECT * FROM jobs WHERE (1==1) AND t_submit > %(t_week)d ORDER BY t_submit DESC'),
+           ('tj', 'statistics, last week'      , 'SELECT * FROM statistics WHERE (1==1) AND timestamp > %(t_week)d ORDER BY timestamp DESC'),
+           ('tj', 'accounting, last week'      , 'SELECT * from accounting WHERE timestamp >= %(t_week)d ORDER BY timestamp DESC'),
+           ('tj', 'accounting of a user, month', "SELECT * from accounting WHERE uid == 'user007'AND timestamp >= %(t_month)d ORDER BY timestamp DESC"),
+           ('tj', 'accounting per user, month' , 'SELECT uid,gid,sum(nj_batch),sum(rwt_batch_s),sum(cwt_batch_s),sum(cct_batch_s) from accounting WHERE timestamp >= %(t_month)d GROUP BY uid,gid ORDER BY uid,gid')]
+
+def __fill_trackTorque__(store, t_end, days, nnodes, interval, rnd):
+    '''fill the tables of mm_trackTorque.py with a sample of nnodes nodes every interval seconds over the given days'''
+
+    conn = store.connect()
+
+    nrsrc = len( conn.execute('PRAGMA table_info(rsrc)').fetchall() )
+    nsumm = len( conn.execute('PRAGMA table_info(summeas)').fetchall() )
+    hosts = [ 'dccn-c%03d.dccn.nl' % i for i in xrange(nnodes) ]
+
+    for t in xrange(t_end - days * 86400, t_end, interval):
+        conn.executemany('INSERT INTO rsrc VALUES (%s)' % ','.join(['?'] * nrsrc),
+                         [ [t, h, rnd.choice(['free', 'free', 'job-exclusive', 'down']), 'opteron', '10GigE', 16, 128] +
+                           [ rnd.randint(0, 16) for i in xrange(nrsrc - 7) ] for h in hosts ])
+        conn.executemany('INSERT INTO hnode VALUES (?,?,?,?,?,?,?,?,?,?)',
+                         [ (t, 'mentat%03d.dccn.nl' % i, 16, 256, rnd.randint(0, 30), rnd.random(), rnd.random(), rnd.random(), 500, 'matlab') for i in xrange(8) ])
+        conn.execute('INSERT INTO summeas VALUES (%s)' % ','.join(['?'] * nsumm), [t] + [ rnd.random() for i in xrange(nsumm - 1) ])
+    conn.commit()
+
+def __fill_trackTorqueJobs__(store, t_end, days, njobs, rnd):
+    '''fill the tables of mm_trackTorqueJobs.py with njobs jobs per day, and the daily statistics and accounting of 300 users'''
+
+    conn = store.connect()
+
+    nacct = len( conn.execute('PRAGMA table_info(accounting)').fetchall() )
+    nstat = len( conn.execute('PRAGMA table_info(statistics)').fetchall() )
+
+    for d in xrange(days):
+        t_day = t_end - (days - d) * 86400
+        conn.executemany('INSERT INTO jobs VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)',
+                         [ ('%d.dccn-l029.dccn.nl' % (1000000 + d * njobs + i), 'job_%d' % i, 'C', 0, 'completed', 'user%03d' % rnd.randint(0, 299), 'batch',
+                            4, 3600, 2, 3, 1800, 1700, 'dccn-c001.dccn.nl', t_day + (86400 * i) / njobs, 0, 0, 0) for i in xrange(njobs) ])
+        conn.executemany('INSERT INTO statistics VALUES (%s)' % ','.join(['?'] * nstat),
+                         [ [t_day, q, s] + [ rnd.random() for i in xrange(nstat - 3) ] for q in tj.TORQUE_BATCH_QUEUES for s in ['completed', 'failed'] ])
+        conn.executemany('INSERT INTO accounting VALUES (%s)' % ','.join(['?'] * nacct),
+                         [ [t_day, 'user%03d' % u, 'group%02d' % (u % 30)] + [ rnd.random() for i in xrange(nacct - 3) ] for u in xrange(300) ])
+    conn.commit()
+
+def __time_query__(conn, sql, repeat):
+    '''(number of rows, best elapsed time in ms over repeat runs, query plan) of the query'''
+
+    plan = ' / '.join( [ r[-1] for r in conn.execute('EXPLAIN QUERY PLAN ' + sql) ] )
+
+    dts = []
+    for i in xrange(repeat):
+        t0   = time.time()
+        rows = conn.execute(sql).fetchall()
+        dts.append( time.time() - t0 )
+
+    return len(rows), min(dts) * 1000, plan
+
+## execute the main program
+if __name__ == "__main__":
+
+    parg = ArgumentParser(description='benchmark of the queries of the web interface on the SQLite databases, before and after the schema migrations (indexes)')
+
+    parg.add_argument('-d', '--days',
+                      action  = 'store',
+                      dest    = 'days',
+                      type    = int,
+                      default = 30,
+                      help    = 'number of days of data in the databases, e.g. 365 for a yearly database of mm_trackTorque.py')
+
+    parg.add_argument('-n', '--nodes',
+                      action  = 'store',
+                      dest    = 'nnodes',
+                      type    = int,
+                      default = 100,
+                      help    = 'number of compute nodes sampled by mm_trackTorque.py')
+
+    parg.add_argument('-i', '--interval',
+                      action  = 'store',
+                      dest    = 'interval',
+                      type    = int,
+                      default = 60,
+                      help    = 'sampling interval of mm_trackTorque.py in seconds')
+
+    parg.add_argument('-j', '--jobs',
+                      action  = 'store',
+                      dest    = 'njobs',
+                      type    = int,
+                      default = 10000,
+                      help    = 'number of jobs per day in the database of mm_trackTorqueJobs.py')
+
+    parg.add_argument('-r', '--repeat',
+                      action  = 'store',
+                      dest    = 'repeat',
+                      type    = int,
+                      default = 5,
+                      help    = 'number of runs of each query, the best one is reported')
+
+    parg.add_argument('-t', '--tmpdir',
+                      action  = 'store',
+                      dest    = 'tmpdir',
+                      default = None,
+                      help    = 'directory in which the databases are generated')
+
+    args = parg.parse_args()
+
+    ## settings normally made by the main program of mm_trackTorqueJobs.py
+    tj.TORQUE_BATCH_QUEUES = ['batch', 'short', 'veryshort', 'long', 'verylong', 'test']
+
+    logger = getMyLogger(SQLiteStore.__name__)
+    logger.setLevel(logging.ERROR)
+
+    rnd    = random.Random(0)
+    t_now  = int(time.time()) / args.interval * args.interval
+    params = {'t_day': t_now - 86400, 't_week': t_now - 7 * 86400, 't_month': t_now - 30 * 86400}
+
+    tmpdir = tempfile.mkdtemp(dir=args.tmpdir)
+    try:
+        db_fpaths = {'tt': os.path.join(tmpdir, 'mm_trackTorque_bench.db'),
+                     'tj': os.path.join(tmpdir, 'mm_trackTorqueJobs_bench.db')}
+
+        ## the databases are made with the tables of the scripts (and the accounting table of the old layout) but without
+        ## their migrations, as the existing ones
+        t0 = time.time()
+        store = SQLiteStore(db_fpaths['tt'], tt.SQLite_TABLES)
+        __fill_trackTorque__(store, t_now, args.days, args.nnodes, args.interval, rnd)
+        store.close()
+
+        store = SQLiteStore(db_fpaths['tj'], tj.SQLite_TABLES + [('accounting', tj.__sql_accounting_table__())])
+        __fill_trackTorqueJobs__(store, t_now, args.days, args.njobs, rnd)
+        store.close()
+        print 'databases of %d days generated in %.1f s: %s' % (args.days, time.time() - t0,
+                                                                ', '.join( [ '%s %.1f MB' % (os.path.basename(f), os.path.getsize(f) / 1024.**2) for f in sorted(db_fpaths.values()) ] ))
+
+        results = {}
+        for step in ['before', 'after']:
+            if step == 'after':
+                t0 = time.time()
+                migrate_databases([db_fpaths['tt']], tt.SQLite_TABLES, tt.SQLite_MIGRATIONS)
+                migrate_databases([db_fpaths['tj']], tj.SQLite_TABLES, tj.SQLite_MIGRATIONS)
+                print 'databases migrated in %.1f s' % (time.time() - t0)
+
+            for db in db_fpaths.keys():
+                store = SQLiteStore(db_fpaths[db], [])
+                conn  = store.connect()
+                for d, name, sql in QUERIES:
+                    if d == db:
+                        results[(name, step)] = __time_query__(conn, sql % params, args.repeat)
+                store.close()
+
+        t = PrettyTable()
+        t.field_names = ['query', 'rows', 'before (ms)', 'after (ms)', 'speedup', 'query plan after']
+        for k in t.field_names:
+            t.align[k] = 'r'
+        t.align['query'] = 'l'
+        t.align['query plan after'] = 'l'
+
+        for d, name, sql in QUERIES:
+            n, dt0, plan0 = results[(name, 'before')]
+            n, dt1, plan1 = results[(name, 'after')]
+            t.add_row( [name, n, '%.2f' % dt0, '%.2f' % dt1, '%.1f' % (dt0 / max(dt1, 1e-6)), plan1] )
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print t
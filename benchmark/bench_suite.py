@@ -0,0 +1,135 @@
+#!/bin/env python
+
+import os
+import sys
+import time
+import shutil
+import logging
+import resource
+import tempfile
+import multiprocessing
+from argparse import ArgumentParser, Namespace
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/..')
+from utils.Common  import *
+from utils.Cluster import *
+import mm_trackTorqueJobs as mm
+
+from joblog_generator import write_joblog
+
+sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/../external/lib/python')
+from prettytable import PrettyTable
+
+def __measure__(func, *fargs, **fkwargs):
+    '''run func(*fargs, **fkwargs) in a child process, returns (elapsed time in seconds, increase of peak RSS in MB)
+
+       The child is forked, so it shares the data of the parent (e.g. the JobTable) without copying.'''
+
+    def __run__(conn):
+        ## the per-job warnings on stderr and the tables on stdout are not part of the measurement
+        fd = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(fd, 1)
+        os.dup2(fd, 2)
+
+        rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        t0   = time.time()
+        func(*fargs, **fkwargs)
+        dt   = time.time() - t0
+        rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+        conn.send( (dt, (rss1 - rss0) / 1024.) )
+        conn.close()
+
+    conn_p, conn_c = multiprocessing.Pipe(False)
+    p = multiprocessing.Process(target=__run__, args=(conn_c,))
+    p.start()
+    r = conn_p.recv()
+    p.join()
+
+    return r
+
+## execute the main program
+if __name__ == "__main__":
+
+    parg = ArgumentParser(description='benchmark of the ingest, accounting and statistics of completed jobs against the number of jobs per day')
+
+    parg.add_argument('-s', '--sizes',
+                      action  = 'store',
+                      dest    = 'sizes',
+                      default = '1000,10000,100000',
+                      help    = 'comma-separated numbers of jobs per day to benchmark, e.g. 1000,10000,100000,1000000,5000000')
+
+    parg.add_argument('-r', '--retry',
+                      action  = 'store',
+                      dest    = 'retry',
+                      type    = float,
+                      default = 0.05,
+                      help    = 'fraction of jobs having a retried entry in the log file')
+
+    parg.add_argument('-m', '--missing',
+                      action  = 'store',
+                      dest    = 'missing',
+                      type    = float,
+                      default = 0.02,
+                      help    = 'fraction of jobs missing fields in the log file')
+
+    parg.add_argument('-t', '--tmpdir',
+                      action  = 'store',
+                      dest    = 'tmpdir',
+                      default = None,
+                      help    = 'directory in which the log files are generated, it needs ~1 kB per job')
+
+    args = parg.parse_args()
+
+    ## settings normally made by the main program of mm_trackTorqueJobs.py
+    date = '20140101'
+    mm.args                = Namespace(jobdate=date, monitor=False)
+    mm.logger              = getMyLogger('mm_trackTorqueJobs.py')
+    mm.TORQUE_BATCH_QUEUES = ['batch', 'short', 'veryshort', 'long', 'verylong', 'test']
+    mm.logger.setLevel(logging.ERROR)
+
+    t = PrettyTable()
+    t.field_names = ['jobs/day', 'log size (MB)', 'step', 'time (s)', 'jobs/s', 'peak RSS increase (MB)']
+    for k in t.field_names:
+        t.align[k] = 'r'
+    t.align['step'] = 'l'
+
+    tmpdir = tempfile.mkdtemp(dir=args.tmpdir)
+    try:
+        for n in map(int, args.sizes.split(',')):
+            fpath = os.path.join(tmpdir, date)
+            write_joblog(fpath, n, date, args.retry, args.missing)
+            fsize = '%.1f' % (os.path.getsize(fpath) / 1024.**2)
+
+            steps = [('ingest (Job objects)'         , get_complete_jobs      , (tmpdir, date), {}),
+                     ('ingest (JobTable)'            , get_complete_jobs_table, (tmpdir, [date]), {}),
+                     ('ingest (JobTable, projection)', get_complete_jobs_table, (tmpdir, [date]), {'fields': mm.ANALYSIS_JOB_ATTRS})]
+
+            for s, func, fargs, fkwargs in steps:
+                dt, drss = __measure__(func, *fargs, **fkwargs)
+                t.add_row( [n, fsize, s, '%.2f' % dt, '%.0f' % (n / dt), '%.1f' % drss] )
+
+            ## accounting and statistics are measured on the JobTable made beforehand
+            fd_err = os.dup(2)
+            fd_nul = os.open(os.devnull, os.O_WRONLY)
+            os.dup2(fd_nul, 2)
+            try:
+                jobs = get_complete_jobs_table(tmpdir, [date])
+            finally:
+                os.dup2(fd_err, 2)
+                os.close(fd_err)
+                os.close(fd_nul)
+
+            steps = [('accounting', mm.__get_accounting__ , (jobs,)),
+                     ('statistics', mm.__get_statistics__ , (jobs,))]
+
+            for s, func, fargs in steps:
+                dt, drss = __measure__(func, *fargs)
+                t.add_row( [n, fsize, s, '%.2f' % dt, '%.0f' % (n / dt), '%.1f' % drss] )
+
+            del jobs
+            os.unlink(fpath)
+    finally:
+        shutil.rmtree(tmpdir)
+
+    print t
@@ -0,0 +1,201 @@
+#!/bin/env python
+
+import os
+import sys
+import time
+import random
+import datetime
+from argparse import ArgumentParser
+
+## queues and their relative share of the jobs
+JOBLOG_QUEUES = [('batch'      , 10),
+                 ('short'      , 30),
+                 ('veryshort'  , 20),
+                 ('long'       , 15),
+                 ('verylong'   ,  3),
+                 ('test'       ,  2),
+                 ('interactive', 12),
+                 ('matlab'     ,  6),
+                 ('vgl'        ,  2)]
+
+## exit codes and their relative share of the jobs
+JOBLOG_EXIT_CODES = [(0, 80), (1, 8), (2, 2), (127, 1), (137, 1), (265, 3), (271, 5)]
+
+def __weighted__(choices):
+    '''expand (value, weight) pairs into a list to pick values from with random.choice'''
+    l = []
+    for v, w in choices:
+        l += [v] * w
+    return l
+
+def iter_joblog(njobs, date='20140101', retry_fraction=0.05, missing_fraction=0.02, nusers=300, seed=0):
+    '''generator yielding the <Jobinfo> blocks (as strings) of a torque job log of njobs jobs submitted on the given date
+
+       The blocks come with the quirks of the torque job logs: there is no root element, the job id is in
+       a <JobId> tag, the <Variable_List> blob contains unescaped XML characters and may span over multiple
+       lines, a fraction of jobs (retry_fraction) is retried and logged again with partial information, and
+       a fraction of jobs (missing_fraction) misses fields (e.g. jobs deleted before being started).'''
+
+    rnd = random.Random(seed)
+
+    queues     = __weighted__(JOBLOG_QUEUES)
+    exit_codes = __weighted__(JOBLOG_EXIT_CODES)
+
+    ## each user belongs to one group
+    users = [ ('user%03d' % i, 'group%02d' % rnd.randint(0, max(1, nusers / 10))) for i in xrange(nusers) ]
+
+    t_day = int(time.mktime(datetime.datetime.strptime(date, '%Y%m%d').timetuple()))
+
+    for i in xrange(njobs):
+        jid       = '%d.dccn-l029.dccn.nl' % (1000000 + i)
+        uid, gid  = rnd.choice(users)
+        queue     = rnd.choice(queues)
+        t_submit  = t_day + (86400 * i) / njobs
+        t_start   = t_submit + int(rnd.expovariate(1/300.))
+        rwtime    = rnd.choice([3600, 3600, 7200, 86400, 259200])
+        cwtime    = rnd.randint(1, rwtime)
+        cctime    = int( cwtime * rnd.uniform(0, 1.1) * rnd.choice([1, 1, 1, 4]) )
+        rmem      = rnd.choice([1, 2, 4, 8, 16, 32])
+        cmem      = rnd.randint(1024, rmem * 1024**2)
+        cvmem     = cmem + rnd.randint(0, 1024**2)
+        missing   = rnd.random() < missing_fraction
+
+        b = ['<Jobinfo>',
+             '    <JobId>%s</JobId>' % jid,
+             '    <Job_Name>%s_%d</Job_Name>' % (queue, i),
+             '    <Job_Owner>%s@mentat%03d.dccn.nl</Job_Owner>' % (uid, rnd.randint(1, 10))]
+
+        ## jobs deleted before being started have no resource consumption
+        if not missing:
+            b += ['    <resources_used>',
+                  '        <cput>%d</cput>' % cctime,
+                  '        <mem>%dkb</mem>' % cmem,
+                  '        <vmem>%dkb</vmem>' % cvmem,
+                  '        <walltime>%d</walltime>' % cwtime,
+                  '    </resources_used>']
+
+        b += ['    <job_state>C</job_state>',
+              '    <queue>%s</queue>' % queue]
+
+        if missing and rnd.random() < 0.5:
+            b += ['    <Resource_List/>']
+        else:
+            b += ['    <Resource_List>',
+                  '        <mem>%dgb</mem>' % rmem,
+                  '        <walltime>%d</walltime>' % rwtime,
+                  '    </Resource_List>']
+
+        ## the environment of the job is written as it is, without escaping
+        env = 'PBS_O_QUEUE=%s,PBS_O_HOME=/home/%s/%s,PBS_O_WORKDIR=/home/%s/%s/project,PBS_O_LOGNAME=%s' % (queue, gid, uid, gid, uid, uid)
+        r = rnd.random()
+        if r < 0.05:
+            env += ',PS1=<\\u@\\h \\W>$ ,PROMPT_COMMAND=history -a && history -n'
+        elif r < 0.07:
+            env += ',FUNC=() {  echo "<done>"\n}'
+        b += ['    <Variable_List>%s</Variable_List>' % env,
+              '    <egroup>%s</egroup>' % gid,
+              '    <Hold_Types>n</Hold_Types>',
+              '    <Join_Path>oe</Join_Path>']
+
+        if not missing:
+            b += ['    <exec_host>dccn-c%03d.dccn.nl/%d</exec_host>' % (rnd.randint(1, 100), rnd.randint(0, 15))]
+
+        b += ['    <exit_status>%d</exit_status>' % (-1 if missing else rnd.choice(exit_codes)),
+              '    <ctime>%d</ctime>' % t_submit,
+              '    <qtime>%d</qtime>' % t_submit]
+
+        if not missing:
+            b += ['    <start_time>%d</start_time>' % t_start]
+
+        b += ['    <comp_time>%d</comp_time>' % (t_start + cwtime),
+              '</Jobinfo>\n']
+
+        yield '\n'.join(b)
+
+        ## the retried job is logged again, with the information of the new run only
+        if rnd.random() < retry_fraction:
+            yield '\n'.join(['<Jobinfo>',
+                             '    <JobId>%s</JobId>' % jid,
+                             '    <Job_Name>%s_%d</Job_Name>' % (queue, i),
+                             '    <resources_used>',
+                             '        <cput>%d</cput>' % (cctime / 2),
+                             '        <mem>%dkb</mem>' % cmem,
+                             '        <vmem>%dkb</vmem>' % cvmem,
+                             '        <walltime>%d</walltime>' % cwtime,
+                             '    </resources_used>',
+                             '    <job_state>C</job_state>',
+                             '    <exec_host>dccn-c%03d.dccn.nl/%d</exec_host>' % (rnd.randint(1, 100), rnd.randint(0, 15)),
+                             '    <exit_status>%d</exit_status>' % rnd.choice(exit_codes),
+                             '    <start_time>%d</start_time><comp_time>%d</comp_time>' % (t_start + cwtime, t_start + 2 * cwtime),
+                             '</Jobinfo>\n'])
+
+def write_joblog(fpath, njobs, date='20140101', retry_fraction=0.05, missing_fraction=0.02, nusers=300, seed=0):
+    '''write a torque job log file of njobs jobs submitted on the given date, see iter_joblog'''
+
+    f = open(fpath, 'w')
+    try:
+        for b in iter_joblog(njobs, date, retry_fraction, missing_fraction, nusers, seed):
+            f.write(b)
+    finally:
+        f.close()
+
+## execute the main program
+if __name__ == "__main__":
+
+    parg = ArgumentParser(description='generate synthetic torque job log files for testing and benchmarking')
+
+    parg.add_argument('-n', '--njobs',
+                      action  = 'store',
+                      dest    = 'njobs',
+                      type    = int,
+                      default = 10000,
+                      help    = 'number of jobs per day, e.g. from 1000 up to 5000000')
+
+    parg.add_argument('-d', '--date',
+                      action  = 'store',
+                      dest    = 'date',
+                      default = '20140101',
+                      help    = 'date of the first log file in a format of, e.g. 20140101')
+
+    parg.add_argument('-p', '--period',
+                      action  = 'store',
+                      dest    = 'period',
+                      type    = int,
+                      default = 1,
+                      help    = 'number of days (i.e. log files) to generate, forward from -d|--date')
+
+    parg.add_argument('-r', '--retry',
+                      action  = 'store',
+                      dest    = 'retry',
+                      type    = float,
+                      default = 0.05,
+                      help    = 'fraction of jobs having a retried entry in the log file')
+
+    parg.add_argument('-m', '--missing',
+                      action  = 'store',
+                      dest    = 'missing',
+                      type    = float,
+                      default = 0.02,
+                      help    = 'fraction of jobs missing fields in the log file')
+
+    parg.add_argument('-u', '--users',
+                      action  = 'store',
+                      dest    = 'nusers',
+                      type    = int,
+                      default = 300,
+                      help    = 'number of job owners')
+
+    parg.add_argument('-o', '--outdir',
+                      action  = 'store',
+                      dest    = 'outdir',
+                      default = os.getcwd(),
+                      help    = 'directory in which the log files are written')
+
+    args = parg.parse_args()
+
+    d_beg = datetime.datetime.strptime(args.date, '%Y%m%d')
+    for d in xrange(args.period):
+        date  = (d_beg + datetime.timedelta(days=d)).strftime('%Y%m%d')
+        fpath = os.path.join(args.outdir, date)
+        write_joblog(fpath, args.njobs, date, args.retry, args.missing, args.nusers, seed=d)
+        print '%s: %d jobs, %.1f MB' % (fpath, args.njobs, os.path.getsize(fpath) / 1024.**2)
@@ -20,38 +20,73 @@ import pprint
 
 sys.path.append( os.path.dirname(os.path.abspath(__file__)) + '/../../' )
 from utils.Common  import *
+from utils.Shards  import *
 
-def __qry_accounting_data__(db_fpath, table, clause=''):
-    '''gets data from SQLite database'''
+## queue categories and job status of the accounting data, with their keys in the output
+ACCOUNTING_QCATS  = ['matlab', 'batch', 'inter', 'vgl']
+ACCOUNTING_CSTATS = [('s', 'csuccess'), ('f', 'cfailed'), ('k', 'killed')]
+ACCOUNTING_TIMES  = [('rwt', 'rwtime'), ('cwt', 'cwtime'), ('cct', 'cctime')]
 
-    conn = sqlite3.connect(db_fpath)
-    conn.row_factory = sqlite3.Row
-    c    = conn.cursor()
-    qry  = 'SELECT * from %s' % table
+def __new_user_data__(uid, gid):
+    '''accounting data of a user without jobs'''
 
-    data = []
+    d = {'uid': uid, 'gid': gid, 't_beg': sys.maxint, 't_end': 0}
+    for c in ACCOUNTING_QCATS:
+        d[c] = {'nj': 0}
+        for m, v in ACCOUNTING_TIMES:
+            for k, s in ACCOUNTING_CSTATS:
+                d[c]['%s_%s' % (m,k)] = 0.
 
-    if clause:
-        qry += ' WHERE %s' % clause
-  
-    ## output is sorted by timestamp
-    qry += ' ORDER BY timestamp DESC'
+    return d
 
-    logger.debug('SQL query: %s' % qry)
+def __qry_accounting_data__(catalog, t_min=None):
+    '''gets data from the SQLite databases in the catalog, summed up per user over the days
+
+       The facts (accounting_fact) are summed per user, queue category and job status, and the sums are
+       put in the layout of the accounting view here (with the times in hours); the rows of the days
+       stored before the fact table (accounting_legacy) are in that layout already.'''
+
+    cstats = dict( [ (s,k) for k,s in ACCOUNTING_CSTATS ] )
+
+    data = {}
+
+    def __user__(r):
+        d = data.setdefault( (r['uid'], r['gid']), __new_user_data__(r['uid'], r['gid']) )
+        d['t_beg'] = min(d['t_beg'], r['t_beg'])
+        d['t_end'] = max(d['t_end'], r['t_end'])
+        return d
 
     try:
-        for r in c.execute(qry):
-            d = {}
-            for k in r.keys():
-                d[k] = r[k]
-            data.append(d)
+        columns = ['uid', 'gid', 'qcat', 'cstat', 'min(timestamp) AS t_beg', 'max(timestamp) AS t_end', 'sum(njobs) AS nj']
+        columns += [ 'sum(%s_sum) AS %s' % (v,m) for m, v in ACCOUNTING_TIMES ]
+
+        for r in catalog.query('accounting_fact', order_by=[], t_min=t_min, columns=columns, group_by=['uid', 'gid', 'qcat', 'cstat']):
+            d = __user__(r)
+            if r['qcat'] not in ACCOUNTING_QCATS:
+                continue
+
+            d[r['qcat']]['nj'] += r['nj']
+            if r['cstat'] in cstats:
+                for m, v in ACCOUNTING_TIMES:
+                    d[r['qcat']]['%s_%s' % (m, cstats[r['cstat']])] += r[m] / 3600.
+
+        columns = ['uid', 'gid', 'min(timestamp) AS t_beg', 'max(timestamp) AS t_end']
+        for c in ACCOUNTING_QCATS:
+            columns.append( 'sum(nj_%s) AS nj_%s' % (c,c) )
+            columns += [ 'sum(%s_%s_%s) AS %s_%s_%s' % (m,c,k,m,c,k) for m, v in ACCOUNTING_TIMES for k, s in ACCOUNTING_CSTATS ]
+
+        for r in catalog.query('accounting_legacy', where='timestamp NOT IN (SELECT timestamp FROM accounting_fact)', order_by=[], t_min=t_min,
+                               columns=columns, group_by=['uid', 'gid']):
+            d = __user__(r)
+            for c in ACCOUNTING_QCATS:
+                d[c]['nj'] += r['nj_%s' % c]
+                for m, v in ACCOUNTING_TIMES:
+                    for k, s in ACCOUNTING_CSTATS:
+                        d[c]['%s_%s' % (m,k)] += r['%s_%s_%s' % (m,c,k)]
     except sqlite3.OperationalError,e:
         logger.warning('SQL error: %s' % repr(e))
 
-    if conn:
-        conn.close()
-
-    return data  
+    return [ data[k] for k in sorted(data.keys()) ]
 
 def cgiFieldStorageToDict( fieldStorage ):
     """Get a plain dictionary, rather than the '.value' system used by the cgi module."""
@@ -74,9 +109,7 @@ if __name__ == "__main__":
 
     ### get HTTP parameters ###
     params = cgiFieldStorageToDict( cgi.FieldStorage() )
-    clause = ''
-    table  = 'accounting'
-  
+
     t_delta  = 60
     try:
         t_delta = float(params['period'])
@@ -85,51 +118,15 @@ if __name__ == "__main__":
 
     ## determine the minimun timestamp for the query
     t_min = datetime.date.today() - datetime.timedelta(days=t_delta) 
-    clause  = 'timestamp >= %d' % time.mktime(t_min.timetuple())
-
-    ## ad-hoc class allowing quick record identification
-    class HashDict(dict):
-        def __hash__(self):
-            return hash()
-        def __eq__(self,other):
-            return self['uid'] == other['uid'] and self['gid'] == other['gid']
-
-    data = []
-    for d in getTimeInvolvement(mode='month', tdelta='-%fD' % t_delta):
-        sql_db_path = '%s/mm_trackTorqueJobs_%s.db' % (DB_DATA_DIR, d)
-        logger.debug( 'retrieving data from %s ... ' % sql_db_path )
-        if os.path.exists( sql_db_path ):
-            data += map( lambda x:HashDict(x), __qry_accounting_data__(sql_db_path, table=table, clause=clause) )
+    t_min = int( time.mktime(t_min.timetuple()) )
+
+    catalog = ShardCatalog(DB_DATA_DIR, 'mm_trackTorqueJobs', period='month')
 
     ### sum up accounting of different days
-    beg_t = sys.maxint
-    end_t = 0
- 
-    merged_data = []
-    for d in data:
-        if d['timestamp'] < beg_t:
-            beg_t = d['timestamp']
-
-        if d['timestamp'] > end_t:
-            end_t = d['timestamp']
-       
-        del d['timestamp']  ## remove useless timestamp in the merged data 
-
-        for c in ['matlab', 'batch', 'inter', 'vgl']:
-            d[c] = {'nj'    : d['nj_%s' % c],
-                    'rwt_s' : d['rwt_%s_s' % c], 'rwt_f' : d['rwt_%s_f' % c], 'rwt_k' : d['rwt_%s_k' % c],
-                    'cwt_s' : d['cwt_%s_s' % c], 'cwt_f' : d['cwt_%s_f' % c], 'cwt_k' : d['cwt_%s_k' % c],
-                    'cct_s' : d['cct_%s_s' % c], 'cct_f' : d['cct_%s_f' % c], 'cct_k' : d['cct_%s_k' % c]}
-        try:
-            idx = merged_data.index(d)
-            ## add up values to the existing entry 
-            for c in ['matlab', 'batch', 'inter', 'vgl']:
-                for k in d[c].keys():
-                    merged_data[idx][c][k] += d[c][k]
-
-        except ValueError, e:
-            ## initialize a new entry
-            merged_data.append( dict(filter(lambda i:i[0] in ['uid','gid','matlab','batch','inter','vgl'], d.iteritems())) )
+    merged_data = __qry_accounting_data__(catalog, t_min=t_min)
+
+    beg_t = min( [ sys.maxint ] + [ d.pop('t_beg') for d in merged_data ] )
+    end_t = max( [ 0 ]          + [ d.pop('t_end') for d in merged_data ] )
 
     logger.info( 'number of data rows: %d' % len(merged_data) )
     logger.info( 'first data row: %s'      % repr(merged_data[0]) )
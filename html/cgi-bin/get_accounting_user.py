@@ -20,27 +20,16 @@ import pprint
 
 sys.path.append( os.path.dirname(os.path.abspath(__file__)) + '/../../' )
 from utils.Common  import *
+from utils.Shards  import *
 
-def __qry_accounting_data__(db_fpath, table, clause=''):
-    '''gets data from SQLite database'''
-
-    conn = sqlite3.connect(db_fpath)
-    conn.row_factory = sqlite3.Row
-    c    = conn.cursor()
-    qry  = 'SELECT * from %s' % table
+def __qry_accounting_data__(catalog, table, clause='', params=(), t_min=None):
+    '''gets data from the SQLite databases in the catalog'''
 
     data = []
 
-    if clause:
-        qry += ' WHERE %s' % clause
-  
     ## output is sorted by timestamp
-    qry += ' ORDER BY timestamp DESC'
-
-    logger.debug('SQL query: %s' % qry)
-
     try:
-        for r in c.execute(qry):
+        for r in catalog.query(table, where=clause, params=params, order_by=[('timestamp', 'DESC')], t_min=t_min):
             d = {}
             for k in r.keys():
                 d[k] = r[k]
@@ -48,9 +37,6 @@ def __qry_accounting_data__(db_fpath, table, clause=''):
     except sqlite3.OperationalError,e:
         logger.warning('SQL error: %s' % repr(e))
 
-    if conn:
-        conn.close()
-
     return data  
 
 def cgiFieldStorageToDict( fieldStorage ):
@@ -143,11 +129,11 @@ if __name__ == "__main__":
         pass 
 
     ## limit to the given user
-    clause = "uid == '%s'" % params['uid']
+    clause = 'uid == ?'
 
     ## limit to the specified time range
     t_min = datetime.date.today() - datetime.timedelta(days=t_delta) 
-    clause += 'AND timestamp >= %d' % time.mktime(t_min.timetuple())
+    t_min = int( time.mktime(t_min.timetuple()) )
 
     ## limit to jobs in certain queue 
     queue = 'all'
@@ -156,12 +142,9 @@ if __name__ == "__main__":
     except KeyError, e:
         pass
 
-    data  = []
-    for d in getTimeInvolvement(mode='month', tdelta='-%fD' % t_delta):
-        sql_db_path = '%s/mm_trackTorqueJobs_%s.db' % (DB_DATA_DIR, d)
-        logger.debug( 'retrieving data from %s ... ' % sql_db_path )
-        if os.path.exists( sql_db_path ):
-            data += getReducedData( __qry_accounting_data__(sql_db_path, table=table, clause=clause), queue )
+    catalog = ShardCatalog(DB_DATA_DIR, 'mm_trackTorqueJobs', period='month')
+
+    data  = getReducedData( __qry_accounting_data__(catalog, table=table, clause=clause, params=(params['uid'],), t_min=t_min), queue )
    
     ## try to get gid from the retrieved data
     gid = ''
@@ -19,28 +19,16 @@ import pprint
 
 sys.path.append( os.path.dirname(os.path.abspath(__file__)) + '/../../' )
 from utils.Common  import *
+from utils.Shards  import *
 
-def __get_jobs_data__(db_fpath, table, c_timestamp, clauses):
-    '''gets data from SQLite database'''
-
-    conn = sqlite3.connect(db_fpath)
-    conn.row_factory = sqlite3.Row
-    c    = conn.cursor()
-    qry  = 'SELECT * FROM %s WHERE (1==1)' % table
+def __get_jobs_data__(catalog, table, c_timestamp, clauses, params=(), t_min=None):
+    '''gets data from the SQLite databases in the catalog'''
 
     data = []
 
-    ## composing the query clause
-    for cls in clauses:
-        qry += ' AND %s' % cls
-
     ## output is sorted by timestamp
-    qry += ' ORDER BY %s DESC' % c_timestamp
-
-    logger.debug('SQL query: %s' % qry)
-
     try:
-        for r in c.execute(qry):
+        for r in catalog.query(table, where=' AND '.join(clauses), params=params, order_by=[(c_timestamp, 'DESC')], column=c_timestamp, t_min=t_min):
             d = {}
             for k in r.keys():
                 d[k] = r[k]
@@ -48,9 +36,6 @@ def __get_jobs_data__(db_fpath, table, c_timestamp, clauses):
     except sqlite3.OperationalError,e:
         logger.warning('SQL error: %s' % repr(e))
 
-    if conn:
-        conn.close()
-
     return data  
 
 def cgiFieldStorageToDict( fieldStorage ):
@@ -81,13 +66,15 @@ if __name__ == "__main__":
     c_timestamp = 'timestamp'
 
     clauses = []
+    cparams = []
 
     ## search for a specific job id in a given period
     try:
         if params['jid']:
             table       = 'jobs'
             c_timestamp = 't_submit'
-            clauses.append('jid like \'%%%s%%\'' % params['jid'])
+            clauses.append('jid like ?')
+            cparams.append('%%%s%%' % params['jid'])
     except KeyError, e:
         pass 
 
@@ -96,7 +83,8 @@ if __name__ == "__main__":
         if params['jname']:
             table       = 'jobs'
             c_timestamp = 't_submit'
-            clauses.append('jname like \'%%%s%%\'' % params['jname'])
+            clauses.append('jname like ?')
+            cparams.append('%%%s%%' % params['jname'])
     except KeyError, e:
         pass 
 
@@ -112,16 +100,12 @@ if __name__ == "__main__":
     if 'period' not in params.keys():
         params['period'] = 7
   
-    try:
-        clauses.append('%s > %d' % (c_timestamp, int(time.time() - 86400*float(params['period']))))
-    except KeyError, e:
-        pass 
+    t_min = int(time.time() - 86400*float(params['period'])) + 1
 
-    data = []
-    for d in getTimeInvolvement(mode='month', tdelta='-%fD' % float(params['period'])):
-        sql_db_path = '%s/mm_trackTorqueJobs_%s.db' % (DB_DATA_DIR, d)
-        logger.info( 'retrieving data from %s ... ' % sql_db_path )
-        data += __get_jobs_data__(sql_db_path, table=table, c_timestamp=c_timestamp, clauses=clauses)
+    catalog = ShardCatalog(DB_DATA_DIR, 'mm_trackTorqueJobs', period='month')
+
+    logger.info( 'retrieving data from table %s ... ' % table )
+    data = __get_jobs_data__(catalog, table=table, c_timestamp=c_timestamp, clauses=clauses, params=cparams, t_min=t_min)
 
     ### merge data from the same day into one row
     if table == 'statistics':
@@ -12,31 +12,23 @@ import cgi
 
 sys.path.append( os.path.dirname(os.path.abspath(__file__)) + '/../../' )
 from utils.Common  import *
+from utils.Storage import *
+from utils.Shards  import *
 
-def __get_data_sqlite__(db_fpath, table, clause=''):
-    '''gets data from SQLite database'''
+def __get_data_sqlite__(catalog, table, t_min=None, t_max=None):
+    '''gets data from the SQLite databases in the catalog'''
 
-    conn = sqlite3.connect(db_fpath)
-    conn.row_factory = sqlite3.Row
-    c    = conn.cursor()
-    qry  = 'SELECT * from %s' % table
-
-    data = []
-
-    if clause:
-        qry += ' WHERE %s' % clause
-  
     ## output is sorted by timestamp
-    qry += ' ORDER BY timestamp DESC'
+    order_by = [('timestamp', 'DESC')]
+
+    ## for resource table (and its rollups), also sort by host
+    if table.split('_')[0] == 'rsrc':
+        order_by.append( ('host', 'ASC') )
 
-    ## for resource table, also sort by host
-    if table == 'rsrc':
-        qry += ',host'
- 
-    logger.debug('SQL query: %s' % qry)
+    data = []
 
     try:
-        for r in c.execute(qry):
+        for r in catalog.query(table, order_by=order_by, t_min=t_min, t_max=t_max):
             d = {}
             for k in r.keys():
                 d[k] = r[k]
@@ -44,9 +36,6 @@ def __get_data_sqlite__(db_fpath, table, clause=''):
     except sqlite3.OperationalError,e:
         logger.warning('SQL error: %s' % repr(e))
 
-    if conn:
-        conn.close()
-
     return data  
 
 def cgiFieldStorageToDict( fieldStorage ):
@@ -67,15 +56,27 @@ if __name__ == "__main__":
     ## load config file and global settings
     c = getConfig( os.path.dirname(os.path.abspath(__file__)) + '/../../etc/config.ini' )
     DB_DATA_DIR = c.get('TorqueTracker','DB_DATA_DIR')
+    RETENTION   = {'raw': int( c.get('TorqueTracker','SQLITE_RETENTION_RAW') ),
+                   '5m' : int( c.get('TorqueTracker','SQLITE_RETENTION_5M') ),
+                   '1h' : int( c.get('TorqueTracker','SQLITE_RETENTION_1H') ),
+                   '1d' : int( c.get('TorqueTracker','SQLITE_RETENTION_1D') )}
+
+    catalog = ShardCatalog(DB_DATA_DIR, 'mm_trackTorque', period='year')
 
     ### get HTTP parameters ###
     params = cgiFieldStorageToDict( cgi.FieldStorage() )
-    clause = ''
+    t_min  = None
+    t_max  = None
     table  = 'rsrc'
   
     try:
         if params['mode'] == 'last':
-            clause = 'timestamp in (SELECT max(timestamp) from rsrc)'
+            ## the latest snapshot of the nodes in the latest database
+            t_last = 0
+            for f, b in catalog.shards()[-1:]:
+                t_last = ( catalog.bounds(f, 'rsrc') or [0, 0] )[1]
+            t_min  = t_last
+            t_max  = t_last + 1
     except KeyError, e:
         pass 
 
@@ -91,18 +92,38 @@ if __name__ == "__main__":
     except KeyError, e:
         pass 
 
-    t_delta  = 1
+    ## the data of a period is taken from the rollup table of the finest resolution giving a
+    ## reasonable number of points (e.g. hourly for 30 days), unless the resolution is given
+    resolution = 'raw'
+    try:
+        t_delta    = float(params['period'])
+        t_min      = int(time.time() - 86400*t_delta) + 1
+        t_max      = None
+        resolution = rollup_resolution(86400*t_delta, RETENTION)
+    except KeyError, e:
+        pass
+
+    ## without period, the data of the yearly database of the day before is taken (i.e. of the current year, except on the 1st of January)
+    if t_min is None:
+        t_min = int( time.mktime( datetime.date.fromtimestamp(time.time() - 86400).replace(month=1, day=1).timetuple() ) )
+
     try:
-        t_delta = float(params['period'])
-        clause  = 'timestamp > %d' % int(time.time() - 86400*t_delta)
+        if params['resolution'] in ['raw'] + map(lambda x:x[0], Rollup.RESOLUTIONS):
+            resolution = params['resolution']
     except KeyError, e:
         pass 
 
-    data    = []
-    for d in getTimeInvolvement(mode='year', tdelta='-%fD' % t_delta):
-        sql_db_path = '%s/mm_trackTorque_%s.db' % (DB_DATA_DIR, d)
-        logger.debug( 'retrieving data from %s ... ' % sql_db_path )
-        data += __get_data_sqlite__(sql_db_path, table=table, clause=clause)
+    ## the rollup tables of a database are filled by the polls from the upgrade on, and for the rows before
+    ## by --migrate; the raw table is used throughout unless the rollups cover the period in every database
+    if resolution != 'raw':
+        rollup = '%s_%s' % (table, resolution)
+        span   = dict(Rollup.RESOLUTIONS)[resolution]
+        bounds = dict( catalog.shards(rollup, t_min=t_min) )
+        if all( [ f in bounds and bounds[f][0] <= max(b[0], t_min) / span * span for f, b in catalog.shards(table, t_min=t_min) ] ):
+            table = rollup
+
+    logger.debug( 'retrieving data from table %s ... ' % table )
+    data = __get_data_sqlite__(catalog, table, t_min, t_max)
 
     body = json.dumps(data)
 
@@ -4,6 +4,10 @@ import subprocess
 import datetime
 import sys
 import os
+import time
+import math
+import heapq
+import signal
 import glob
 import tempfile
 import pprint
@@ -18,21 +22,75 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from utils.Common  import *
 from utils.Shell   import *
 from utils.Cluster import *
+from utils.Scheduler import *
+from utils.Cache     import *
+from utils.Storage   import *
+from utils.Shards    import *
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/external/lib/python')
 from prettytable import PrettyTable
 
-def __sqlite_cnode_status__(nodes):
-    '''saving cluster node status into SQLite database'''
-
-    conn    = sqlite3.connect(SQLite_DB_PATH)
-    c       = conn.cursor()
+## tables of the SQLite database, created when the database is opened
+SQLite_TABLES = [('rsrc'   , '''CREATE TABLE IF NOT EXISTS rsrc (timestamp INTEGER, host TEXT, stat TEXT, cpu TEXT, net TEXT, ncores INTEGER, mem INTEGER, ncores_inter INTEGER, ncores_matlab INTEGER, ncores_vgl INTEGER, ncores_batch INTEGER, ncores_left INTEGER, mem_left INTEGER, is_interactive BOOLEAN, is_matlab BOOLEAN, is_vgl BOOLEAN, is_batch BOOLEAN, UNIQUE (timestamp,host))'''),
+                 ('hnode'  , '''CREATE TABLE IF NOT EXISTS hnode (timestamp INTEGER, host TEXT, ncores INTEGER, mem INTEGER, nxvnc INTEGER, load_1m REAL, load_5m REAL, load_10m REAL, total_ps INTEGER, top_ps TEXT, UNIQUE (timestamp,host))'''),
+                 ('summeas', 'CREATE TABLE IF NOT EXISTS summeas ('   +
+                             'timestamp         INTEGER,'      +  # timestamp
+                             'cores_total       INTEGER,'      +  # no. total cores
+                             'cores_idle        INTEGER,'      +  # no. idling cores
+                             'memleft_pcore_u33 REAL,'         +  # mean of memory left per core over nodes with <= 32 GB memory
+                             'memleft_pcore_o32 REAL,'         +  # mean of memory left per core over nodes with  > 32 GB memory
+                             'memleft_pcore_all REAL,'         +  # mean of memory left per core over all nodes
+                             'memleft_pcore_inter    REAL,'    +  # mean of memory left per core over nodes with interactive jobs
+                             'memleft_pcore_noninter REAL,'    +  # mean of memory left per core over nodes with batch jobs
+                             'memreq_all      REAL,'           +  # mean of memory requirement over all jobs
+                             'memreq_inter    REAL,'           +  # mean of memory requirement over interactive jobs
+                             'memreq_noninter REAL,'           +  # mean of memory requirement over batch jobs
+                             'wtreq_all       INTEGER,'        +  # mean of wallclock time requirement over all jobs
+                             'wtreq_inter     INTEGER,'        +  # mean of wallclock time requirement over interactive jobs
+                             'wtreq_noninter  INTEGER,'        +  # mean of wallclock time requirement over batch jobs
+                             'njobs_inter     INTEGER,'        +  # number of interactive jobs
+                             'njobs_noninter  INTEGER,'        +  # number of batch jobs
+                             'njobs_running   INTEGER,'        +  # number of running jobs
+                             'njobs_queue     INTEGER,'        +  # number of queued jobs
+                             'njobs_exiting   INTEGER)'        ), # number of exiting jobs
+                 ('collect', '''CREATE TABLE IF NOT EXISTS collect (timestamp INTEGER, collector TEXT, t_start REAL, t_end REAL, UNIQUE (timestamp,collector))''')]
+
+## downsampled copies of the node and summary time series, updated by the commit of each poll
+SQLite_ROLLUPS = [Rollup('rsrc'   , ['host'], ['ncores', 'mem', 'ncores_inter', 'ncores_matlab', 'ncores_vgl', 'ncores_batch', 'ncores_left', 'mem_left',
+                                              'is_interactive', 'is_matlab', 'is_vgl', 'is_batch'], ['stat', 'cpu', 'net']),
+                  Rollup('hnode'  , ['host'], ['ncores', 'mem', 'nxvnc', 'load_1m', 'load_5m', 'load_10m', 'total_ps'], ['top_ps']),
+                  Rollup('summeas', []      , ['cores_total', 'cores_idle', 'memleft_pcore_u33', 'memleft_pcore_o32', 'memleft_pcore_all',
+                                               'memleft_pcore_inter', 'memleft_pcore_noninter', 'memreq_all', 'memreq_inter', 'memreq_noninter',
+                                               'wtreq_all', 'wtreq_inter', 'wtreq_noninter', 'njobs_inter', 'njobs_noninter',
+                                               'njobs_running', 'njobs_queue', 'njobs_exiting'])]
+
+for r in SQLite_ROLLUPS:
+    SQLite_TABLES += r.tables()
+
+## schema migrations of the SQLite database as (version, description, SQL statements), applied when the database is opened;
+## the queries on the timestamp of rsrc and hnode (and the latest snapshot, max(timestamp)) use the index of UNIQUE (timestamp,host);
+## the rollup tables are created with the tables, the rows before them are rolled up by --migrate rather than by the poll
+SQLite_MIGRATIONS = [(1, 'index on the timestamp of summeas', ['CREATE INDEX IF NOT EXISTS summeas_timestamp ON summeas (timestamp)']),
+                     (2, 'rollup tables of rsrc, hnode and summeas', [])]
+
+## SQLite database kept open across the polls of the daemon mode
+SQLite_STORE = None
+
+def __sqlite_store__():
+    '''SQLiteStore of the database at SQLite_DB_PATH, kept open across polls and reopened when the path changes (i.e. a new year)'''
+
+    global SQLite_STORE
+
+    if SQLite_STORE is None or SQLite_STORE.fpath != SQLite_DB_PATH:
+        if SQLite_STORE:
+            SQLite_STORE.close()
+        SQLite_STORE = SQLiteStore(SQLite_DB_PATH, SQLite_TABLES, SQLite_MIGRATIONS, SQLite_ROLLUPS, SQLITE_RETENTION,
+                                   journal_mode=SQLITE_JOURNAL_MODE, debug=libDebug)
+
+    return SQLite_STORE
 
-    try:
-        sql = '''CREATE TABLE rsrc (timestamp INTEGER, host TEXT, stat TEXT, cpu TEXT, net TEXT, ncores INTEGER, mem INTEGER, ncores_inter INTEGER, ncores_matlab INTEGER, ncores_vgl INTEGER, ncores_batch INTEGER, ncores_left INTEGER, mem_left INTEGER, is_interactive BOOLEAN, is_matlab BOOLEAN, is_vgl BOOLEAN, is_batch BOOLEAN, UNIQUE (timestamp,host))'''
-        c.execute(sql)
-    except sqlite3.OperationalError,e:
-        logger.warning('SQL error: %s' % repr(e)) 
+def __sqlite_cnode_status__(nodes):
+    '''saving cluster node status into SQLite database, the rows are written by the commit at the end of the poll'''
 
     sql  = '''INSERT INTO rsrc (timestamp,host,stat,cpu,net,ncores,mem,ncores_inter,ncores_matlab,ncores_vgl,ncores_batch,ncores_left,mem_left,is_interactive,is_matlab,is_vgl,is_batch) VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)'''
     data = []
@@ -42,30 +100,12 @@ def __sqlite_cnode_status__(nodes):
 
     logger.debug(data)
 
-    ## insert and commit multiple rows into the table
-    try:
-        c.executemany(sql, data)
-        conn.commit()
-    except Exception, e:
-        print e
-        conn.rollback()
-
-    ## close the database connection 
-    if conn:
-        conn.close()
- 
+    __sqlite_store__().stage('rsrc', data, sql)
+
     return
 
 def __sqlite_hnode_status__(nodes):
-    '''saving head(mentat) node status into SQLite database'''
-
-    conn    = sqlite3.connect(SQLite_DB_PATH)
-    c       = conn.cursor()
-    try:
-        sql = '''CREATE TABLE hnode (timestamp INTEGER, host TEXT, ncores INTEGER, mem INTEGER, nxvnc INTEGER, load_1m REAL, load_5m REAL, load_10m REAL, total_ps INTEGER, top_ps TEXT, UNIQUE (timestamp,host))'''
-        c.execute(sql)
-    except sqlite3.OperationalError,e:
-        logger.warning('SQL error: %s' % repr(e)) 
+    '''saving head(mentat) node status into SQLite database, the rows are written by the commit at the end of the poll'''
 
     sql  = '''INSERT INTO hnode (timestamp,host,ncores,mem,nxvnc,load_1m,load_5m,load_10m,total_ps,top_ps) VALUES (?,?,?,?,?,?,?,?,?,?)'''
     data = []
@@ -78,18 +118,8 @@ def __sqlite_hnode_status__(nodes):
 
     logger.debug(data)
 
-    ## insert and commit multiple rows into the table
-    try:
-        c.executemany(sql, data)
-        conn.commit()
-    except Exception, e:
-        print e
-        conn.rollback()
-
-    ## close the database connection 
-    if conn:
-        conn.close()
- 
+    __sqlite_store__().stage('hnode', data, sql)
+
     return
 
 def __tab_cnode_status__(nodes):
@@ -188,6 +218,8 @@ def __tab_hnode_status__(nodes):
         # TODO: maybe mark the host with ncore=0 as 'down' 
         if n.ncores > 0:
             t.add_row( [n.host, n.ncores, n.mem, n.nxvnc, n.load_10m, n.total_ps] )
+        elif getattr(n, 'stat', None) == 'down':
+            t.add_row( [n.host, 'down', '-', '-', '-', '-'] )
 
     print t
 
@@ -215,23 +247,15 @@ def __sendmail_cnode_down__(cnodes):
     """
 
     # retrieve those nodes already down in previous iteration
-    conn = sqlite3.connect(SQLite_DB_PATH)
-    c = conn.cursor()
     qry = 'SELECT host FROM rsrc WHERE stat = \'down\' AND timestamp in (SELECT max(timestamp) from rsrc)'
 
     cnodes_prev = []
     try:
-        for r in c.execute(qry):
+        for r in __sqlite_store__().query(qry):
              cnodes_prev.append(r[0])
-    except sqlite3.OperationalError,e:
+    except sqlite3.Error,e:
          logger.warning('SQL error: %s' % repr(e))
 
-    try:
-        if conn:
-            conn.close()
-    except:
-        pass
-
     # filter out nodes that are already down in previous iteration
     cnodes_notify = list(set(cnodes) - set(cnodes_prev))
 
@@ -241,35 +265,7 @@ def __sendmail_cnode_down__(cnodes):
         sendEmailNotification('admin@dccn-l018.dccn.nl', NOTIFICATION_EMAILS, subject, msg)
 
 def __sqlite_summeas__( summeas ):
-    '''report statistical measurement into SQLite database'''
-    conn    = sqlite3.connect(SQLite_DB_PATH)
-    c       = conn.cursor()
-    try:
-        sql = 'CREATE TABLE summeas ('       
-        sql+= 'timestamp         INTEGER,'      # timestamp
-        sql+= 'cores_total       INTEGER,'      # no. total cores
-        sql+= 'cores_idle        INTEGER,'      # no. idling cores
-        sql+= 'memleft_pcore_u33 REAL,'         # mean of memory left per core over nodes with <= 32 GB memory
-        sql+= 'memleft_pcore_o32 REAL,'         # mean of memory left per core over nodes with  > 32 GB memory
-        sql+= 'memleft_pcore_all REAL,'         # mean of memory left per core over all nodes
-        sql+= 'memleft_pcore_inter    REAL,'    # mean of memory left per core over nodes with interactive jobs
-        sql+= 'memleft_pcore_noninter REAL,'    # mean of memory left per core over nodes with batch jobs
-        sql+= 'memreq_all      REAL,'           # mean of memory requirement over all jobs
-        sql+= 'memreq_inter    REAL,'           # mean of memory requirement over interactive jobs
-        sql+= 'memreq_noninter REAL,'           # mean of memory requirement over batch jobs
-        sql+= 'wtreq_all       INTEGER,'        # mean of wallclock time requirement over all jobs
-        sql+= 'wtreq_inter     INTEGER,'        # mean of wallclock time requirement over interactive jobs
-        sql+= 'wtreq_noninter  INTEGER,'        # mean of wallclock time requirement over batch jobs
-        sql+= 'njobs_inter     INTEGER,'        # number of interactive jobs
-        sql+= 'njobs_noninter  INTEGER,'        # number of batch jobs
-        sql+= 'njobs_running   INTEGER,'        # number of running jobs
-        sql+= 'njobs_queue     INTEGER,'        # number of queued jobs
-        sql+= 'njobs_exiting   INTEGER)'        # number of exiting jobs
-
-        c.execute(sql)
-
-    except sqlite3.OperationalError,e:
-        logger.warning('SQL error: %s' % repr(e)) 
+    '''report statistical measurement into SQLite database, the rows are written by the commit at the end of the poll'''
 
     sql  = '''INSERT INTO summeas VALUES (?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?,?)'''
     data = []
@@ -286,18 +282,23 @@ def __sqlite_summeas__( summeas ):
 
     logger.debug(data)
 
-    ## insert and commit multiple rows into the table
-    try:
-        c.executemany(sql, data)
-        conn.commit()
-    except Exception, e:
-        print e
-        conn.rollback()
-
-    ## close the database connection 
-    if conn:
-        conn.close()
- 
+    __sqlite_store__().stage('summeas', data, sql)
+
+    return
+
+def __sqlite_collect_time__( timing ):
+    '''saving the start and end time of the collectors of the snapshot into SQLite database, the rows are written by the commit at the end of the poll'''
+
+    sql  = '''INSERT INTO collect (timestamp,collector,t_start,t_end) VALUES (?,?,?,?)'''
+    data = []
+
+    for name, (t_start, t_end) in sorted( timing.iteritems() ):
+        data.append( (int(time.mktime(now.timetuple())), name, t_start, t_end) )
+
+    logger.debug(data)
+
+    __sqlite_store__().stage('collect', data, sql)
+
     return
 
 def __tab_jstat__(jlist):
@@ -330,30 +331,54 @@ def report_jstat(jlist):
     if args.rpt_jstat:
         __tab_jstat__(jlist)
 
-def __tab_jqueued__(jlist):
-    '''reporting queued jobs'''
-    fs = get_fs(s_cmd=BIN_FSHARE_ALL, debug=libDebug)
+def __index_user_jobs__(jobs):
+    '''index the running jobs by user, in a single pass over the jobs
+
+       It returns a dictionary of uid -> dictionary with
+         - njobs : number of running jobs of the user
+         - nproc : number of job slots taken by the user
+         - mem   : memory requested by the running jobs of the user'''
+
+    uidx = {}
+    for j in jobs:
+        try:
+            i = uidx[j.uid]
+        except KeyError, e:
+            i = uidx[j.uid] = {'njobs': 0, 'nproc': 0, 'mem': 0}
+
+        i['njobs'] += 1
+        i['nproc'] += len(j.node)
+        i['mem']   += j.rmem
+
+    return uidx
+
+def __tab_jqueued__(jlist, fs, uidx):
+    '''reporting queued jobs, with the fairshare of the users as from get_fs and their running jobs as from __index_user_jobs__
+
+       The jobs are sorted here rather than by PrettyTable, so that only the page of -k|--top jobs
+       given by -p|--page is put in the table.'''
 
     t = PrettyTable()
-    t.field_names = ['job id','req. mem','req. wall time','queue','user fairshare','user running jobs']
-    t.align['job id']            = 'l'
-    t.align['req. mem']          = 'r'
-    t.align['req. wall time']    = 'r'
-    t.align['queue']             = 'l'
-    t.align['user running jobs'] = 'r'
-    t.align['user fairshare']    = 'r'
-
-    t.reversesort = False
+    t.field_names = ['job id','req. mem','req. wall time','queue','user fairshare','user running jobs','user running cores','user running mem']
+    t.align['job id']             = 'l'
+    t.align['req. mem']           = 'r'
+    t.align['req. wall time']     = 'r'
+    t.align['queue']              = 'l'
+    t.align['user running jobs']  = 'r'
+    t.align['user fairshare']     = 'r'
+    t.align['user running cores'] = 'r'
+    t.align['user running mem']   = 'r'
+
     if args.sortby == 'rmem':
-        t.sortby = 'req. mem'
+        sortindex = 1
     elif args.sortby == 'rwtime':
-        t.sortby = 'req. wall time'
+        sortindex = 2
     elif args.sortby == 'queue':
-        t.sortby = 'queue'
+        sortindex = 3
     elif args.sortby == 'fs':
-        t.sortby = 'user fairshare'
+        sortindex = 4
     else:
-        t.sortby = 'job id'
+        sortindex = 0
 
     qlist = []
 
@@ -363,185 +388,169 @@ def __tab_jqueued__(jlist):
         except KeyError,e:
             pass
 
+    if args.user:
+        qlist = filter(lambda x:x.uid == args.user, qlist)
+
+    u_none = {'njobs': 0, 'nproc': 0, 'mem': 0}
+
+    rows = []
     for j in qlist:
         u_fs = None 
         try:
             u_fs = fs['user'][j.uid]
         except KeyError,e:
             u_fs = 0.
-        u_running = len( filter(lambda x:x.uid == j.uid, jlist['R']) )
+        u_running = uidx.get(j.uid, u_none)
+
+        rows.append( [j.jid, j.rmem, j.rtime, j.queue, u_fs, u_running['njobs'], u_running['nproc'], u_running['mem']] )
+
+    ## sorted on the column as PrettyTable does, ties are resolved by the whole row
+    key = lambda x:(x[sortindex], x)
+    if args.top > 0:
+        rows = heapq.nsmallest(args.top * args.page, rows, key=key)[args.top * (args.page - 1):]
+    else:
+        rows = sorted(rows, key=key)
 
-        t.add_row( [j.jid, j.rmem, j.rtime, j.queue, u_fs, u_running] )
+    for r in rows:
+        t.add_row(r)
 
     print t
 
-def report_jqueued(jlist):
+    if args.top > 0:
+        print 'page %d of %d (%d queued jobs)' % (args.page, max(1, int(math.ceil(len(qlist) / float(args.top)))), len(qlist))
+
+def report_jqueued(jlist, fs, uidx):
     '''reporting queued jobs'''
     if args.rpt_jqueued:
-        __tab_jqueued__(jlist)
+        __tab_jqueued__(jlist, fs, uidx)
 
-## execute the main program
-if __name__ == "__main__":
+def __index_running_jobs__(jobs):
+    '''index the running jobs by the host of their nodes, in a single pass over the jobs
 
-    parg = ArgumentParser(description='script for collecting resource utilization of running jobs', version="0.1")
+       It returns a dictionary of host -> dictionary with
+         - nproc : number of job slots taken on the host
+         - mem   : memory blocked on the host, the requested memory of a job is divided over its slots
+         - inter, matlab, vgl, batch : number of jobs of each queue category having slots on the host'''
 
-    parg.add_argument('-l','--loglevel',
-                      action  = 'store',
-                      dest    = 'verbose',
-                      choices = ['-1', '0', '1', '2'],  ## choices work only with str
-                      default = '0',
-                      help    = 'set one of the following verbosity levels. -1:ERROR, 0|default:WARNING, 1:INFO, 2:DEBUG')
+    jidx = {}
+    for j in jobs:
 
-    parg.add_argument('-c', '--config',
-                      action  = 'store',
-                      dest    = 'fconfig',
-                      default = os.path.dirname(os.path.abspath(__file__)) + '/etc/config.ini',
-                      help    = 'set the configuration parameters, see "config.ini"')
+        ## number of slots of the job per host
+        nslots = {}
+        for h in j.node:
+            nslots[h] = nslots.get(h, 0) + 1
 
-    parg.add_argument('-m', '--monitor',
-                      action  = 'store_true',
-                      dest    = 'monitor',
-                      default = False,
-                      help    = 'store data in SQLite database for monitoring purpose.')
+        for h, n in nslots.iteritems():
+            try:
+                i = jidx[h]
+            except KeyError, e:
+                i = jidx[h] = {'nproc': 0, 'mem': 0, 'inter': 0, 'matlab': 0, 'vgl': 0, 'batch': 0}
 
-    parg.add_argument('-r', '--rpt_rsrc',
-                      action  = 'store_true',
-                      dest    = 'rpt_rsrc',
-                      default = False,
-                      help    = 'report current cluster resource availability')
+            i['nproc'] += n
+            i['mem']   += j.rmem * n / len(j.node)
 
-    parg.add_argument('-j', '--rpt_jstat',
-                      action  = 'store_true',
-                      dest    = 'rpt_jstat',
-                      default = False,
-                      help    = 'account jobs in different status')
+            if j.queue == 'interact':
+                i['inter']  += 1
+            if j.queue == 'matlab':
+                i['matlab'] += 1
+            if j.queue == 'vgl':
+                i['vgl']    += 1
+            if j.queue in TORQUE_BATCH_QUEUES:
+                i['batch']  += 1
 
-    parg.add_argument('-q', '--rpt_jqueued',
-                      action  = 'store_true',
-                      dest    = 'rpt_jqueued',
-                      default = False,
-                      help    = 'summarize queued jobs')
+    return jidx
 
-    parg.add_argument('-o', '--order',
-                      action  = 'store',
-                      dest    = 'sortby',
-                      choices = ['node', 'net', 'tcores', 'tmem','ucores','umem','lcores','lmem','interact','matlab','batch','vgl','rmem','rwtime','queue','fs'],  ## choices work only with str
-                      default = 'node',
-                      help    = 'specify the key to sort the table of the resource availability (i.e. -r) and the table of queued jobs (i.e. -q)')
+def poll():
+    '''collect, report and store one snapshot of the cluster'''
 
-    parg.add_argument('-n', '--no-color',
-                      action  = 'store_false',
-                      dest    = 'color',
-                      default = True,
-                      help    = 'disable table coloring')
-
-    parg.add_argument('-s', '--sendmail',
-                      action  = 'store_true',
-                      dest    = 'sendmail',
-                      default = False,
-                      help    = 'enable sending notification emails at certain circumstances')
-
-    global args 
-#    global TORQUE_LOG_DIR
-    global BIN_QSTAT_ALL
-    global BIN_FSHARE_ALL
-    global DB_DATA_DIR
-    global libDebug
-    global logger
     global now
     global SQLite_DB_PATH
-    global TORQUE_BATCH_QUEUES
-    global NOTIFICATION_EMAILS
-
-    args = parg.parse_args()
 
-    ## load config file and global settings
-    c = getConfig(args.fconfig)
-#    TORQUE_LOG_DIR   = c.get('TorqueTracker','TORQUE_LOG_DIR') 
-    BIN_QSTAT_ALL       = c.get('TorqueTracker','BIN_QSTAT_ALL')
-    BIN_FSHARE_ALL      = c.get('TorqueTracker','BIN_FSHARE_ALL')
-    DB_DATA_DIR         = c.get('TorqueTracker','DB_DATA_DIR')
-    TORQUE_BATCH_QUEUES = c.get('TorqueTracker','TORQUE_BATCH_QUEUES').split(',')
-    NOTIFICATION_EMAILS = c.get('TorqueTracker','NOTIFICATION_EMAILS').split(',')
-
-    SQLite_DB_PATH   = os.path.join( DB_DATA_DIR, '%s_%d.db' % (os.path.basename(__file__).replace('.py',''), datetime.datetime.now().year) )
+    ## get current time
+    now = datetime.datetime.now()
 
-    ## load logger and set the verbosity level
-    logger = getMyLogger(os.path.basename(__file__))
-    logger.setLevel(logging.WARNING)
-    vlv = int(args.verbose)
-    libDebug = False
-    if vlv < 0:
-        logger.setLevel(logging.ERROR)
-    elif vlv == 1:
-        logger.setLevel(logging.INFO)
-    elif vlv >= 2:
-        logger.setLevel(logging.DEBUG)
-        libDebug = True
+    ## the database of the year of the poll
+    SQLite_DB_PATH = SQLite_SHARDS.path(now)
 
-    ## create directories whenever necessary
-    if args.monitor:
-        try:
-            os.makedirs(DB_DATA_DIR)
-        except Exception, e:
-            logger.warning('creating directory error: %s' % repr(e))
-            pass
- 
-        if not os.path.isdir(DB_DATA_DIR):
-            logger.error('directory not found: %s' % DB_DATA_DIR)
-            sys.exit(1) 
+    ## run the collectors concurrently, so that they sample the cluster at about the same moment
+    sched = Scheduler(nthreads=5, debug=libDebug)
+    if COLLECTOR_FORMAT == 'xml':
+        sched.submit('qstat'    , get_qstat_jobs_xml         , s_cmd=BIN_QSTAT_XML, debug=libDebug)
+    else:
+        sched.submit('qstat'    , get_qstat_jobs             , s_cmd=BIN_QSTAT_ALL, debug=libDebug)
+    if metadata:
+        sched.submit('torqueconfig', metadata.get            , 'node_speeds', lambda:get_cluster_node_speeds(debug=libDebug))
+    else:
+        sched.submit('torqueconfig', get_cluster_node_speeds , debug=libDebug)
+    if COLLECTOR_FORMAT == 'xml':
+        ## pbsnodes -x gives the state and the properties of the nodes at once, they are not cached
+        sched.submit('pbsnodes' , get_cluster_node_properties_xml, s_cmd=BIN_PBSNODES_XML, speeds={}, debug=libDebug)
+    else:
+        sched.submit('pbsnodes' , get_cluster_nodes          , metadata=metadata, speeds={}, debug=libDebug)
+    if MENTAT_HOSTS:
+        sched.submit('mentat'   , get_mentat_nodes           , MENTAT_HOSTS, s_cmd=MENTAT_PROBE_CMD, timeout=MENTAT_TIMEOUT,
+                                                               nthreads=MENTAT_NTHREADS, debug=libDebug)
+    else:
+        sched.submit('mentat'   , get_mentat_node_properties , debug=libDebug)
+    if args.rpt_jqueued and metadata:
+        sched.submit('fairshare', metadata.get               , 'fairshare', lambda:get_fs(s_cmd=BIN_FSHARE_ALL, debug=libDebug))
+    elif args.rpt_jqueued:
+        sched.submit('fairshare', get_fs                     , s_cmd=BIN_FSHARE_ALL, debug=libDebug)
+    sched.run()
 
-    ## get current time
-    now = datetime.datetime.now()
+    jlist = sched.result('qstat')
 
-    jlist = get_qstat_jobs(s_cmd=BIN_QSTAT_ALL, debug=libDebug)
+    fs = None
+    if args.rpt_jqueued:
+        fs = sched.result('fairshare')
 
     report_jstat(jlist)
 
-    report_jqueued(jlist)
+    # index the running jobs by user once, rather than per queued job
+    report_jqueued(jlist, fs, __index_user_jobs__( jlist.get('R', []) ))
 
     # initialize with an empty array when there are no running jobs
     if 'R' not in jlist.keys():
         jlist['R'] = []
         #sys.exit()
 
-    # get list of active nodes on which the jobs are running
-    #jnodes = set(map(lambda x:x.node, jlist['R']))
-    jnodes = set(sum(map(lambda x:x.node, jlist['R']),[]))
+    # index the running jobs by node, in a single pass over the jobs
+    jidx = __index_running_jobs__(jlist['R'])
 
     # get list of nodes with interactive jobs
-    #interactivenodes = set( map(lambda x:x.node, filter(lambda x:x.queue=='interact', jlist['R'])) )
-    interactivenodes = set(sum( map(lambda x:x.node, filter(lambda x:x.queue=='interact', jlist['R'])),[] ))
+    interactivenodes = set( filter(lambda x:jidx[x]['inter'] > 0, jidx) )
   
     # get list of nodes available on the cluster 
-    now    = datetime.datetime.now()
-    cnodes = get_cluster_node_properties(debug=libDebug)
-    hnodes = get_mentat_node_properties(debug=libDebug)
+    cnodes = sched.result('pbsnodes')
+    hnodes = sched.result('mentat')
+    set_cluster_node_speeds(cnodes, sched.result('torqueconfig'))
+
+    # index the cluster nodes by host, the first one is taken if a host is listed twice
+    cidx = {}
+    for n in cnodes:
+        cidx.setdefault(n.host, n)
 
     # loop through running nodes
-    for node in sorted(jnodes):
+    for node in sorted(jidx):
 
         # get the node info
         cnode = None
         try:
-            cnode = cnodes[ cnodes.index( Node(host=node) ) ]
-        except ValueError, e:
+            cnode = cidx[node]
+        except KeyError, e:
             logger.warning('node %s not found in the cluster' % node) 
             continue
  
-        # collect blocked memory per node
-
-        blockedproc = sum(map(lambda x:x.node.count(node), jlist['R']))
-
+        # collect blocked cores and memory per node
         # TODO: for MPI jobs, the memory allocation per core may need to be divided to number of cores
-        #blockedmem  = sum(map(lambda x:x.rmem, filter(lambda x:node in x.node, jlist['R'])))
-        blockedmem  = sum(map(lambda x:(x.rmem*x.node.count(node)/len(x.node)), filter(lambda x:node in x.node, jlist['R'])))
+        blockedproc = jidx[node]['nproc']
+        blockedmem  = jidx[node]['mem']
 
         cnode.ncores_idle   = cnode.ncores_idle - blockedproc
-        cnode.ncores_inter  = len( filter(lambda x:x.queue=='interact'            and cnode.host in x.node, jlist['R'] ) )
-        cnode.ncores_matlab = len( filter(lambda x:x.queue=='matlab'              and cnode.host in x.node, jlist['R'] ) )
-        cnode.ncores_vgl    = len( filter(lambda x:x.queue=='vgl'                 and cnode.host in x.node, jlist['R'] ) )
-        cnode.ncores_batch  = len( filter(lambda x:x.queue in TORQUE_BATCH_QUEUES and cnode.host in x.node, jlist['R'] ) )
+        cnode.ncores_inter  = jidx[node]['inter']
+        cnode.ncores_matlab = jidx[node]['matlab']
+        cnode.ncores_vgl    = jidx[node]['vgl']
+        cnode.ncores_batch  = jidx[node]['batch']
 
         # update supported job type according to running job types on the node
         cnode.interactive = cnode.ncores_inter  > 0 or cnode.interactive
@@ -682,6 +691,10 @@ if __name__ == "__main__":
 
     if args.monitor:
         __sqlite_summeas__( summeas )
+        __sqlite_collect_time__( sched.timing )
+
+        ## all tables of the snapshot in one transaction
+        __sqlite_store__().commit()
 
 #    ## write current measurement into pickle file
 #    data = {}
@@ -731,3 +744,241 @@ if __name__ == "__main__":
 #    # close database
 #    db.commit()
 #    db.close()
+
+def run_daemon(interval):
+    '''stay resident and poll every interval seconds, aligned to the wall-clock boundaries of the interval
+
+       A poll that overruns the interval coalesces the ticks it missed into the next boundary;
+       a failing poll is logged and does not stop the daemon.  On SIGTERM, the daemon stops after
+       the ongoing poll.'''
+
+    stop = []
+    signal.signal(signal.SIGTERM, lambda signum, frame: stop.append(signum))
+
+    while not stop:
+        t = time.time()
+        time.sleep( (math.floor(t / interval) + 1) * interval - t )
+        if stop:
+            break
+
+        t0 = time.time()
+        try:
+            poll()
+        except Exception, e:
+            logger.exception('poll failed: %s' % repr(e))
+        dt = time.time() - t0
+
+        if dt > interval:
+            logger.warning('poll took %.1f s, skipped %d tick(s) of %d s' % (dt, int(dt / interval), interval))
+
+## execute the main program
+if __name__ == "__main__":
+
+    parg = ArgumentParser(description='script for collecting resource utilization of running jobs', version="0.1")
+
+    parg.add_argument('-l','--loglevel',
+                      action  = 'store',
+                      dest    = 'verbose',
+                      choices = ['-1', '0', '1', '2'],  ## choices work only with str
+                      default = '0',
+                      help    = 'set one of the following verbosity levels. -1:ERROR, 0|default:WARNING, 1:INFO, 2:DEBUG')
+
+    parg.add_argument('-c', '--config',
+                      action  = 'store',
+                      dest    = 'fconfig',
+                      default = os.path.dirname(os.path.abspath(__file__)) + '/etc/config.ini',
+                      help    = 'set the configuration parameters, see "config.ini"')
+
+    parg.add_argument('-m', '--monitor',
+                      action  = 'store_true',
+                      dest    = 'monitor',
+                      default = False,
+                      help    = 'store data in SQLite database for monitoring purpose.')
+
+    parg.add_argument('-r', '--rpt_rsrc',
+                      action  = 'store_true',
+                      dest    = 'rpt_rsrc',
+                      default = False,
+                      help    = 'report current cluster resource availability')
+
+    parg.add_argument('-j', '--rpt_jstat',
+                      action  = 'store_true',
+                      dest    = 'rpt_jstat',
+                      default = False,
+                      help    = 'account jobs in different status')
+
+    parg.add_argument('-q', '--rpt_jqueued',
+                      action  = 'store_true',
+                      dest    = 'rpt_jqueued',
+                      default = False,
+                      help    = 'summarize queued jobs')
+
+    parg.add_argument('-u', '--user',
+                      action  = 'store',
+                      dest    = 'user',
+                      default = None,
+                      help    = 'summarize only the queued jobs of the given user, it implies -q|--rpt_jqueued')
+
+    parg.add_argument('-k', '--top',
+                      action  = 'store',
+                      dest    = 'top',
+                      type    = int,
+                      default = 0,
+                      help    = 'show only the first K queued jobs in the order of -o|--order (i.e. one page of K jobs), 0 for all jobs')
+
+    parg.add_argument('-p', '--page',
+                      action  = 'store',
+                      dest    = 'page',
+                      type    = int,
+                      default = 1,
+                      help    = 'show the given page of -k|--top queued jobs, counting from 1')
+
+    parg.add_argument('-o', '--order',
+                      action  = 'store',
+                      dest    = 'sortby',
+                      choices = ['node', 'net', 'tcores', 'tmem','ucores','umem','lcores','lmem','interact','matlab','batch','vgl','rmem','rwtime','queue','fs'],  ## choices work only with str
+                      default = 'node',
+                      help    = 'specify the key to sort the table of the resource availability (i.e. -r) and the table of queued jobs (i.e. -q)')
+
+    parg.add_argument('-n', '--no-color',
+                      action  = 'store_false',
+                      dest    = 'color',
+                      default = True,
+                      help    = 'disable table coloring')
+
+    parg.add_argument('-s', '--sendmail',
+                      action  = 'store_true',
+                      dest    = 'sendmail',
+                      default = False,
+                      help    = 'enable sending notification emails at certain circumstances')
+
+    parg.add_argument('-d', '--daemon',
+                      action  = 'store_true',
+                      dest    = 'daemon',
+                      default = False,
+                      help    = 'stay resident and poll every -i|--interval seconds, instead of polling once')
+
+    parg.add_argument('-i', '--interval',
+                      action  = 'store',
+                      dest    = 'interval',
+                      type    = int,
+                      default = 60,
+                      help    = 'polling interval in seconds of the daemon mode, the polls are aligned to multiples of the interval')
+
+    parg.add_argument('--migrate',
+                      action  = 'store_true',
+                      dest    = 'migrate',
+                      default = False,
+                      help    = 'apply the schema migrations (e.g. new indexes) to the existing databases in DB_DATA_DIR, fill their rollup tables and exit')
+
+    global args 
+#    global TORQUE_LOG_DIR
+    global BIN_QSTAT_ALL
+    global BIN_FSHARE_ALL
+    global BIN_QSTAT_XML
+    global BIN_PBSNODES_XML
+    global COLLECTOR_FORMAT
+    global SQLITE_JOURNAL_MODE
+    global SQLITE_RETENTION
+    global MENTAT_HOSTS
+    global MENTAT_PROBE_CMD
+    global MENTAT_TIMEOUT
+    global MENTAT_NTHREADS
+    global DB_DATA_DIR
+    global libDebug
+    global logger
+    global now
+    global SQLite_DB_PATH
+    global SQLite_SHARDS
+    global TORQUE_BATCH_QUEUES
+    global NOTIFICATION_EMAILS
+    global metadata
+
+    args = parg.parse_args()
+
+    if args.page < 1:
+        parg.error('-p|--page counts from 1')
+
+    if args.interval < 1:
+        parg.error('-i|--interval must be at least 1 second')
+
+    if args.user:
+        args.rpt_jqueued = True
+
+    ## load config file and global settings
+    c = getConfig(args.fconfig)
+#    TORQUE_LOG_DIR   = c.get('TorqueTracker','TORQUE_LOG_DIR') 
+    BIN_QSTAT_ALL       = c.get('TorqueTracker','BIN_QSTAT_ALL')
+    BIN_FSHARE_ALL      = c.get('TorqueTracker','BIN_FSHARE_ALL')
+    BIN_QSTAT_XML       = c.get('TorqueTracker','BIN_QSTAT_XML')
+    BIN_PBSNODES_XML    = c.get('TorqueTracker','BIN_PBSNODES_XML')
+    COLLECTOR_FORMAT    = c.get('TorqueTracker','COLLECTOR_FORMAT')
+    MENTAT_HOSTS        = filter( lambda x:x, c.get('TorqueTracker','MENTAT_HOSTS').split(',') )
+    MENTAT_PROBE_CMD    = c.get('TorqueTracker','MENTAT_PROBE_CMD', raw=True)
+    MENTAT_TIMEOUT      = int( c.get('TorqueTracker','MENTAT_PROBE_TIMEOUT') )
+    MENTAT_NTHREADS     = int( c.get('TorqueTracker','MENTAT_PROBE_THREADS') )
+    DB_DATA_DIR         = c.get('TorqueTracker','DB_DATA_DIR')
+    SQLITE_JOURNAL_MODE = c.get('TorqueTracker','SQLITE_JOURNAL_MODE')
+    SQLITE_RETENTION    = {'raw': int( c.get('TorqueTracker','SQLITE_RETENTION_RAW') ),
+                           '5m' : int( c.get('TorqueTracker','SQLITE_RETENTION_5M') ),
+                           '1h' : int( c.get('TorqueTracker','SQLITE_RETENTION_1H') ),
+                           '1d' : int( c.get('TorqueTracker','SQLITE_RETENTION_1D') )}
+    TORQUE_BATCH_QUEUES = c.get('TorqueTracker','TORQUE_BATCH_QUEUES').split(',')
+    NOTIFICATION_EMAILS = c.get('TorqueTracker','NOTIFICATION_EMAILS').split(',')
+    METADATA_CACHE_DIR  = c.get('TorqueTracker','METADATA_CACHE_DIR') or os.path.join( DB_DATA_DIR, 'metadata_cache' )
+    METADATA_TTLS       = {'node_speeds'    : int( c.get('TorqueTracker','METADATA_TTL_NODE_SPEEDS') ),
+                           'node_properties': int( c.get('TorqueTracker','METADATA_TTL_NODE_PROPERTIES') ),
+                           'fairshare'      : int( c.get('TorqueTracker','METADATA_TTL_FAIRSHARE') )}
+
+    ## load logger and set the verbosity level
+    logger = getMyLogger(os.path.basename(__file__))
+    logger.setLevel(logging.WARNING)
+    vlv = int(args.verbose)
+    libDebug = False
+    if vlv < 0:
+        logger.setLevel(logging.ERROR)
+    elif vlv == 1:
+        logger.setLevel(logging.INFO)
+    elif vlv >= 2:
+        logger.setLevel(logging.DEBUG)
+        libDebug = True
+
+    if COLLECTOR_FORMAT not in ['text', 'xml']:
+        logger.error('unknown COLLECTOR_FORMAT: %s' % COLLECTOR_FORMAT)
+        sys.exit(1)
+
+    ## the yearly databases
+    SQLite_SHARDS = ShardCatalog(DB_DATA_DIR, os.path.basename(__file__).replace('.py',''), period='year', debug=libDebug)
+
+    ## the databases of the past years are migrated while the current one may be in use
+    if args.migrate:
+        db_fpaths = [ f for f, b in SQLite_SHARDS.shards() ]
+        versions  = migrate_databases(db_fpaths, SQLite_TABLES, SQLite_MIGRATIONS, SQLite_ROLLUPS, journal_mode=SQLITE_JOURNAL_MODE, debug=libDebug)
+        for db_fpath in db_fpaths:
+            print '%s: schema version %s' % (db_fpath, versions[db_fpath])
+        sys.exit( int(None in versions.values()) )
+
+    ## create directories whenever necessary
+    if args.monitor:
+        try:
+            os.makedirs(DB_DATA_DIR)
+        except Exception, e:
+            logger.warning('creating directory error: %s' % repr(e))
+            pass
+ 
+        if not os.path.isdir(DB_DATA_DIR):
+            logger.error('directory not found: %s' % DB_DATA_DIR)
+            sys.exit(1) 
+
+    ## cache of the slowly changing cluster metadata, refreshed in the background by the daemon
+    metadata = None
+    if max(METADATA_TTLS.values()) > 0:
+        try:
+            metadata = MetadataCache(METADATA_CACHE_DIR, METADATA_TTLS, background=args.daemon, debug=libDebug)
+        except OSError, e:
+            logger.warning('cache of cluster metadata disabled: %s' % repr(e))
+
+    if args.daemon:
+        run_daemon(args.interval)
+    else:
+        poll()
@@ -9,6 +9,7 @@ import os
 import sqlite3 
 from argparse import ArgumentParser
 
+import numpy
 from numpy import mean, median, std, var, histogram
 import cPickle as pickle
 
@@ -16,127 +17,334 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 from utils.Common  import *
 from utils.Shell   import *
 from utils.Cluster import *
+from utils.Cache   import *
+from utils.Storage import *
+from utils.Shards  import *
 
 sys.path.append(os.path.dirname(os.path.abspath(__file__))+'/external/lib/python')
 from prettytable import PrettyTable
 
-def __sqlite_job_info__(jlist):
-    '''saving job information into SQLite database'''
-
-    conn    = sqlite3.connect(SQLite_DB_PATH)
-    c       = conn.cursor()
+## job attributes used by the accounting and the statistical measurement
+ANALYSIS_JOB_ATTRS = ['uid', 'gid', 'queue', 'cstat', 'rmem', 'rwtime', 'cmem', 'cvmem', 'cwtime', 'cctime', 't_queue', 't_start']
+
+## queue categories and job status of the accounting, with the suffix of the job status in the columns of the old layout
+ACCOUNTING_QCATS  = ['matlab','batch','inter','vgl']
+ACCOUNTING_CSTATS = [('s','csuccess'), ('f','cfailed'), ('k','killed')]
+
+def __sql_accounting_table__():
+    '''CREATE TABLE statement of the accounting table in the old layout, with the columns of each job category and job status,
+       as in the databases made before accounting_fact'''
+
+    sql  = 'CREATE TABLE IF NOT EXISTS accounting (timestamp INTEGER, uid TEXT, gid TEXT'
+    for k in ['matlab','batch','inter','vgl']:
+        sql += ', nj_%s INTEGER' % k
+        sql += ', ' + ' ,'.join( ['rwt_%s_%s REAL' % (k,s) for s in ['s','f','k'] ] )
+        sql += ', ' + ' ,'.join( ['cwt_%s_%s REAL' % (k,s) for s in ['s','f','k'] ] )
+        sql += ', ' + ' ,'.join( ['cct_%s_%s REAL' % (k,s) for s in ['s','f','k'] ] )
+        sql += ', ' + ' ,'.join( ['avg_rmem_%s_%s REAL'  % (k,s) for s in ['s','f','k','t'] ] )
+        sql += ', ' + ' ,'.join( ['avg_cmem_%s_%s REAL'  % (k,s) for s in ['s','f','k','t'] ] )
+        sql += ', ' + ' ,'.join( ['avg_cvmem_%s_%s REAL' % (k,s) for s in ['s','f','k','t'] ] )
+        sql += ', ' + ' ,'.join( ['avg_eff_mem_%s_%s REAL' % (k,s) for s in ['s','f','k','t'] ] )
+        sql += ', ' + ' ,'.join( ['avg_cpu_util_%s_%s REAL' % (k,s) for s in ['s','f','k','t'] ] )
+    sql += ', UNIQUE (timestamp,uid,gid) ON CONFLICT REPLACE)'
+
+    return sql
+
+def __sql_accounting_view__(legacy=False):
+    '''CREATE VIEW statement of the accounting view, giving the rows of accounting_fact in the old layout of the
+       accounting table (one row per user and day); with legacy, after the rows of that table written before the
+       fact table (accounting_legacy) of the days without rows in accounting_fact.  The sums of times are in hours
+       and the averages are -1 if there is no job.'''
+
+    def __sum__(v, q, s=None):
+        '''sum of the measure v of the jobs in the queue category q and (if given) the job status s'''
+        c = "qcat = '%s'" % q
+        if s is not None:
+            c += " AND cstat = '%s'" % s
+        return 'sum(CASE WHEN %s THEN %s END)' % (c, v)
+
+    cstats = ACCOUNTING_CSTATS + [('t', None)]
+
+    cols = ['timestamp', 'uid', 'gid']
+    for q in ACCOUNTING_QCATS:
+        cols.append( 'coalesce(%s, 0) AS nj_%s' % (__sum__('njobs', q), q) )
+        for m, v in [('rwt','rwtime_sum'), ('cwt','cwtime_sum'), ('cct','cctime_sum')]:
+            cols += [ 'coalesce(%s, 0) / 3600. AS %s_%s_%s' % (__sum__(v, q, s), m, q, k) for k, s in ACCOUNTING_CSTATS ]
+        for m in ['rmem', 'cmem', 'cvmem', 'eff_mem']:
+            cols += [ 'coalesce(%s / %s, -1) AS avg_%s_%s_%s' % (__sum__('%s_sum' % m, q, s), __sum__('njobs', q, s), m, q, k) for k, s in cstats ]
+        cols += [ 'coalesce(CASE WHEN %s > 0 THEN %s / %s ELSE %s / %s END, -1) AS avg_cpu_util_%s_%s' % (__sum__('cpu_util_njobs', q, s),
+                                                                                                       __sum__('cpu_util_sum', q, s), __sum__('cpu_util_njobs', q, s),
+                                                                                                       __sum__('cpu_util_short_sum', q, s), __sum__('njobs', q, s), q, k) for k, s in cstats ]
+
+    sql = 'CREATE VIEW IF NOT EXISTS accounting AS '
+    if legacy:
+        sql += 'SELECT * FROM accounting_legacy WHERE timestamp NOT IN (SELECT timestamp FROM accounting_fact) UNION ALL '
+    sql += 'SELECT %s FROM accounting_fact GROUP BY timestamp,uid,gid' % ','.join(cols)
+
+    return sql
+
+def __has_table__(conn, table):
+    '''whether the database of the connection has the table'''
+    return conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name=?", (table,)).fetchone() is not None
+
+def __migrate_accounting_index__(conn):
+    '''index the accounting table of the old layout on (uid,timestamp), if the database has one'''
+    if __has_table__(conn, 'accounting'):
+        conn.execute('CREATE INDEX IF NOT EXISTS accounting_uid_timestamp ON accounting (uid,timestamp)')
+
+def __migrate_accounting_view__(conn):
+    '''replace the accounting table of the old layout, if the database has one, by the accounting view of accounting_fact'''
+
+    legacy = __has_table__(conn, 'accounting')
+    if legacy:
+        conn.execute('ALTER TABLE accounting RENAME TO accounting_legacy')
+    conn.execute(__sql_accounting_view__(legacy))
+
+## tables of the SQLite databases, created when a database is opened
+SQLite_TABLES = [('jobs'          , '''CREATE TABLE IF NOT EXISTS jobs (jid      TEXT,
+                                                                        jname    TEXT,
+                                                                        jstat    TEXT,
+                                                                        jec      INTEGER,
+                                                                        cstat    TEXT,
+                                                                        uid      TEXT,
+                                                                        queue    TEXT,
+                                                                        rmem     REAL,
+                                                                        rwtime   INTEGER,
+                                                                        cmem     REAL,
+                                                                        cvmem    REAL,
+                                                                        cwtime   INTEGER,
+                                                                        cctime   INTEGER,
+                                                                        node     TEXT,
+                                                                        t_submit INTEGER,
+                                                                        t_queue  INTEGER,
+                                                                        t_start  INTEGER,
+                                                                        t_finish INTEGER,
+                                                                        PRIMARY KEY (jid DESC)
+                                                                        )'''),
+                 ('ingest_quality', '''CREATE TABLE IF NOT EXISTS ingest_quality (timestamp   INTEGER,
+                                                                                  logfile     TEXT,
+                                                                                  element     TEXT,
+                                                                                  njobs       INTEGER,
+                                                                                  nmissing    INTEGER,
+                                                                                  ninvalid    INTEGER,
+                                                                                  nsuspicious INTEGER,
+                                                                                  UNIQUE (timestamp,logfile,element) ON CONFLICT REPLACE
+                                                                                  )'''),
+                 ('statistics'    , '''CREATE TABLE IF NOT EXISTS statistics (timestamp   INTEGER,
+                                                                              queue       TEXT,
+                                                                              status      TEXT,
+                                                                              njobs       INTEGER,
+                                                                              nusers      INTEGER,
+                                                                              rwtime_min  REAL,
+                                                                              rwtime_max  REAL,
+                                                                              rwtime_mean REAL,
+                                                                              rwtime_std  REAL,
+                                                                              cwtime_min  REAL,
+                                                                              cwtime_max  REAL,
+                                                                              cwtime_mean REAL,
+                                                                              cwtime_std  REAL,
+                                                                              cctime_min  REAL,
+                                                                              cctime_max  REAL,
+                                                                              cctime_mean REAL,
+                                                                              cctime_std  REAL,
+                                                                              twait_min   REAL,
+                                                                              twait_max   REAL,
+                                                                              twait_mean  REAL,
+                                                                              twait_std   REAL,
+                                                                              rmem_min    REAL,
+                                                                              rmem_max    REAL,
+                                                                              rmem_mean   REAL,
+                                                                              rmem_std    REAL,
+                                                                              cmem_min    REAL,
+                                                                              cmem_max    REAL,
+                                                                              cmem_mean   REAL,
+                                                                              cmem_std    REAL,
+                                                                              cvmem_min   REAL,
+                                                                              cvmem_max   REAL,
+                                                                              cvmem_mean  REAL,
+                                                                              cvmem_std   REAL,
+                                                                              eff_wtime_min  REAL,
+                                                                              eff_wtime_max  REAL,
+                                                                              eff_wtime_mean REAL,
+                                                                              eff_wtime_std  REAL,
+                                                                              eff_wtime_var  REAL,
+                                                                              eff_mem_min    REAL,
+                                                                              eff_mem_max    REAL,
+                                                                              eff_mem_mean   REAL,
+                                                                              eff_mem_std    REAL,
+                                                                              eff_mem_var    REAL,
+                                                                              cpu_util_min   REAL,
+                                                                              cpu_util_max   REAL,
+                                                                              cpu_util_mean  REAL,
+                                                                              cpu_util_std   REAL,
+                                                                              cpu_util_var   REAL,
+                                                                              UNIQUE (timestamp,queue,status) ON CONFLICT REPLACE
+                                                                              )'''),
+                 ('accounting_fact', '''CREATE TABLE IF NOT EXISTS accounting_fact (timestamp          INTEGER,
+                                                                                    uid                TEXT,
+                                                                                    gid                TEXT,
+                                                                                    qcat               TEXT,
+                                                                                    cstat              TEXT,
+                                                                                    njobs              INTEGER,
+                                                                                    rwtime_sum         REAL,
+                                                                                    cwtime_sum         REAL,
+                                                                                    cctime_sum         REAL,
+                                                                                    rmem_sum           REAL,
+                                                                                    rmem_sumsq         REAL,
+                                                                                    cmem_sum           REAL,
+                                                                                    cmem_sumsq         REAL,
+                                                                                    cvmem_sum          REAL,
+                                                                                    cvmem_sumsq        REAL,
+                                                                                    eff_mem_sum        REAL,
+                                                                                    eff_mem_sumsq      REAL,
+                                                                                    cpu_util_njobs     INTEGER,
+                                                                                    cpu_util_sum       REAL,
+                                                                                    cpu_util_sumsq     REAL,
+                                                                                    cpu_util_short_sum REAL,
+                                                                                    UNIQUE (timestamp,uid,gid,qcat,cstat) ON CONFLICT REPLACE
+                                                                                    )''')]
+
+## schema migrations of the SQLite databases as (version, description, SQL statements), applied when a database is opened;
+## the queries on the timestamp of statistics and accounting use the index of their UNIQUE (timestamp,...); the
+## accounting table of the old layout, in the databases made before accounting_fact, is kept as accounting_legacy
+## behind the accounting view of accounting_fact
+SQLite_MIGRATIONS = [(1, 'indexes for the queries of the web interface', ['CREATE INDEX IF NOT EXISTS jobs_t_submit ON jobs (t_submit)',
+                                                                          __migrate_accounting_index__]),
+                     (2, 'accounting as a view of accounting_fact', [__migrate_accounting_view__,
+                                                                     'CREATE INDEX IF NOT EXISTS accounting_fact_uid_timestamp ON accounting_fact (uid,timestamp)'])]
+
+## SQLite databases opened by the run, by path
+SQLite_STORES = {}
+
+def __sqlite_store__(db_fpath=None):
+    '''SQLiteStore of the database at the given path (default SQLite_DB_PATH), opened once per run'''
+
+    if not db_fpath:
+        db_fpath = SQLite_DB_PATH
 
     try:
-        sql = '''CREATE TABLE jobs (jid      TEXT,
-                                    jname    TEXT,
-                                    jstat    TEXT,
-                                    jec      INTEGER,
-                                    cstat    TEXT,
-                                    uid      TEXT,
-                                    queue    TEXT,
-                                    rmem     REAL,
-                                    rwtime   INTEGER,
-                                    cmem     REAL,
-                                    cvmem    REAL,
-                                    cwtime   INTEGER,
-                                    cctime   INTEGER,
-                                    node     TEXT,
-                                    t_submit INTEGER,
-                                    t_queue  INTEGER,
-                                    t_start  INTEGER,
-                                    t_finish INTEGER,
-                                    PRIMARY KEY (jid DESC)
-                                    )'''
-        c.execute(sql)
-    except sqlite3.OperationalError,e:
-        logger.warning('SQL error: %s' % repr(e)) 
-
-    sql  = '''INSERT INTO jobs VALUES (''' + ','.join(['?']*18) + ''')'''
-    data = []
+        store = SQLite_STORES[db_fpath]
+    except KeyError, e:
+        store = SQLite_STORES[db_fpath] = SQLiteStore(db_fpath, SQLite_TABLES, SQLite_MIGRATIONS, journal_mode=SQLITE_JOURNAL_MODE, debug=(logger.level == logging.DEBUG))
 
-    for j in jlist:
-        data.append( (j.jid    , j.jname  , j.jstat , j.jec     , j.cstat, j.uid,
-                      j.queue  , j.rmem   , j.rwtime, j.cmem    , j.cvmem,
-                      j.cwtime , j.cctime , j.node  , j.t_submit,
-                      j.t_queue, j.t_start, j.t_finish) )
+    return store
 
-    logger.debug(data[-1])
+## columns of the jobs table, as attributes of the jobs
+SQLite_JOB_ATTRS = ['jid'    , 'jname'  , 'jstat' , 'jec'     , 'cstat', 'uid',
+                    'queue'  , 'rmem'   , 'rwtime', 'cmem'    , 'cvmem',
+                    'cwtime' , 'cctime' , 'node'  , 't_submit',
+                    't_queue', 't_start', 't_finish']
+
+def __sqlite_stored_jobs__(store, jids):
+    '''rows of the jobs table with the given job ids in the database of the store, by job id'''
+
+    rows = {}
+
+    ## in chunks, as the number of parameters of a statement is limited
+    n = 500
+    for i in xrange(0, len(jids), n):
+        chunk = jids[i:i+n]
+        for r in store.query('SELECT %s FROM jobs WHERE jid IN (%s)' % (','.join(SQLite_JOB_ATTRS), ','.join(['?'] * len(chunk))), chunk):
+            rows[r[0]] = tuple(r)
+
+    return rows
+
+def __sqlite_job_info__(jobs, db_fpath=None):
+    '''saving job information (JobTable) into SQLite database, the rows are written by the next commit of the database (see __sqlite_store__)'''
+
+    ## jobs already stored (e.g. by an incremental run) are updated
+    sql  = '''INSERT OR REPLACE INTO jobs VALUES (''' + ','.join(['?']*18) + ''')'''
+    data = list( jobs.iterrows(SQLite_JOB_ATTRS) )
+
+    store = __sqlite_store__(db_fpath)
+
+    ## the entry of a retried job appended to the log file after the previous run only gives the information of the new run,
+    ## it is merged into the stored row as the entries in the same run (see get_appended_jobs)
+    if data:
+        try:
+            stored = __sqlite_stored_jobs__(store, [ r[0] for r in data ])
+        except sqlite3.Error, e:
+            logger.error('cannot read the stored jobs: %s' % repr(e))
+            stored = {}
+
+        missing = [ COMPLETE_JOB_SCHEMA.defaults[ COMPLETE_JOB_ATTRS.index(k) ] for k in SQLite_JOB_ATTRS ]
+        data    = [ merge_retried_entry(stored[r[0]], r, missing) if r[0] in stored else r for r in data ]
+
+        logger.debug(data[-1])
+
+    store.stage('jobs', data, sql)
 
-    ## insert and commit multiple rows into the table
-    try:
-        c.executemany(sql, data)
-        conn.commit()
-    except Exception, e:
-        print e
-        conn.rollback()
-
-    ## close the database connection 
-    if conn:
-        conn.close()
- 
     return
 
+def __ingest_incremental__(dates):
+    '''saving jobs appended to the torque log files of the given dates since the previous run into SQLite database'''
 
-def __sqlite_job_stat__(summeas):
-    '''saving job information into SQLite database'''
+    ## checkpoints of the log files: {file path: (inode, byte offset)}
+    ckpt_fpath = os.path.join( DB_DATA_DIR, 'mm_trackTorqueJobs_checkpoints.p' )
 
-    conn    = sqlite3.connect(SQLite_DB_PATH)
-    c       = conn.cursor()
+    ckpts = {}
+    if os.path.exists( ckpt_fpath ):
+        try:
+            f = open( ckpt_fpath, 'rb' )
+            ckpts = pickle.load(f)
+            f.close()
+        except Exception, e:
+            logger.warning('cannot load checkpoints from %s: %s' % (ckpt_fpath, repr(e)))
 
-    try:
-        sql = '''CREATE TABLE statistics (timestamp   INTEGER,
-                                          queue       TEXT,
-                                          status      TEXT,
-                                          njobs       INTEGER,
-                                          nusers      INTEGER,
-                                          rwtime_min  REAL,
-                                          rwtime_max  REAL,
-                                          rwtime_mean REAL,
-                                          rwtime_std  REAL,
-                                          cwtime_min  REAL,
-                                          cwtime_max  REAL,
-                                          cwtime_mean REAL,
-                                          cwtime_std  REAL,
-                                          cctime_min  REAL,
-                                          cctime_max  REAL,
-                                          cctime_mean REAL,
-                                          cctime_std  REAL,
-                                          twait_min   REAL,
-                                          twait_max   REAL,
-                                          twait_mean  REAL,
-                                          twait_std   REAL,
-                                          rmem_min    REAL,
-                                          rmem_max    REAL,
-                                          rmem_mean   REAL,
-                                          rmem_std    REAL,
-                                          cmem_min    REAL,
-                                          cmem_max    REAL,
-                                          cmem_mean   REAL,
-                                          cmem_std    REAL,
-                                          cvmem_min   REAL,
-                                          cvmem_max   REAL,
-                                          cvmem_mean  REAL,
-                                          cvmem_std   REAL,
-                                          eff_wtime_min  REAL,
-                                          eff_wtime_max  REAL,
-                                          eff_wtime_mean REAL,
-                                          eff_wtime_std  REAL,
-                                          eff_wtime_var  REAL,
-                                          eff_mem_min    REAL,
-                                          eff_mem_max    REAL,
-                                          eff_mem_mean   REAL,
-                                          eff_mem_std    REAL,
-                                          eff_mem_var    REAL,
-                                          cpu_util_min   REAL,
-                                          cpu_util_max   REAL,
-                                          cpu_util_mean  REAL,
-                                          cpu_util_std   REAL,
-                                          cpu_util_var   REAL,
-                                          UNIQUE (timestamp,queue,status) ON CONFLICT REPLACE
-                                          )'''
-        c.execute(sql)
-    except sqlite3.OperationalError,e:
-        logger.warning('SQL error: %s' % repr(e)) 
+    ## only keep checkpoints of the log files still being followed
+    new_ckpts = {}
+
+    for d in dates:
+        db_fpath = SQLite_SHARDS.path( datetime.datetime.strptime(d, '%Y%m%d') )
+        for fpath in sorted( glob.glob( os.path.join(TORQUE_LOG_DIR, d) + '*' ) ):
+            jlist, ckpt = get_appended_jobs(fpath, ckpts.get(fpath), debug=(logger.level == logging.DEBUG))
+
+            logger.info('number of jobs appended to %s: %d' % (fpath, len(jlist)))
+
+            if jlist:
+                __sqlite_job_info__(JobTable.from_jobs(jlist), db_fpath)
+
+            ## move on the checkpoint only if the jobs are stored
+            if __sqlite_store__(db_fpath).commit():
+                new_ckpts[fpath] = ckpt
+            elif fpath in ckpts:
+                new_ckpts[fpath] = ckpts[fpath]
+
+    ## write checkpoints to a temporary file first, so that a crash cannot leave a partial file
+    f = open( ckpt_fpath + '.tmp', 'wb' )
+    pickle.dump(new_ckpts, f)
+    f.close()
+    os.rename( ckpt_fpath + '.tmp', ckpt_fpath )
+
+    return
+
+def __sqlite_ingest_quality__(quality):
+    '''saving parse-quality counters of the torque log files into SQLite database, the rows are written by the next commit of the database'''
+
+    sql  = '''INSERT INTO ingest_quality VALUES (''' + ','.join(['?']*7) + ''')'''
+    data = []
+
+    ## element paths of the job fields, the job id is always there
+    elements = COMPLETE_JOB_SCHEMA.paths()[1:]
+
+    for fpath, q in sorted( quality.iteritems() ):
+        ## the log files are named after the date, possibly with a suffix
+        fname = os.path.basename(fpath)
+        try:
+            d = datetime.datetime.strptime( fname[:8], '%Y%m%d' )
+        except ValueError,e:
+            d = datetime.datetime.strptime( args.jobdate, '%Y%m%d' )
+        ts = int(time.mktime( d.replace(hour=12).timetuple() ))
+
+        for e in elements:
+            data.append( (ts, fname, e, q['njobs'], q['missing'].get(e, 0), q['invalid'].get(e, 0), q['suspicious'].get(e, 0)) )
+
+    __sqlite_store__().stage('ingest_quality', data, sql)
+
+    return
+
+def __sqlite_job_stat__(summeas):
+    '''saving job information into SQLite database, the rows are written by the next commit of the database'''
 
     sql  = '''INSERT INTO statistics VALUES (''' + ','.join(['?']*48) + ''')'''
     data = []
@@ -162,18 +370,8 @@ def __sqlite_job_stat__(summeas):
 
     logger.debug(data[-1])
 
-    ## insert and commit multiple rows into the table
-    try:
-        c.executemany(sql, data)
-        conn.commit()
-    except Exception, e:
-        print e
-        conn.rollback()
-
-    ## close the database connection 
-    if conn:
-        conn.close()
- 
+    __sqlite_store__().stage('statistics', data, sql)
+
     return
 
 def __get_2sigma__(histo):
@@ -205,20 +403,28 @@ def __get_2sigma__(histo):
 
     return bound
 
-def __get_accounting__(_jlist):
-    '''Make accounting table for resource usage by users and groups'''
+def __safe_divide__(a, b):
+    '''element-wise a/b, giving 0 where b is 0 or missing'''
+    b = numpy.nan_to_num(b)
+    return numpy.divide(a, b, out=numpy.zeros(len(a)), where=(b != 0))
+
+def __get_accounting__(jobs):
+    '''Make accounting table for resource usage by users and groups, jobs is a JobTable'''
 
     ## check with jobs having resource consumption information
-    _jlist = filter(lambda x:x.cmem is not None and x.cwtime is not None and x.cctime is not None, _jlist)
+    jobs = jobs.select( ~numpy.isnan(jobs['cmem']) & ~numpy.isnan(jobs['cwtime']) & ~numpy.isnan(jobs['cctime']) )
 
     ## TODO: exclude jobs with non-sense information, e.g.
     ##        - cput overflow when job runs over the requested walltime,
     ##          but is still allowed to continue as the CPU speed is slower
-    _jlist = filter(lambda x:x.cctime < 4 * x.cwtime, _jlist)
+    jobs = jobs.select( jobs['cctime'] < 4 * jobs['cwtime'] )
+
+    ## order jobs by owner, so that the jobs of an owner are found by a binary search
+    jobs = jobs.select( numpy.argsort(jobs['uid'], kind='mergesort') )
 
-    # get a list of job owners and sort by group
-    owners = list(set(map(lambda x:HashableDict({'uid':x.uid, 'gid':x.gid}), _jlist)))
-    owners = sorted(owners, key=lambda x:x['gid'], reverse = False)
+    # get a list of job owners (as codes of uid and gid) and sort by group
+    owners = list(set(zip(jobs['uid'].tolist(), jobs['gid'].tolist())))
+    owners = sorted(owners, key=lambda x:(jobs.decode('gid', x[1]), jobs.decode('uid', x[0])), reverse = False)
 
     logger.info('number of active users: %d' % len(owners))
 
@@ -236,161 +442,206 @@ def __get_accounting__(_jlist):
              'vgl'    : ['vgl'], 
              'batch'  : TORQUE_BATCH_QUEUES}
 
-    def __make_data_row__(_ts, _oid, _gid, _olist ):
-        '''function to prepare each data row for PrettyTable'''
-
-        _d = {}
-        for c,q in q_cat.iteritems():
-            _sd = {'nj':0,
-                   'r_wtime_s'     :0 , 'r_wtime_f'     :0 , 'r_wtime_k'     :0 ,  # requested walltime
-                   'c_wtime_s'     :0 , 'c_wtime_f'     :0 , 'c_wtime_k'     :0 ,  # consumed walltime
-                   'c_ctime_s'     :0 , 'c_ctime_f'     :0 , 'c_ctime_k'     :0 ,  # consumed cputime
-                   'avg_rmem_s'    :-1, 'avg_rmem_f'    :-1, 'avg_rmem_k'    :-1, 'avg_rmem_t'    :-1,  # average of requested physical memory
-                   'avg_cmem_s'    :-1, 'avg_cmem_f'    :-1, 'avg_cmem_k'    :-1, 'avg_cmem_t'    :-1,  # average of consumed physical memory
-                   'avg_cvmem_s'   :-1, 'avg_cvmem_f'   :-1, 'avg_cvmem_k'   :-1, 'avg_cvmem_t'   :-1,  # average of consumed virtual memory
-                   'avg_eff_mem_s' :-1, 'avg_eff_mem_f' :-1, 'avg_eff_mem_k' :-1, 'avg_eff_mem_t' :-1,  # average of memory efficiency (i.e. consumed memory / requested memory)
-                   'avg_cpu_util_s':-1, 'avg_cpu_util_f':-1, 'avg_cpu_util_k':-1, 'avg_cpu_util_t':-1,  # average of cpu utilization (i.e. consumed cputime / consumed walltime)
-                  }
-            
-            _sub_olist   = filter(lambda x:x.queue in q, _olist )
-            _sub_olist_s = filter(lambda x:x.cstat == 'csuccess', _sub_olist ) 
-            _sub_olist_f = filter(lambda x:x.cstat == 'cfailed' , _sub_olist ) 
-            _sub_olist_k = filter(lambda x:x.cstat == 'killed'  , _sub_olist ) 
-            _sd['nj'] = len( _sub_olist )
-
-            _sd['r_wtime_s'] = sum( map( lambda x:x.rwtime, _sub_olist_s ) ) / 3600.
-            _sd['r_wtime_f'] = sum( map( lambda x:x.rwtime, _sub_olist_f ) ) / 3600.
-            _sd['r_wtime_k'] = sum( map( lambda x:x.rwtime, _sub_olist_k ) ) / 3600.
-            _sd['r_wtime_t'] = sum( map( lambda x:x.rwtime, _sub_olist   ) ) / 3600.
-            _sd['c_wtime_s'] = sum( map( lambda x:x.cwtime, _sub_olist_s ) ) / 3600.
-            _sd['c_wtime_f'] = sum( map( lambda x:x.cwtime, _sub_olist_f ) ) / 3600.
-            _sd['c_wtime_k'] = sum( map( lambda x:x.cwtime, _sub_olist_k ) ) / 3600.
-            _sd['c_wtime_t'] = sum( map( lambda x:x.cwtime, _sub_olist   ) ) / 3600.
-            _sd['c_ctime_s'] = sum( map( lambda x:x.cctime, _sub_olist_s ) ) / 3600.
-            _sd['c_ctime_f'] = sum( map( lambda x:x.cctime, _sub_olist_f ) ) / 3600.
-            _sd['c_ctime_k'] = sum( map( lambda x:x.cctime, _sub_olist_k ) ) / 3600.
-            _sd['c_ctime_t'] = sum( map( lambda x:x.cctime, _sub_olist   ) ) / 3600.
-
-            for s, jl in zip( ['s','f','k','t'],
-                              [ _sub_olist_s, _sub_olist_f, _sub_olist_k, _sub_olist ] ):
-
-                if len( jl ) > 0:
-                    l_rmem = map( lambda x:x.rmem, jl )
-                    l_cmem = map( lambda x:x.cmem, jl )
-
-                    _sd['avg_rmem_%s' % s]     = mean( map( lambda x:x.rmem if x.rmem else 0, jl ) )
-                    _sd['avg_cmem_%s' % s]     = mean( map( lambda x:x.cmem , jl ) )
-                    _sd['avg_cvmem_%s' % s]    = mean( map( lambda x:x.cvmem, jl ) )
-                    _sd['avg_eff_mem_%s' % s]  = mean( [ 1.0*a/b if b else 0 for a,b in zip(l_cmem, l_rmem) ] )
-
-                    if len( filter( lambda x:x.cwtime > 60, jl ) ) > 0:
-                        # For avoiding the bias due to extremely short jobs, only the jobs with at-least 1 mins. wallclock time consumption are accounted
-                        l_cwt  = map( lambda x:x.cwtime, filter( lambda x:x.cwtime > 60, jl ) )
-                        l_cct  = map( lambda x:x.cctime, filter( lambda x:x.cwtime > 60, jl ) )
-                        _sd['avg_cpu_util_%s' % s] = mean( [ 1.0*a/b for a,b in zip(l_cct , l_cwt ) ] )
-                    else:
-                        # but if there are only those extremely short jobs are available, calculate the avg. cpu utilization anyway 
-                        l_cwt  = map( lambda x:x.cwtime, jl )
-                        l_cct  = map( lambda x:x.cctime, jl )
-                        _sd['avg_cpu_util_%s' % s] = mean( [ 1.0*a/b for a,b in zip(l_cct , l_cwt ) ] )
-
-            _d[c] = _sd;
-
-        d_sql = (_ts, _oid, _gid)
-
-        for c in ['matlab','batch','inter','vgl']:
-            d_sql += (_d[c]['nj'],
-                      _d[c]['r_wtime_s'],
-                      _d[c]['r_wtime_f'],
-                      _d[c]['r_wtime_k'],
-                      _d[c]['c_wtime_s'],
-                      _d[c]['c_wtime_f'],
-                      _d[c]['c_wtime_k'],
-                      _d[c]['c_ctime_s'],
-                      _d[c]['c_ctime_f'],
-                      _d[c]['c_ctime_k'],
-                      _d[c]['avg_rmem_s'],
-                      _d[c]['avg_rmem_f'],
-                      _d[c]['avg_rmem_k'],
-                      _d[c]['avg_rmem_t'],
-                      _d[c]['avg_cmem_s'],
-                      _d[c]['avg_cmem_f'],
-                      _d[c]['avg_cmem_k'],
-                      _d[c]['avg_cmem_t'],
-                      _d[c]['avg_cvmem_s'],
-                      _d[c]['avg_cvmem_f'],
-                      _d[c]['avg_cvmem_k'],
-                      _d[c]['avg_cvmem_t'],
-                      _d[c]['avg_eff_mem_s'],
-                      _d[c]['avg_eff_mem_f'],
-                      _d[c]['avg_eff_mem_k'],
-                      _d[c]['avg_eff_mem_t'],
-                      _d[c]['avg_cpu_util_s'],
-                      _d[c]['avg_cpu_util_f'],
-                      _d[c]['avg_cpu_util_k'],
-                      _d[c]['avg_cpu_util_t']
-                     )
-
-        d_tab = [_oid, _gid, '/'.join( ['%7d'   % _d[k]['nj'] for k in ['matlab','batch','inter','vgl']] ),
-                             '/'.join( ['%8.1f' % sum( _d[k][t] for k in q_cat.keys()) for t in ['r_wtime_s','r_wtime_f','r_wtime_k','r_wtime_t']] ),
-                             '/'.join( ['%8.1f' % sum( _d[k][t] for k in q_cat.keys()) for t in ['c_wtime_s','c_wtime_f','c_wtime_k','c_wtime_t']] ),
-                             '/'.join( ['%8.1f' % sum( _d[k][t] for k in q_cat.keys()) for t in ['c_ctime_s','c_ctime_f','c_ctime_k','c_ctime_t']] ) ]
+    def __make_data_row__(_ts, _oid, _gid, _ojobs ):
+        '''function to prepare the rows of accounting_fact (one per job category and job status) and the row for PrettyTable'''
+
+        d_sql = []
+        for c in ACCOUNTING_QCATS:
+            _m = _ojobs.isin('queue', q_cat[c])
+
+            for code in numpy.unique( _ojobs['cstat'][_m] ).tolist():
+                _sjobs = _ojobs.select( _m & (_ojobs['cstat'] == code) )
+
+                a_rmem  = numpy.nan_to_num( _sjobs['rmem'] )
+                a_cmem  = _sjobs['cmem']
+                a_cvmem = _sjobs['cvmem']
+                a_eff   = __safe_divide__(a_cmem, a_rmem)  # memory efficiency (i.e. consumed memory / requested memory)
+                a_cpu   = __safe_divide__(_sjobs['cctime'], _sjobs['cwtime'])  # cpu utilization (i.e. consumed cputime / consumed walltime)
+
+                # For avoiding the bias due to extremely short jobs, only the jobs with at-least 1 mins. wallclock time consumption are accounted
+                # in the avg. cpu utilization, but if there are only those extremely short jobs, the avg. is taken over them anyway
+                l = _sjobs['cwtime'] > 60
+
+                d_sql.append( (_ts, _oid, _gid, c, _ojobs.decode('cstat', code) or '', len(_sjobs),
+                               float( _sjobs['rwtime'].sum() ), float( _sjobs['cwtime'].sum() ), float( _sjobs['cctime'].sum() ),
+                               float( a_rmem.sum() ) , float( (a_rmem**2).sum() ),
+                               float( a_cmem.sum() ) , float( (a_cmem**2).sum() ),
+                               float( a_cvmem.sum() ), float( (a_cvmem**2).sum() ),
+                               float( a_eff.sum() )  , float( (a_eff**2).sum() ),
+                               int( l.sum() ), float( a_cpu[l].sum() ), float( (a_cpu[l]**2).sum() ), float( a_cpu[~l].sum() )) )
+
+        def __sum_hrs__(i, s):
+            '''sum in hours of the i-th value of the rows with job status s (all job status if s is None)'''
+            return sum( [ r[i] for r in d_sql if s is None or r[4] == s ] ) / 3600.
+
+        cstats = map(lambda x:x[1], ACCOUNTING_CSTATS) + [None]
+
+        d_tab = [_oid, _gid, '/'.join( ['%7d'   % sum( [ r[5] for r in d_sql if r[3] == c ] ) for c in ACCOUNTING_QCATS] ),
+                             '/'.join( ['%8.1f' % __sum_hrs__(6, s) for s in cstats] ),
+                             '/'.join( ['%8.1f' % __sum_hrs__(7, s) for s in cstats] ),
+                             '/'.join( ['%8.1f' % __sum_hrs__(8, s) for s in cstats] ) ]
 
         return (d_sql, d_tab)
 
+    ts = int(time.mktime(datetime.datetime.strptime( '%s 12:00:00' % args.jobdate, '%Y%m%d %H:%M:%S').timetuple()))
+
     for o in owners:
-        ts = int(time.mktime(datetime.datetime.strptime( '%s 12:00:00' % args.jobdate, '%Y%m%d %H:%M:%S').timetuple()))
+        ## all jobs of the user, as the jobs are ordered by uid
+        i_beg = numpy.searchsorted(jobs['uid'], o[0], side='left')
+        i_end = numpy.searchsorted(jobs['uid'], o[0], side='right')
 
-        d_sql,d_tab = __make_data_row__(ts, o['uid'], o['gid'], filter(lambda x:x.uid == o['uid'], _jlist))
-        sql_data.append( d_sql )
+        d_sql,d_tab = __make_data_row__(ts, jobs.decode('uid', o[0]), jobs.decode('gid', o[1]), jobs.select(slice(i_beg, i_end)))
+        sql_data += d_sql
         t.add_row( d_tab )
 
     ## storing data to sqlite database
     if args.monitor: 
 
-        conn    = sqlite3.connect(SQLite_DB_PATH)
-        c       = conn.cursor()
- 
-        try:
-            sql  = 'CREATE TABLE accounting (timestamp INTEGER, uid TEXT, gid TEXT'
-            for k in ['matlab','batch','inter','vgl']:
-                sql += ', nj_%s INTEGER' % k
-                sql += ', ' + ' ,'.join( ['rwt_%s_%s REAL' % (k,s) for s in ['s','f','k'] ] )
-                sql += ', ' + ' ,'.join( ['cwt_%s_%s REAL' % (k,s) for s in ['s','f','k'] ] )
-                sql += ', ' + ' ,'.join( ['cct_%s_%s REAL' % (k,s) for s in ['s','f','k'] ] )
-                sql += ', ' + ' ,'.join( ['avg_rmem_%s_%s REAL'  % (k,s) for s in ['s','f','k','t'] ] )
-                sql += ', ' + ' ,'.join( ['avg_cmem_%s_%s REAL'  % (k,s) for s in ['s','f','k','t'] ] )
-                sql += ', ' + ' ,'.join( ['avg_cvmem_%s_%s REAL' % (k,s) for s in ['s','f','k','t'] ] )
-                sql += ', ' + ' ,'.join( ['avg_eff_mem_%s_%s REAL' % (k,s) for s in ['s','f','k','t'] ] )
-                sql += ', ' + ' ,'.join( ['avg_cpu_util_%s_%s REAL' % (k,s) for s in ['s','f','k','t'] ] )
-            sql += ', UNIQUE (timestamp,uid,gid) ON CONFLICT REPLACE)'
-
-            logger.debug(sql)
-
-            c.execute(sql)
-        except sqlite3.OperationalError,e:
-            logger.warning('SQL error: %s' % repr(e)) 
+        sql  = '''INSERT INTO accounting_fact VALUES (''' + ','.join(['?']*21) + ''')'''
  
-        sql  = '''INSERT INTO accounting VALUES (''' + ','.join(['?']*123) + ''')'''
- 
-        logger.debug(sql_data[-1])
- 
-        ## insert and commit multiple rows into the table
-        try:
-            c.executemany(sql, sql_data)
-            conn.commit()
-        except Exception, e:
-            print e
-            conn.rollback()
- 
-        ## close the database connection 
-        if conn:
-            conn.close()
+        if sql_data:
+            logger.debug(sql_data[-1])
+
+        ## the rows of the day are replaced as a whole, also of the users and job categories without jobs anymore;
+        ## the ones of the day written in the old layout before the fact table are left out by the accounting view
+        __sqlite_store__().stage('accounting_fact', [(ts,)], '''DELETE FROM accounting_fact WHERE timestamp = ?''')
+        __sqlite_store__().stage('accounting_fact', sql_data, sql)
     else:
         ## print the accounting table on the screen if not in monitoring mode 
         print t
 
 
+def __get_statistics__(jobs):
+    '''Make statistical measurement of resource usage per queue and job status, jobs is a JobTable'''
+
+    def __filter_jobs__(jobs, queue, stat):
+        ''' filter jobs with selection on queue and stat '''
+
+        if queue == 'batch':
+            return jobs.select( jobs.isin('queue', TORQUE_BATCH_QUEUES) & jobs.isin('cstat', [stat]) )
+        else:
+            return jobs.select( jobs.isin('queue', [queue]) & jobs.isin('cstat', [stat]) )
+
+    ## statistical measurement (only on jobs with resource consumption information)
+    jobs = jobs.select( ~numpy.isnan(jobs['cmem']) & ~numpy.isnan(jobs['cwtime']) & ~numpy.isnan(jobs['cctime']) )
+
+    hbins_mem  = range(0,   101,  1) + range(150,    10*50,   50) + [550, 1000]
+    hbins_time = range(0, 7*300,300) + range(3600, 24*3600, 3600) + [3600 * 72]
+    hbins_eff  = map(lambda x:0.001*x, range(0, 1001, 1))
+
+    summeas = []
+    for queue in ['interactive', 'matlab' , 'vgl', 'batch']:
+        for stat in ['csuccess', 'cfailed', 'killed']:
+
+            data = {'queue'    : queue,
+                    'stat'     : stat,
+                    'njobs'    : 0,
+                    'nusers'   : 0,
+                    'rwtime'   : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
+                    'cwtime'   : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
+                    'cctime'   : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
+                    'twait'    : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
+                    'rmem'     : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
+                    'cmem'     : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
+                    'cvmem'    : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
+                    'eff_wtime': {'min':0,'max':0,'mean':0, 'std':0, 'median':0, 'bnd':[], 'var': 0, 'hist':None},
+                    'eff_mem'  : {'min':0,'max':0,'mean':0, 'std':0, 'median':0, 'bnd':[], 'var': 0, 'hist':None},
+                    'cpu_util' : {'min':0,'max':0,'mean':0, 'std':0, 'median':0, 'bnd':[], 'var': 0, 'hist':None}}
+
+            summeas.append( data )
+
+            my_jobs = __filter_jobs__( jobs, queue, stat )
+
+            data['njobs'] = len(my_jobs)
+
+            if data['njobs'] == 0:
+                continue
+
+            data['nusers'] = len( numpy.unique(my_jobs['uid']) )
+
+            l_rwtime  = my_jobs['rwtime']
+            l_cwtime  = my_jobs['cwtime']
+            l_cctime  = my_jobs['cctime']
+            l_rmem    = my_jobs['rmem']
+            l_cmem    = my_jobs['cmem']
+            l_cvmem   = my_jobs['cvmem']
+            l_t_queue = my_jobs['t_queue']
+            l_t_start = my_jobs['t_start']
+
+            l_twait     = l_t_start - l_t_queue
+            l_eff_wtime = __safe_divide__(l_cwtime, l_rwtime)
+            l_eff_mem   = __safe_divide__(l_cmem  , l_rmem  )
+            l_cpu_util  = __safe_divide__(l_cctime, l_cwtime)
+
+            data['rwtime'] = {'min'  : numpy.min( l_rwtime ),
+                              'max'  : numpy.max( l_rwtime ),
+                              'mean' : mean(l_rwtime ),
+                              'std'  : std( l_rwtime )}
+                              #'hist' : histogram(l_rwtime, hbins_time)[0]}
+
+            data['cwtime'] = {'min'  : numpy.min( l_cwtime ),
+                              'max'  : numpy.max( l_cwtime ),
+                              'mean' : mean(l_cwtime ),
+                              'std'  : std( l_cwtime )}
+                              #'hist' : histogram(l_cwtime, hbins_time)[0]}
+
+            data['cctime'] = {'min'  : numpy.min( l_cctime ),
+                              'max'  : numpy.max( l_cctime ),
+                              'mean' : mean(l_cctime ),
+                              'std'  : std( l_cctime )}
+                              #'hist' : histogram(l_cctime, hbins_time)[0]}
+
+            data['twait']  = {'min'  : numpy.min( l_twait ),
+                              'max'  : numpy.max( l_twait ),
+                              'mean' : mean(l_twait ),
+                              'std'  : std( l_twait )}
+                              #'hist' : histogram(l_twait, hbins_time)[0]}
+
+            data['rmem'] = {'min'  : numpy.min( l_rmem ),
+                            'max'  : numpy.max( l_rmem ),
+                            'mean' : mean( l_rmem ),
+                            'std'  : std( l_rmem )}
+                            #'hist' : histogram(l_rmem, hbins_mem)[0]}
+
+            data['cmem'] = {'min'  : numpy.min( l_cmem ),
+                            'max'  : numpy.max( l_cmem ),
+                            'mean' : mean(l_cmem ),
+                            'std'  : std( l_cmem )}
+                            #'hist' : histogram(l_cmem, hbins_mem)[0]}
+
+            data['cvmem'] = {'min'  : numpy.min( l_cvmem ),
+                             'max'  : numpy.max( l_cvmem ),
+                             'mean' : mean(l_cvmem ),
+                             'std'  : std( l_cvmem )}
+                             #'hist' : histogram(l_cvmem, hbins_mem)[0]}
+
+            data['eff_wtime'] = {'min'   : numpy.min( l_eff_wtime ),
+                                 'max'   : numpy.max( l_eff_wtime ),
+                                 'mean'  : mean(l_eff_wtime ),
+                                 'std'   : std( l_eff_wtime ),
+                                 'var'   : var( l_eff_wtime ),
+                                 'median': median(l_eff_wtime ),
+                                 'bnd'   : __get_2sigma__(histogram(l_eff_wtime, hbins_eff, density=True))}
+
+            data['eff_mem']   = {'min'   : numpy.min( l_eff_mem ),
+                                 'max'   : numpy.max( l_eff_mem ),
+                                 'mean'  : mean(l_eff_mem ),
+                                 'std'   : std( l_eff_mem ),
+                                 'var'   : var( l_eff_mem ),
+                                 'median': median(l_eff_mem ),
+                                 'bnd'   : __get_2sigma__(histogram(l_eff_mem, hbins_eff, density=True))}
+
+            data['cpu_util']  = {'min'   : numpy.min( l_cpu_util ),
+                                 'max'   : numpy.max( l_cpu_util ),
+                                 'mean'  : mean(l_cpu_util ),
+                                 'std'   : std( l_cpu_util ),
+                                 'var'   : var( l_cpu_util ),
+                                 'median': median(l_cpu_util ),
+                                 'bnd'   : __get_2sigma__(histogram(l_cpu_util, hbins_eff, density=True))}
+
+    return summeas
+
+
 ## execute the main program
 if __name__ == "__main__":
 
@@ -421,8 +672,8 @@ if __name__ == "__main__":
     parg.add_argument('-d', '--date',
                       action  = 'store',
                       dest    = 'jobdate',
-                      default = (datetime.date.today() - datetime.timedelta(1)).strftime('%Y%m%d'),
-                      help    = 'set the date on which the jobs were submitted in a format of, e.g. 20140101')
+                      default = None,
+                      help    = 'set the date on which the jobs were submitted in a format of, e.g. 20140101. Default is yesterday, or today with -i|--incremental')
 
     parg.add_argument('-p', '--period',
                       action  = 'store',
@@ -430,6 +681,37 @@ if __name__ == "__main__":
                       default = 1,
                       help    = 'set the backward period (in days) in which the jobs were submitted, using the starting date given by -d|--date option.')
 
+    parg.add_argument('-w', '--workers',
+                      action  = 'store',
+                      dest    = 'workers',
+                      type    = int,
+                      default = 1,
+                      help    = 'set the number of processes parsing the log files of the dates in the period (see -p|--period) in parallel')
+
+    parg.add_argument('-i', '--incremental',
+                      action  = 'store_true',
+                      dest    = 'incremental',
+                      default = False,
+                      help    = 'store only the jobs appended to the log files since the previous run in SQLite database. The log files of the date given by -d|--date and the day before are followed.')
+
+    parg.add_argument('--purge-cache',
+                      action  = 'store_true',
+                      dest    = 'purge_cache',
+                      default = False,
+                      help    = 'remove the cache of parsed torque log files and exit')
+
+    parg.add_argument('--migrate',
+                      action  = 'store_true',
+                      dest    = 'migrate',
+                      default = False,
+                      help    = 'apply the schema migrations (e.g. new indexes) to the existing databases in DB_DATA_DIR and exit')
+
+    parg.add_argument('-q', '--quality',
+                      action  = 'store_true',
+                      dest    = 'quality',
+                      default = False,
+                      help    = 'store the counts of jobs with missing or invalid information in the torque log files in SQLite database (table ingest_quality)')
+
     parg.add_argument('-a', '--accounting',
                       action  = 'store_true',
                       dest    = 'accounting',
@@ -447,6 +729,12 @@ if __name__ == "__main__":
 
     args = parg.parse_args()
 
+    if not args.jobdate:
+        if args.incremental:
+            args.jobdate = datetime.date.today().strftime('%Y%m%d')
+        else:
+            args.jobdate = (datetime.date.today() - datetime.timedelta(1)).strftime('%Y%m%d')
+
     ## load config file and global settings
     c = getConfig(args.fconfig)
 
@@ -454,11 +742,16 @@ if __name__ == "__main__":
     global TORQUE_BATCH_QUEUES
     global DB_DATA_DIR
     global SQLite_DB_PATH
+    global SQLite_SHARDS
+    global SQLITE_JOURNAL_MODE
     global logger 
 
     TORQUE_LOG_DIR      = c.get('TorqueTracker','TORQUE_LOG_DIR') 
     TORQUE_BATCH_QUEUES = c.get('TorqueTracker','TORQUE_BATCH_QUEUES').split(',')
     DB_DATA_DIR         = c.get('TorqueTracker','DB_DATA_DIR')
+    SQLITE_JOURNAL_MODE = c.get('TorqueTracker','SQLITE_JOURNAL_MODE')
+    JOBLOG_CACHE_DIR    = c.get('TorqueTracker','JOBLOG_CACHE_DIR') or os.path.join( DB_DATA_DIR, 'joblog_cache' )
+    JOBLOG_CACHE_SIZE   = int( c.get('TorqueTracker','JOBLOG_CACHE_SIZE_MB') ) * 1024**2
 
     ## load logger and set the verbosity level
     logger = getMyLogger(os.path.basename(__file__))
@@ -470,26 +763,64 @@ if __name__ == "__main__":
     elif vlv >= 2:
         logger.setLevel(logging.DEBUG)
 
-    SQLite_DB_PATH   = os.path.join( DB_DATA_DIR, '%s_%s.db' % (os.path.basename(__file__).replace('.py',''), args.jobdate[:-2]) )
+    ## the monthly databases, the jobs are stored in the one of the month of -d|--date
+    SQLite_SHARDS    = ShardCatalog(DB_DATA_DIR, os.path.basename(__file__).replace('.py',''), period='month', debug=(vlv >= 2))
+    SQLite_DB_PATH   = SQLite_SHARDS.path( datetime.datetime.strptime(args.jobdate, '%Y%m%d') )
+
+    ## cache of the parsed torque log files
+    cache = None
+    if JOBLOG_CACHE_SIZE > 0 or args.purge_cache:
+        try:
+            cache = JobLogCache(JOBLOG_CACHE_DIR, maxsize=JOBLOG_CACHE_SIZE, debug=(vlv >= 2))
+        except OSError, e:
+            logger.warning('cache of parsed log files disabled: %s' % repr(e))
+
+    if args.purge_cache:
+        if cache:
+            cache.purge()
+        sys.exit(0)
+
+    ## the databases of the past months are migrated while the current one may be in use
+    if args.migrate:
+        db_fpaths = [ f for f, b in SQLite_SHARDS.shards() ]
+        versions  = migrate_databases(db_fpaths, SQLite_TABLES, SQLite_MIGRATIONS, journal_mode=SQLITE_JOURNAL_MODE, debug=(vlv >= 2))
+        for db_fpath in db_fpaths:
+            print '%s: schema version %s' % (db_fpath, versions[db_fpath])
+        sys.exit( int(None in versions.values()) )
 
     # parsing the information of jobs submitted during the given period of time
     d_beg = datetime.datetime.strptime(args.jobdate, '%Y%m%d')
     
     # it makes more sense to check just one time point when the monitor argument is on
     if args.monitor:
-        args.dataperiod = 1
+        args.dateperiod = 1
+
+    # the log file of the day before may still got jobs appended after the previous run
+    if args.incremental:
+        args.dateperiod = max(2, int(args.dateperiod))
 
     dates = map(lambda x:x.strftime('%Y%m%d'), [ d_beg - datetime.timedelta(days=d) for d in range(0, int(args.dateperiod)) ])
-    jlist = []
-    for d in dates:
-        logger.info('collecting jobs on %s' % d)
-        jlist += get_complete_jobs(TORQUE_LOG_DIR, d, debug=(vlv >= 2))
 
+    if args.incremental:
+        __ingest_incremental__(dates)
+        sys.exit(0)
+
+    ## all job attributes are needed only for storing the jobs, or the quality of all of them, into the SQLite database
+    fields = None
+    if not args.monitor and not args.quality:
+        fields = ANALYSIS_JOB_ATTRS
 
-    count             = len(jlist)
-    no_r_count        = len( filter(lambda x:x.cmem   is None, jlist) )  ## jobs without resource consumption information
-    no_walltime_count = len( filter(lambda x:x.cwtime is None, jlist) )  ## jobs without wallclock time consumption information 
-    no_cputime_count  = len( filter(lambda x:x.cctime is None, jlist) )  ## jobs without wallclock time consumption information 
+    quality = {}
+    jobs = get_complete_jobs_table(TORQUE_LOG_DIR, dates, nworkers=args.workers, debug=(vlv >= 2), cache=cache, fields=fields, quality=quality)
+
+    if args.quality:
+        __sqlite_ingest_quality__(quality)
+
+
+    count             = len(jobs)
+    no_r_count        = int( numpy.isnan(jobs['cmem']  ).sum() )  ## jobs without resource consumption information
+    no_walltime_count = int( numpy.isnan(jobs['cwtime']).sum() )  ## jobs without wallclock time consumption information 
+    no_cputime_count  = int( numpy.isnan(jobs['cctime']).sum() )  ## jobs without wallclock time consumption information 
 
     logger.info('number of jobs: %d' % count)
     logger.info('number of jobs w/t resource consumption info: %d' % no_r_count)
@@ -497,139 +828,12 @@ if __name__ == "__main__":
     logger.info('number of jobs w/t cputime  consumption info: %d' % no_cputime_count)
  
     if args.accounting:
-        __get_accounting__(jlist)
+        __get_accounting__(jobs)
 
     if args.monitor:
-        __sqlite_job_info__(jlist)
-
-    def __filter_jlist__(jlist, queue, stat):
-        ''' filter jlist with selection on queue and stat '''
-
-        myjlist = jlist
-
-        if queue == 'batch':
-            myjlist = filter( lambda x:x.queue in TORQUE_BATCH_QUEUES and x.cstat == stat, myjlist )
-        else:
-            myjlist = filter( lambda x:x.queue == queue and x.cstat == stat, myjlist )
-
-        return myjlist
-
-    ## statistical measurement (only on jobs with resource consumption information)
-    jlist = filter(lambda x:x.cmem is not None and x.cwtime is not None and x.cctime is not None, jlist)
-
-    hbins_mem  = range(0,   101,  1) + range(150,    10*50,   50) + [550, 1000]
-    hbins_time = range(0, 7*300,300) + range(3600, 24*3600, 3600) + [3600 * 72]
-    hbins_eff  = map(lambda x:0.001*x, range(0, 1001, 1))
-
-    summeas = []
-    for queue in ['interactive', 'matlab' , 'vgl', 'batch']:
-        for stat in ['csuccess', 'cfailed', 'killed']:
-
-            data = {'queue'    : queue,
-                    'stat'     : stat,
-                    'njobs'    : 0,
-                    'nusers'   : 0,
-                    'rwtime'   : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
-                    'cwtime'   : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
-                    'cctime'   : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
-                    'twait'    : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
-                    'rmem'     : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
-                    'cmem'     : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
-                    'cvmem'    : {'min':0,'max':0,'mean':0, 'std':0, 'hist':None},
-                    'eff_wtime': {'min':0,'max':0,'mean':0, 'std':0, 'median':0, 'bnd':[], 'var': 0, 'hist':None},
-                    'eff_mem'  : {'min':0,'max':0,'mean':0, 'std':0, 'median':0, 'bnd':[], 'var': 0, 'hist':None},
-                    'cpu_util' : {'min':0,'max':0,'mean':0, 'std':0, 'median':0, 'bnd':[], 'var': 0, 'hist':None}}
-
-            summeas.append( data )
-
-            my_jlist = __filter_jlist__( jlist, queue, stat )
-
-            data['njobs'] = len(my_jlist)
-
-            if data['njobs'] == 0:
-                continue
-
-            data['nusers'] = len( list(set(map(lambda x:x.uid, my_jlist))) )
-
-            l_rwtime  = map(lambda x:x.rwtime , my_jlist)
-            l_cwtime  = map(lambda x:x.cwtime , my_jlist)
-            l_cctime  = map(lambda x:x.cctime , my_jlist)
-            l_rmem    = map(lambda x:x.rmem   , my_jlist)
-            l_cmem    = map(lambda x:x.cmem   , my_jlist)
-            l_cvmem   = map(lambda x:x.cvmem  , my_jlist)
-            l_t_queue = map(lambda x:x.t_queue, my_jlist)
-            l_t_start = map(lambda x:x.t_start, my_jlist)
-
-            l_twait     = [ a-b for a,b in zip(l_t_start, l_t_queue) ]
-            l_eff_wtime = [ 1.0*a/b if b else 0 for a,b in zip(l_cwtime, l_rwtime) ]
-            l_eff_mem   = [ 1.0*a/b if b else 0 for a,b in zip(l_cmem  , l_rmem  ) ]
-            l_cpu_util  = [ 1.0*a/b if b else 0 for a,b in zip(l_cctime, l_cwtime) ]
-
-            data['rwtime'] = {'min'  : min( l_rwtime ),
-                              'max'  : max( l_rwtime ),
-                              'mean' : mean(l_rwtime ),
-                              'std'  : std( l_rwtime )}
-                              #'hist' : histogram(l_rwtime, hbins_time)[0]}
-
-            data['cwtime'] = {'min'  : min( l_cwtime ),
-                              'max'  : max( l_cwtime ),
-                              'mean' : mean(l_cwtime ),
-                              'std'  : std( l_cwtime )}
-                              #'hist' : histogram(l_cwtime, hbins_time)[0]}
-
-            data['cctime'] = {'min'  : min( l_cctime ),
-                              'max'  : max( l_cctime ),
-                              'mean' : mean(l_cctime ),
-                              'std'  : std( l_cctime )}
-                              #'hist' : histogram(l_cctime, hbins_time)[0]}
-
-            data['twait']  = {'min'  : min( l_twait ),
-                              'max'  : max( l_twait ),
-                              'mean' : mean(l_twait ),
-                              'std'  : std( l_twait )}
-                              #'hist' : histogram(l_twait, hbins_time)[0]}
+        __sqlite_job_info__(jobs)
 
-            data['rmem'] = {'min'  : min( l_rmem ),
-                            'max'  : max( l_rmem ),
-                            'mean' : mean( l_rmem ),
-                            'std'  : std( l_rmem )}
-                            #'hist' : histogram(l_rmem, hbins_mem)[0]}
-
-            data['cmem'] = {'min'  : min( l_cmem ),
-                            'max'  : max( l_cmem ),
-                            'mean' : mean(l_cmem ),
-                            'std'  : std( l_cmem )}
-                            #'hist' : histogram(l_cmem, hbins_mem)[0]}
-
-            data['cvmem'] = {'min'  : min( l_cvmem ),
-                             'max'  : max( l_cvmem ),
-                             'mean' : mean(l_cvmem ),
-                             'std'  : std( l_cvmem )}
-                             #'hist' : histogram(l_cvmem, hbins_mem)[0]}
-
-            data['eff_wtime'] = {'min'   : min( l_eff_wtime ),
-                                 'max'   : max( l_eff_wtime ),
-                                 'mean'  : mean(l_eff_wtime ),
-                                 'std'   : std( l_eff_wtime ),
-                                 'var'   : var( l_eff_wtime ),
-                                 'median': median(l_eff_wtime ),
-                                 'bnd'   : __get_2sigma__(histogram(l_eff_wtime, hbins_eff, density=True))}
-
-            data['eff_mem']   = {'min'   : min( l_eff_mem ),
-                                 'max'   : max( l_eff_mem ),
-                                 'mean'  : mean(l_eff_mem ),
-                                 'std'   : std( l_eff_mem ),
-                                 'var'   : var( l_eff_mem ),
-                                 'median': median(l_eff_mem ),
-                                 'bnd'   : __get_2sigma__(histogram(l_eff_mem, hbins_eff, density=True))}
-
-            data['cpu_util']  = {'min'   : min( l_cpu_util ),
-                                 'max'   : max( l_cpu_util ),
-                                 'mean'  : mean(l_cpu_util ),
-                                 'std'   : std( l_cpu_util ),
-                                 'var'   : var( l_cpu_util ),
-                                 'median': median(l_cpu_util ),
-                                 'bnd'   : __get_2sigma__(histogram(l_cpu_util, hbins_eff, density=True))}
+    summeas = __get_statistics__(jobs)
 
     for d in summeas:
         logger.debug('==== %s:%s ====' % (d['queue'],d['stat']))
@@ -648,3 +852,7 @@ if __name__ == "__main__":
 
     if args.monitor:
         __sqlite_job_stat__( summeas )
+
+    ## all tables of the run in one transaction
+    if args.monitor or args.quality:
+        __sqlite_store__().commit()
@@ -0,0 +1,125 @@
+#!/bin/env python
+
+import os
+import sys
+import glob
+import shutil
+import sqlite3
+import tempfile
+import unittest
+import subprocess
+
+TOP_DIR = os.path.dirname( os.path.dirname( os.path.abspath(__file__) ) )
+
+## the job as logged on completion, and again after being retried with the information of the new run only
+JOBLOG_ENTRY = '''<Jobinfo>
+    <JobId>1000000.dccn-l029.dccn.nl</JobId>
+    <Job_Name>batch_0</Job_Name>
+    <Job_Owner>user001@mentat001.dccn.nl</Job_Owner>
+    <resources_used>
+        <cput>1000</cput>
+        <mem>1024kb</mem>
+        <vmem>2048kb</vmem>
+        <walltime>1200</walltime>
+    </resources_used>
+    <job_state>C</job_state>
+    <queue>batch</queue>
+    <Resource_List>
+        <mem>4gb</mem>
+        <walltime>3600</walltime>
+    </Resource_List>
+    <egroup>group01</egroup>
+    <exec_host>dccn-c001.dccn.nl/0</exec_host>
+    <exit_status>271</exit_status>
+    <ctime>1388577600</ctime>
+    <qtime>1388577610</qtime>
+    <start_time>1388577700</start_time>
+    <comp_time>1388578900</comp_time>
+</Jobinfo>
+'''
+
+JOBLOG_RETRY_ENTRY = '''<Jobinfo>
+    <JobId>1000000.dccn-l029.dccn.nl</JobId>
+    <Job_Name>batch_0</Job_Name>
+    <resources_used>
+        <cput>500</cput>
+        <mem>1024kb</mem>
+        <vmem>2048kb</vmem>
+        <walltime>600</walltime>
+    </resources_used>
+    <job_state>C</job_state>
+    <exec_host>dccn-c002.dccn.nl/1</exec_host>
+    <exit_status>0</exit_status>
+    <start_time>1388579000</start_time><comp_time>1388579600</comp_time>
+</Jobinfo>
+'''
+
+class IncrementalIngestTest(unittest.TestCase):
+    '''jobs appended to the torque log file are stored by the runs of mm_trackTorqueJobs.py -i'''
+
+    def setUp(self):
+        self.dir = tempfile.mkdtemp()
+        os.makedirs( os.path.join(self.dir, 'logs') )
+        os.makedirs( os.path.join(self.dir, 'db') )
+
+        self.fconfig = os.path.join(self.dir, 'config.ini')
+        f = open(self.fconfig, 'w')
+        f.write('\n'.join(['[TorqueTracker]',
+                           'TORQUE_LOG_DIR=%s' % os.path.join(self.dir, 'logs'),
+                           'DB_DATA_DIR=%s' % os.path.join(self.dir, 'db'),
+                           'JOBLOG_CACHE_SIZE_MB=0',
+                           'TORQUE_BATCH_QUEUES=batch,short,veryshort,long,verylong,test', '']))
+        f.close()
+
+    def tearDown(self):
+        shutil.rmtree(self.dir)
+
+    def __append_log__(self, entry):
+        f = open( os.path.join(self.dir, 'logs', '20140101'), 'a' )
+        f.write(entry)
+        f.close()
+
+    def __ingest__(self):
+        subprocess.check_call([sys.executable, os.path.join(TOP_DIR, 'mm_trackTorqueJobs.py'), '-c', self.fconfig, '-i', '-d', '20140101'])
+
+    def __stored_job__(self):
+        db_fpaths = glob.glob( os.path.join(self.dir, 'db', '*.db') )
+        self.assertEqual(len(db_fpaths), 1)
+
+        conn = sqlite3.connect(db_fpaths[0])
+        conn.row_factory = sqlite3.Row
+        rows = conn.execute('SELECT * FROM jobs').fetchall()
+        conn.close()
+
+        self.assertEqual(len(rows), 1)
+        return rows[0]
+
+    def test_retry_in_next_run(self):
+        '''the retried job in the next run keeps the information of the stored job it does not provide'''
+
+        self.__append_log__(JOBLOG_ENTRY)
+        self.__ingest__()
+
+        self.__append_log__(JOBLOG_RETRY_ENTRY)
+        self.__ingest__()
+
+        j = self.__stored_job__()
+
+        ## given by the earlier entry only
+        self.assertEqual(j['queue'], 'batch')
+        self.assertEqual(j['uid'], 'user001')
+        self.assertEqual(j['rmem'], 4)
+        self.assertEqual(j['rwtime'], 3600)
+        self.assertEqual(j['t_submit'], 1388577600)
+        self.assertEqual(j['t_queue'], 1388577610)
+
+        ## overridden by the retried entry
+        self.assertEqual(j['jec'], 0)
+        self.assertEqual(j['cwtime'], 600)
+        self.assertEqual(j['cctime'], 500)
+        self.assertEqual(j['node'], 'dccn-c002.dccn.nl/1')
+        self.assertEqual(j['t_start'], 1388579000)
+        self.assertEqual(j['t_finish'], 1388579600)
+
+if __name__ == '__main__':
+    unittest.main()
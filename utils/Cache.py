@@ -0,0 +1,283 @@
+#!/usr/bin/env python
+import os
+import glob
+import time
+import zlib
+import marshal
+import hashlib
+import logging
+import threading
+from Common import getMyLogger
+from Cluster import COMPLETE_JOB_ATTRS
+
+class JobLogCache:
+    '''on-disk cache of the compact job records parsed from torque log (XML) files
+
+       Each log file is cached in a separate file, keyed by the path of the log file; the cached
+       records are only used if the size and modification time of the log file are unchanged.
+       The records are stored column-wise (one tuple per job attribute), marshalled and compressed,
+       together with the parse-quality counters of the log file.'''
+
+    ## bump it whenever the format of the cache files or the compact job records changes
+    version = 3
+
+    def __init__(self, cachedir, maxsize=1024**3, debug=False):
+        self.cachedir = cachedir
+        self.maxsize  = maxsize   ## max. total size of the cache files in bytes
+
+        self.logger = getMyLogger(self.__class__.__name__)
+        if debug:
+            self.logger.setLevel(logging.DEBUG)
+
+        try:
+            os.makedirs(self.cachedir)
+        except OSError, e:
+            if not os.path.isdir(self.cachedir):
+                raise
+
+    def __getstate__(self):
+        '''the logger is left out when the cache is passed to worker processes'''
+        state = self.__dict__.copy()
+        del state['logger']
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self.logger = getMyLogger(self.__class__.__name__)
+
+    def __cache_fpath__(self, fpath):
+        '''path of the cache file for the given log file'''
+        return os.path.join(self.cachedir, hashlib.sha1(os.path.abspath(fpath)).hexdigest() + '.jlc')
+
+    def __header__(self, fpath):
+        '''header identifying the cached content of the given log file'''
+        st = os.stat(fpath)
+        return (self.version, os.path.abspath(fpath), st.st_size, st.st_mtime, COMPLETE_JOB_ATTRS)
+
+    def get(self, fpath):
+        '''get the cached (job records, parse-quality counters) of the log file, or None if they are missing or outdated'''
+
+        cfpath = self.__cache_fpath__(fpath)
+
+        try:
+            f = open(cfpath, 'rb')
+        except IOError, e:
+            return None
+
+        try:
+            if marshal.load(f) != self.__header__(fpath):
+                self.logger.debug('outdated cache for logfile: %s' % fpath)
+                return None
+            columns, quality = marshal.loads( zlib.decompress( f.read() ) )
+        except (EOFError, ValueError, TypeError, zlib.error), e:
+            self.logger.warning('corrupted cache file %s: %s' % (cfpath, repr(e)))
+            return None
+        finally:
+            f.close()
+
+        ## mark the cache file as recently used, for the eviction
+        os.utime(cfpath, None)
+
+        self.logger.debug('loaded cache for logfile: %s' % fpath)
+
+        return zip(*columns), quality
+
+    def put(self, fpath, records, quality):
+        '''store the job records and the parse-quality counters of the log file in the cache'''
+
+        cfpath = self.__cache_fpath__(fpath)
+
+        columns = tuple( zip(*records) ) or tuple( () for k in COMPLETE_JOB_ATTRS )
+
+        ## write to a temporary file first, so that concurrent readers never see a partial file
+        tmp = '%s.%d.tmp' % (cfpath, os.getpid())
+        f = open(tmp, 'wb')
+        try:
+            marshal.dump(self.__header__(fpath), f)
+            f.write( zlib.compress( marshal.dumps( (columns, quality) ), 1 ) )
+        finally:
+            f.close()
+        os.rename(tmp, cfpath)
+
+        self.logger.debug('stored cache for logfile: %s' % fpath)
+
+    def evict(self):
+        '''remove the least recently used cache files until the cache fits in the max. size'''
+
+        cfiles = []
+        for cfpath in glob.glob( os.path.join(self.cachedir, '*.jlc') ):
+            try:
+                st = os.stat(cfpath)
+                cfiles.append( (st.st_mtime, st.st_size, cfpath) )
+            except OSError, e:
+                pass
+
+        total = sum( map(lambda x:x[1], cfiles) )
+        for mtime, size, cfpath in sorted(cfiles):
+            if total <= self.maxsize:
+                break
+            try:
+                os.unlink(cfpath)
+                self.logger.debug('evicted cache file: %s' % cfpath)
+            except OSError, e:
+                pass
+            total -= size
+
+    def purge(self):
+        '''remove all cache files'''
+        for cfpath in glob.glob( os.path.join(self.cachedir, '*.jlc') ) + glob.glob( os.path.join(self.cachedir, '*.tmp') ):
+            try:
+                os.unlink(cfpath)
+            except OSError, e:
+                pass
+
+class MetadataCache:
+    '''on-disk cache of slowly changing cluster metadata (e.g. the CPU speed factors of the nodes),
+       with a time-to-live (TTL) per source
+
+       Each source is cached in a separate file named after the source, holding the time at which the
+       value was fetched and the marshalled value.  A value older than the TTL of its source is fetched
+       again: on the spot, or in a background thread if background is True, in which case the outdated
+       value is returned until the new one is there.  A missing value is always fetched on the spot.
+       Sources with a TTL of 0 are not cached, nor are empty values (e.g. of a failed command).'''
+
+    ## bump it whenever the format of the cache files changes
+    version = 1
+
+    def __init__(self, cachedir, ttls, background=False, debug=False):
+        self.cachedir   = cachedir
+        self.ttls       = ttls         ## TTL in seconds by source
+        self.background = background
+
+        self.values     = {}           ## (fetch time, value) by source, as loaded or fetched
+        self.refreshing = {}           ## background refresh thread by source
+        self.lock       = threading.Lock()
+
+        self.logger = getMyLogger(self.__class__.__name__)
+        if debug:
+            self.logger.setLevel(logging.DEBUG)
+
+        try:
+            os.makedirs(self.cachedir)
+        except OSError, e:
+            if not os.path.isdir(self.cachedir):
+                raise
+
+    def __cache_fpath__(self, source):
+        '''path of the cache file for the given source'''
+        return os.path.join(self.cachedir, source + '.mdc')
+
+    def __load__(self, source):
+        '''load the cached (fetch time, value) of the source, or None if it is not cached'''
+
+        cfpath = self.__cache_fpath__(source)
+
+        try:
+            f = open(cfpath, 'rb')
+        except IOError, e:
+            return None
+
+        try:
+            version, t, value = marshal.load(f)
+        except (EOFError, ValueError, TypeError), e:
+            self.logger.warning('corrupted cache file %s: %s' % (cfpath, repr(e)))
+            return None
+        finally:
+            f.close()
+
+        if version != self.version:
+            return None
+
+        return t, value
+
+    def __fetch__(self, source, fetch):
+        '''fetch the value of the source and store it in the cache if it is not empty'''
+
+        t     = time.time()
+        value = fetch()
+
+        if not value:
+            self.logger.warning('empty metadata %s not cached' % source)
+            return value
+
+        self.lock.acquire()
+        try:
+            self.values[source] = (t, value)
+        finally:
+            self.lock.release()
+
+        ## write to a temporary file first, so that concurrent readers never see a partial file
+        cfpath = self.__cache_fpath__(source)
+        tmp    = '%s.%d.tmp' % (cfpath, os.getpid())
+        try:
+            f = open(tmp, 'wb')
+            try:
+                marshal.dump( (self.version, t, value), f )
+            finally:
+                f.close()
+            os.rename(tmp, cfpath)
+        except (IOError, OSError, ValueError), e:
+            self.logger.warning('cannot store metadata %s: %s' % (source, repr(e)))
+
+        self.logger.debug('fetched metadata %s' % source)
+
+        return value
+
+    def __refresh__(self, source, fetch):
+        '''fetch the value of the source in a background thread'''
+        try:
+            self.__fetch__(source, fetch)
+        except Exception, e:
+            self.logger.error('cannot refresh metadata %s: %s' % (source, repr(e)))
+
+    def get(self, source, fetch):
+        '''get the value of the source, the function fetch is called without arguments to get a new value'''
+
+        ttl = self.ttls.get(source, 0)
+        if ttl <= 0:
+            return fetch()
+
+        cached = self.values.get(source)
+        if cached is None:
+            cached = self.__load__(source)
+            if cached is not None:
+                self.values[source] = cached
+
+        if cached is None:
+            return self.__fetch__(source, fetch)
+
+        t, value = cached
+
+        if time.time() - t < ttl:
+            return value
+
+        if not self.background:
+            return self.__fetch__(source, fetch)
+
+        self.lock.acquire()
+        try:
+            th = self.refreshing.get(source)
+            if th is None or not th.isAlive():
+                self.logger.debug('refreshing metadata %s in background' % source)
+                th = threading.Thread(target=self.__refresh__, args=(source, fetch))
+                th.daemon = True
+                th.start()
+                self.refreshing[source] = th
+        finally:
+            self.lock.release()
+
+        return value
+
+    def invalidate(self, source):
+        '''remove the cached value of the source'''
+
+        self.lock.acquire()
+        try:
+            self.values.pop(source, None)
+        finally:
+            self.lock.release()
+
+        try:
+            os.unlink( self.__cache_fpath__(source) )
+        except OSError, e:
+            pass
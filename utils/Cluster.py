@@ -1,13 +1,30 @@
 #!/usr/bin/env python
 import glob
 import os
+import io
+import gzip
+import bz2
 import pprint
 import logging 
 import re 
 import math 
+import itertools
+import operator
+import pipes
+import multiprocessing
+import numpy
 from Common import getMyLogger
 from Shell import *
 
+## xz-compressed torque log files are read only if a lzma module is available
+try:
+    import lzma
+except ImportError:
+    try:
+        from backports import lzma
+    except ImportError:
+        lzma = None
+
 class Job:
     '''data object containing job information'''
     def __init__(self, **kwargs):
@@ -25,6 +42,125 @@ class Job:
             raise NotImplementedError
         return self.jid == other.jid
 
+class JobTable:
+    '''data object containing completed jobs column-wise, one NumPy array per job attribute
+
+       Attributes with a limited number of distinct values (see JobTable.categorical) are stored as
+       integer codes referring to the list of values in self.categories, with -1 for None.  Numerical
+       attributes are stored as floats with NaN for None; the job id, name and nodes, nearly distinct
+       per job, are stored as they are.'''
+
+    categorical = ('jstat', 'cstat', 'uid', 'gid', 'queue', 'htypes', 'jpath')
+    numerical   = ('jec', 'rmem', 'rwtime', 'cmem', 'cvmem', 'cwtime', 'cctime', 't_submit', 't_queue', 't_start', 't_finish')
+
+    ## numerical attributes given back as integers
+    integer     = ('jec', 'rwtime', 'cwtime', 'cctime', 't_submit', 't_queue', 't_start', 't_finish')
+
+    def __init__(self, columns, categories):
+        self.columns    = columns      ## attribute name -> array
+        self.categories = categories   ## attribute name -> list of values, for categorical attributes
+
+    @classmethod
+    def from_records(cls, records):
+        '''make JobTable out of a list of compact job records (tuples following COMPLETE_JOB_ATTRS)'''
+
+        columns    = {}
+        categories = {}
+        for i, k in enumerate(COMPLETE_JOB_ATTRS):
+            values = map( lambda r:r[i], records )
+            if k in cls.categorical:
+                cats = {}
+                columns[k]    = numpy.array( map( lambda v:-1 if v is None else cats.setdefault(v, len(cats)), values ), dtype=numpy.int32 )
+                categories[k] = sorted( cats.keys(), key=lambda v:cats[v] )
+            elif k in cls.numerical:
+                columns[k] = numpy.array( values, dtype=numpy.float64 )
+            else:
+                columns[k] = numpy.array( values, dtype=object )
+
+        return cls(columns, categories)
+
+    @classmethod
+    def from_jobs(cls, jlist):
+        '''make JobTable out of a list of Job objects'''
+        return cls.from_records( map( lambda o:tuple( o.__dict__[k] for k in COMPLETE_JOB_ATTRS ), jlist ) )
+
+    @classmethod
+    def concat(cls, tables):
+        '''concatenate JobTables into one'''
+
+        if not tables:
+            return cls.from_records([])
+
+        columns    = {}
+        categories = {}
+        for k in COMPLETE_JOB_ATTRS:
+            if k in cls.categorical:
+                ## translate the codes of each table into the codes of the merged list of values
+                cats  = {}
+                codes = []
+                for t in tables:
+                    ## the extra -1 at the end maps the code -1 (i.e. None) onto itself
+                    m = numpy.array( map( lambda v:cats.setdefault(v, len(cats)), t.categories[k] ) + [-1], dtype=numpy.int32 )
+                    codes.append( m[ t.columns[k] ] )
+                columns[k]    = numpy.concatenate( codes )
+                categories[k] = sorted( cats.keys(), key=lambda v:cats[v] )
+            else:
+                columns[k] = numpy.concatenate( map( lambda t:t.columns[k], tables ) )
+
+        return cls(columns, categories)
+
+    def __len__(self):
+        return len(self.columns['jid'])
+
+    def __getitem__(self, k):
+        '''the array of the attribute; the integer codes for categorical attributes'''
+        return self.columns[k]
+
+    def codes(self, k, values):
+        '''the codes of the given values of the categorical attribute, values not presented are left out'''
+        idx = dict( map( lambda x:(x[1], x[0]), enumerate(self.categories[k]) ) )
+        return [ idx[v] for v in values if v in idx ]
+
+    def isin(self, k, values):
+        '''boolean mask of jobs whose categorical attribute takes one of the given values'''
+        return numpy.in1d( self.columns[k], self.codes(k, values) )
+
+    def select(self, idx):
+        '''JobTable with the jobs selected by a boolean mask, an index array or a slice'''
+        return JobTable( dict( map( lambda x:(x[0], x[1][idx]), self.columns.iteritems() ) ), self.categories )
+
+    def decode(self, k, code):
+        '''value of the categorical attribute given its code'''
+        if code < 0:
+            return None
+        return self.categories[k][code]
+
+    def pyvalues(self, k):
+        '''list of the values of the attribute, as Python values'''
+
+        c = self.columns[k].tolist()
+        if k in self.categorical:
+            return map( lambda x:self.decode(k, x), c )
+        elif k in self.integer:
+            return map( lambda x:None if x != x else int(x), c )
+        elif k in self.numerical:
+            return map( lambda x:None if x != x else x, c )
+        else:
+            return c
+
+    def iterrows(self, attrs=None):
+        '''generator yielding a tuple with the given attributes (default: COMPLETE_JOB_ATTRS) of each job, as Python values'''
+
+        if attrs is None:
+            attrs = COMPLETE_JOB_ATTRS
+
+        ## convert in chunks, to bound the memory of the Python values
+        n = 10000
+        for i in xrange(0, len(self), n):
+            t = self.select( slice(i, i+n) )
+            for r in zip( *map( t.pyvalues, attrs ) ):
+                yield r
+
 class Node:
     '''data object containing node information'''
     def __init__(self, **kwargs):
@@ -58,242 +194,826 @@ def interpret_job_ec(ec):
 
     return cstat
 
-def get_complete_jobs(logdir, date, debug=False):
-    '''gets all completed jobs on the given date expressed in format of %Y%m%d (i.e. 20140130)'''
+## memory size with an optional unit, e.g. 1024kb
+RE_MEMORY = re.compile('^([0-9]*)([m,k,g]{0,1}b{0,1})$')
 
-    def __convert_memory__(mymem):
-        '''check if memory type is specified else default to mb'''
+def __convert_memory__(mymem):
+    '''check if memory type is specified else default to mb'''
 
-        gb_mem = None
+    gb_mem = None
 
-        scale = {'b': 1024**3, 'kb': 1024**2, 'mb':1024, 'gb': 1 }
+    scale = {'b': 1024**3, 'kb': 1024**2, 'mb':1024, 'gb': 1 }
 
-        re_mem = re.compile('^([0-9]*)([m,k,g]{0,1}b{0,1})$')
+    m = RE_MEMORY.match(mymem)
 
-        m = re_mem.match(mymem)
+    if m:
+        size   = float( m.group(1) )
+        unit   = m.group(2)
+        if not unit:
+            unit = 'b'
 
-        if m:
-            size   = float( m.group(1) )
-            unit   = m.group(2)
-            if not unit:
-                unit = 'b'
+        gb_mem = size / scale[unit]
 
-            gb_mem = size / scale[unit]
+    return gb_mem
 
-        return gb_mem
+def __convert_walltime__(mytime):
+    '''convert a duration in seconds, or in [[DD:]HH:]MM:SS as in the output of qstat, to seconds'''
 
-    def __readfix_xml__(myfile):
-        '''read and parse the torque log (XML) file'''
-        import xmltodict
- 
-        # open xml file and do some fixing
-        temp = open(myfile, 'r').read()
-        # fix incorrect closing tag
-        #temp = temp.replace('JobId', 'Job_Id')
-        temp = re.sub(r'<Variable_List>.*</Variable_List>', '', temp.replace('JobId', 'Job_Id'))
-        # fix the fact that there is no overarching beginning and end tag.
-        temp = '<data>\n' + temp + '\n</data>'
- 
-        # read xml string
-        xmldoc = xmltodict.parse(temp)
+    secs = 0
+    for x, f in zip( reversed(mytime.split(':')), [1, 60, 3600, 86400] ):
+        secs += int(x) * f
 
-        # sometimes the xml file is empty?? 
-        if not xmldoc['data']:
-           return []
- 
-        # return list containing subdict for each job
-        cjobs = xmldoc['data']['Jobinfo']
- 
-        # if there is only one JobInfo block, the data is not put into a list
-        # to make it consistent, we put data into a list
-        if not isinstance( cjobs, list ):
-            cjobs = [ cjobs ]
+    return secs
+
+def __convert_exec_host__(myhosts):
+    '''convert the exec_host of a job, e.g. dccn-c001/0-1,3+dccn-c002/0, to the list of hosts with one entry per slot'''
+
+    hosts = []
+    for x in myhosts.split('+'):
+        host, slots = (x.split('/', 1) + [''])[0:2]
+        n = 0
+        for r in slots.split(','):
+            r = r.split('-')
+            n += int(r[-1]) - int(r[0]) + 1 if r[0] else 1
+        hosts += [host] * n
+
+    return hosts
+
+## compressions of archived torque log files: (name, file suffix, magic bytes)
+LOGFILE_COMPRESSIONS = (('gz' , '.gz' , '\x1f\x8b'),
+                        ('bz2', '.bz2', 'BZh'),
+                        ('xz' , '.xz' , '\xfd7zXZ\x00'))
+
+def __logfile_compression__(myfile):
+    '''name of the compression of the torque log file, detected by its suffix or otherwise by its magic bytes;
+       None if the file is not compressed'''
+
+    for c, suffix, magic in LOGFILE_COMPRESSIONS:
+        if myfile.endswith(suffix):
+            return c
+
+    f = open(myfile, 'rb')
+    try:
+        head = f.read(8)
+    finally:
+        f.close()
+
+    for c, suffix, magic in LOGFILE_COMPRESSIONS:
+        if head.startswith(magic):
+            return c
+
+    return None
+
+def __open_logfile__(myfile):
+    '''open the torque log file for reading in binary mode, a compressed file is decompressed while being read'''
+
+    c = __logfile_compression__(myfile)
+
+    ## the buffered reader makes readline much faster than that of GzipFile and LZMAFile themselves
+    if c == 'gz':
+        return io.BufferedReader( gzip.GzipFile(myfile, 'rb'), 1024**2 )
+    elif c == 'bz2':
+        return bz2.BZ2File(myfile, 'rb', 1024**2)
+    elif c == 'xz':
+        if not lzma:
+            raise IOError('cannot read xz-compressed logfile %s: no lzma module' % myfile)
+        return io.BufferedReader( lzma.LZMAFile(myfile, 'rb'), 1024**2 )
+    else:
+        return open(myfile, 'rb')
+
+def __iter_jobinfo__(myfile, offset=0, tail=False, elements=None):
+    '''incrementally parse the torque log (XML) file from the given byte offset, yielding a tuple
+       of (dictionary of the <Jobinfo> block, byte offset up to which all records are complete)
+
+       With tail=True, a trailing line that is not yet terminated (i.e. being written) is left out.
+       Compressed files (see LOGFILE_COMPRESSIONS) are read transparently, the byte offset then
+       refers to the decompressed content.
+
+       If elements is given, only those elements of a <Jobinfo> block are taken; the subtrees of
+       the other elements are skipped during the scan.'''
+    from xml.parsers import expat
+
+    logger = getMyLogger(os.path.basename(__file__))
+
+    records = []   # completed <Jobinfo> blocks not yet yielded
+    stack   = []   # (name, children, text) of the open elements within a <Jobinfo> block
+    skip    = [0]  # depth within the subtree of an element being skipped
+
+    def __start__(name, attrs):
+        if skip[0]:
+            skip[0] += 1
+        elif elements is not None and len(stack) == 1 and name not in elements:
+            skip[0] = 1
+        elif name != 'data':
+            stack.append( (name, {}, []) )
+
+    def __chars__(data):
+        if stack and not skip[0]:
+            stack[-1][2].append(data)
+
+    def __end__(name):
+        if skip[0]:
+            skip[0] -= 1
+            return
+
+        if name == 'data':
+            return
+
+        name, children, text = stack.pop()
+
+        ## leaf elements become their (stripped) text, like xmltodict does
+        value = children
+        if not children:
+            value = ''.join(text).strip() or None
+
+        if stack:
+            stack[-1][1][name] = value
+        elif name == 'Jobinfo' and value:
+            records.append(value)
+
+    p = expat.ParserCreate()
+    p.buffer_text          = True   ## text of an element in one call, rather than one call per line or entity
+    p.StartElementHandler  = __start__
+    p.EndElementHandler    = __end__
+    p.CharacterDataHandler = __chars__
+
+    # fix the fact that there is no overarching beginning and end tag.
+    p.Parse('<data>\n', False)
+
+    re_varlist_beg = re.compile(r'<Variable_List>')
+    re_varlist_end = re.compile(r'</Variable_List>')
+
+    ## a line with just a leaf element without entity references, e.g. "    <Job_Name>test</Job_Name>"
+    re_leaf = re.compile(r'\s*<(\w+)>([^<&]*)</\1>\s*$')
+
+    f = __open_logfile__(myfile)
+    try:
+        f.seek(offset)
+        offset_done = offset
+        in_varlist  = False
+        while True:
+            l = f.readline()
+            if not l or (tail and not l.endswith('\n')):
+                break
+
+            pos = offset + len(l)
+
+            ## skip the <Variable_List> blob, it may span over multiple lines
+            if in_varlist:
+                m = re_varlist_end.search(l)
+                if not m:
+                    offset = pos
+                    continue
+                l = l[m.end():]
+                in_varlist = False
+
+            m = None
+            if '<Variable_List>' in l:
+                m = re_varlist_beg.search(l)
+            while m:
+                mm = re_varlist_end.search(l, m.end())
+                if not mm:
+                    l = l[:m.start()]
+                    in_varlist = True
+                    break
+                l = l[:m.start()] + l[mm.end():]
+                m = re_varlist_beg.search(l)
+
+            # fix incorrect closing tag
+            l = l.replace('JobId', 'Job_Id')
+
+            ## fast path: a line with just a leaf element of the <Jobinfo> block is taken (or left out)
+            ## without passing it to the parser, that is the case for most of the lines
+            m = None
+            if len(stack) == 1 and not skip[0]:
+                m = re_leaf.match(l)
+
+            if not m:
+                p.Parse(l, False)
+            elif elements is None or m.group(1) in elements:
+                stack[-1][1][m.group(1)] = m.group(2).strip().decode('utf-8') or None
+
+            ## the checkpoint only moves at line boundaries outside of any <Jobinfo> block
+            offset = pos
+            if not stack:
+                offset_done = offset
+
+            for r in records:
+                yield r, offset_done
+            del records[:]
+    finally:
+        f.close()
+
+    if stack and not tail:
+        logger.warning('incomplete <Jobinfo> block at the end of logfile: %s' % myfile)
+
+def __iter_xml_records__(chunks, tag, elements=None):
+    '''incrementally parse an XML document given as chunks of bytes, e.g. the output of qstat -f -x,
+       yielding the dictionary of each <tag> element as soon as it is complete; the elements are made
+       into dictionaries in the same way as the <Jobinfo> blocks of __iter_jobinfo__, also the subtrees
+       of the elements of a <tag> element that are not in the given elements are skipped.
+
+       The whole document may come in a single line, so the chunks are passed to the parser as they
+       are.  An xml.parsers.expat.ExpatError is raised if the document is not well-formed.'''
+    from xml.parsers import expat
+
+    records = []   # completed <tag> elements not yet yielded
+    stack   = []   # (name, children, text) of the open elements within a <tag> element
+    skip    = [0]  # depth within the subtree of an element being skipped
+
+    def __start__(name, attrs):
+        if skip[0]:
+            skip[0] += 1
+        elif elements is not None and len(stack) == 1 and name not in elements:
+            skip[0] = 1
+        elif stack or name == tag:
+            stack.append( (name, {}, []) )
+
+    def __chars__(data):
+        if stack and not skip[0]:
+            stack[-1][2].append(data)
+
+    def __end__(name):
+        if skip[0]:
+            skip[0] -= 1
+            return
+
+        if not stack:
+            return
+
+        name, children, text = stack.pop()
+
+        value = children
+        if not children:
+            value = ''.join(text).strip() or None
+
+        if stack:
+            stack[-1][1][name] = value
+        elif value:
+            records.append(value)
+
+    p = expat.ParserCreate()
+    p.returns_unicode      = False  ## UTF-8 encoded strings, as the text parsers of the command outputs give
+    p.buffer_text          = True
+    p.StartElementHandler  = __start__
+    p.EndElementHandler    = __end__
+    p.CharacterDataHandler = __chars__
+
+    for data in chunks:
+        p.Parse(data, False)
+        for r in records:
+            yield r
+        del records[:]
+
+    p.Parse('', True)
+    for r in records:
+        yield r
+
+def __new_quality__():
+    '''parse-quality counters of a torque log file: the number of job entries, and the number of entries
+       with each element path of the <Jobinfo> block (see COMPLETE_JOB_SCHEMA) missing, invalid or suspicious'''
+    return {'njobs': 0, 'missing': {}, 'invalid': {}, 'suspicious': {}}
+
+def __count__(quality, problem, element):
+    '''count a record with a problem (missing, invalid or suspicious) in the element path'''
+    quality[problem][element] = quality[problem].get(element, 0) + 1
+
+def __quality_summary__(quality):
+    '''one-line summary of the parse-quality counters'''
+
+    s = '%d jobs' % quality['njobs']
+    for problem in ['missing', 'invalid', 'suspicious']:
+        if quality[problem]:
+            s += '; %s: %s' % (problem, ', '.join( map( lambda x:'%s=%d' % x, sorted(quality[problem].iteritems()) ) ))
+    return s
+
+def __log_quality__(logger, myfile, quality):
+    '''emit the summary of the parse-quality counters of the log file, as a warning if there are invalid elements'''
+
+    if quality['invalid']:
+        logger.warning('logfile %s: %s' % (myfile, __quality_summary__(quality)))
+    else:
+        logger.info('logfile %s: %s' % (myfile, __quality_summary__(quality)))
+
+class RecordSchema:
+    '''declarative mapping of the elements of a record, i.e. the nested dictionary of an XML block as made
+       by __iter_jobinfo__, onto a tuple of attributes
+
+       Each field is a tuple of (attribute, element path, converter, default).  The element path gives the
+       (sub-)element separated by '/', e.g. 'Resource_List/mem'; the converter (None to take the text as it
+       is) makes the attribute value out of the text of the element, the default is taken if the element is
+       missing or its text cannot be converted (the converter raises an error or returns None).  The first
+       field identifies the record.  Several fields may be taken from the same element.
+
+       Each check is a tuple of (element path, attributes, test); a record is counted as suspicious on the
+       element path if the test, called with the values of the attributes, returns True.  The test is not
+       called if any of the values is None.
+
+       The fields are compiled into a list of extraction steps, one per element path, on the first use of
+       a set of top-level elements; see extract.'''
+
+    def __init__(self, fields, checks=()):
+        self.fields   = tuple(fields)
+        self.attrs    = tuple( map( lambda x:x[0], self.fields ) )
+        self.defaults = tuple( map( lambda x:x[3], self.fields ) )
+        self.checks   = tuple( map( lambda x:(x[0], tuple( map( self.attrs.index, x[1] ) ), x[2]), checks ) )
+
+        self.__steps__ = {}   ## compiled extraction steps by set of top-level elements
+
+    def paths(self):
+        '''element paths of the fields, in the order of the fields'''
+        l = []
+        for a, path, conv, default in self.fields:
+            if path not in l:
+                l.append(path)
+        return l
+
+    def elements(self, attrs=None):
+        '''set of the top-level elements needed for the given attributes, None for all elements'''
+
+        if attrs is None:
+            return None
+
+        unknown = filter( lambda a:a not in self.attrs, attrs )
+        if unknown:
+            raise ValueError('unknown attributes: %s' % ','.join(unknown))
+
+        ## the element of the first field identifies the record, it is always needed
+        return frozenset( [ self.fields[self.attrs.index(a)][1].split('/')[0] for a in attrs ] + [ self.fields[0][1].split('/')[0] ] )
+
+    def __compile__(self, elements):
+        '''extraction steps for the fields within the given top-level elements (None for all elements):
+           a list of (element path, element getter, [(attribute index, converter)]), and the checks'''
+
+        steps = []
+        for i, (a, path, conv, default) in enumerate(self.fields):
+            keys = path.split('/')
+            if elements is not None and keys[0] not in elements:
+                continue
+
+            s = filter( lambda x:x[0] == path, steps )
+            if s:
+                s[0][2].append( (i, conv) )
+            elif len(keys) == 1:
+                steps.append( (path, operator.itemgetter(keys[0]), [(i, conv)]) )
+            else:
+                steps.append( (path, lambda r, keys=keys: reduce(operator.getitem, keys, r), [(i, conv)]) )
+
+        checks = filter( lambda c:elements is None or c[0].split('/')[0] in elements, self.checks )
+
+        return steps, checks
+
+    def extract(self, r, quality, elements=None):
+        '''tuple of the attribute values of the record r, only the fields within the given top-level elements
+           are taken if elements is not None.  Missing, invalid and suspicious elements are counted in quality
+           (see __new_quality__) by element path.'''
+
+        try:
+            steps, checks = self.__steps__[elements]
+        except KeyError:
+            steps, checks = self.__steps__[elements] = self.__compile__(elements)
+
+        values = list(self.defaults)
+
+        for path, get, convs in steps:
+            try:
+                v = get(r)
+            except KeyError:
+                __count__(quality, 'missing', path)
+                continue
+            except TypeError:
+                ## the parent element has no sub-elements, e.g. <Resource_List/>
+                __count__(quality, 'invalid', path)
+                continue
+
+            invalid = False
+            for i, conv in convs:
+                if conv is None:
+                    values[i] = v
+                    continue
+                try:
+                    x = conv(v)
+                except (TypeError, ValueError, AttributeError), e:
+                    x = None
+                if x is None:
+                    invalid = True
+                else:
+                    values[i] = x
+
+            if invalid:
+                __count__(quality, 'invalid', path)
+
+        for path, idx, test in checks:
+            x = map( values.__getitem__, idx )
+            if None not in x and test(*x):
+                __count__(quality, 'suspicious', path)
+
+        return tuple(values)
+
+## fields of a completed job out of a <Jobinfo> block, in the order of the compact records passed between processes
+COMPLETE_JOB_SCHEMA = RecordSchema(
+    [('jid'     , 'Job_Id'                 , None                                     , None     ),  # torque job id
+     ('jname'   , 'Job_Name'               , None                                     , None     ),  # torque job name
+     ('jstat'   , 'job_state'              , None                                     , None     ),  # torque job status
+     ('jec'     , 'exit_status'            , int                                      , None     ),  # job exit code
+     ('cstat'   , 'exit_status'            , lambda v:interpret_job_ec(int(v))        , 'unknown'),  # category status interpreted from jec
+     ('uid'     , 'Job_Owner'              , lambda v:v.split('@')[0]                 , None     ),  # job owner
+     ('gid'     , 'egroup'                 , None                                     , None     ),  # job owner's group id
+     ('queue'   , 'queue'                  , None                                     , None     ),  # job queue
+     ('rmem'    , 'Resource_List/mem'      , __convert_memory__                       , 0        ),  # requested memory in byte
+     ('rwtime'  , 'Resource_List/walltime' , int                                      , 0        ),  # requested wall-clock time in second
+     ('htypes'  , 'Hold_Types'             , None                                     , None     ),  # the Job's Hold_Types
+     ('jpath'   , 'Join_Path'              , None                                     , None     ),  # the Job's Join_Path
+     ('cmem'    , 'resources_used/mem'     , __convert_memory__                       , None     ),  # consumed physical memory in byte
+     ('cvmem'   , 'resources_used/vmem'    , __convert_memory__                       , None     ),  # consumed virtual memory in byte
+     ('cwtime'  , 'resources_used/walltime', int                                      , None     ),  # consumed wall-clock time in second
+     ('cctime'  , 'resources_used/cput'    , int                                      , None     ),  # consumed CPU time in second
+     ('node'    , 'exec_host'              , None                                     , None     ),  # compute node host
+     ('t_submit', 'ctime'                  , int                                      , None     ),  # timestamp for job being submitted to Torque
+     ('t_queue' , 'qtime'                  , int                                      , None     ),  # timestamp for job being scheduled in the queue
+     ('t_start' , 'start_time'             , int                                      , None     ),  # timestamp for job being started on execution node
+     ('t_finish', 'comp_time'              , int                                      , None     )], # timestamp for job being completed
+    ## more CPU time than wall-clock time is only possible for multi-core jobs
+    checks = [('resources_used/cput', ('cctime', 'cwtime'), lambda ct, wt: ct > wt)])
+
+## attributes of a completed job, in the order of the compact records passed between processes
+COMPLETE_JOB_ATTRS = COMPLETE_JOB_SCHEMA.attrs
+
+## fields of a job out of a <Job> element of qstat -f -x, as the attributes of the jobs of get_qstat_jobs
+QSTAT_JOB_SCHEMA = RecordSchema(
+    [('jid'   , 'Job_Id'                 , None                                        , None),  # torque job id
+     ('uid'   , 'Job_Owner'              , lambda v:v.split('@')[0]                    , None),  # job owner
+     ('queue' , 'queue'                  , None                                        , None),  # job queue
+     ('jname' , 'Job_Name'               , None                                        , None),  # torque job name
+     ('sid'   , 'session_id'             , None                                        , '--'),  # session id
+     ('nds'   , 'Resource_List/nodect'   , None                                        , '--'),  # number of nodes
+     ('tsk'   , 'Resource_List/nodes'    , None                                        , '--'),  # requested nodes and tasks, e.g. 1:ppn=4
+     ('rmem'  , 'Resource_List/mem'      , __convert_memory__                          , 0   ),  # requested memory in GB, not rounded
+     ('rtime' , 'Resource_List/walltime' , lambda v:__convert_walltime__(v) / 60       , 0   ),  # requested wall-clock time in minutes
+     ('jstat' , 'job_state'              , None                                        , None),  # job status
+     ('ctime' , 'resources_used/walltime', None                                        , '--'),  # wall-clock time consumption
+     ('cmem'  , 'resources_used/mem'     , __convert_memory__                          , None),  # consumed physical memory in GB
+     ('cvmem' , 'resources_used/vmem'    , __convert_memory__                          , None),  # consumed virtual memory in GB
+     ('cwtime', 'resources_used/walltime', __convert_walltime__                        , None),  # consumed wall-clock time in second
+     ('cctime', 'resources_used/cput'    , __convert_walltime__                        , None),  # consumed CPU time in second
+     ('node'  , 'exec_host'              , __convert_exec_host__                       , None)]) # compute node hosts, one per slot
+
+## physical memory in the status of a node, e.g. ...,physmem=65830580kb,...
+RE_NODE_PHYSMEM = re.compile('(?:^|,)physmem=(\w+)')
+
+## fields of a node out of a <Node> element of pbsnodes -x
+PBSNODES_NODE_SCHEMA = RecordSchema(
+    [('host'      , 'name'      , None                                                            , None  ),  # hostname
+     ('stat'      , 'state'     , None                                                            , 'free'),  # state
+     ('ncores'    , 'np'        , int                                                             , 1     ),  # ncores
+     ('ngpus'     , 'gpus'      , int                                                             , 0     ),  # number of GPUs
+     ('properties', 'properties', None                                                            , None  ),  # node properties
+     ('physmem'   , 'status'    , lambda v:__convert_memory__( RE_NODE_PHYSMEM.search(v).group(1) ), None  )]) # physical memory in GB
+
+def __job_record__(o):
+    '''compact record (tuple following COMPLETE_JOB_ATTRS) of the Job object'''
+    return tuple( o.__dict__[k] for k in COMPLETE_JOB_ATTRS )
+
+def __record_job__(r):
+    '''Job object of the compact record'''
+    return Job( **dict(zip(COMPLETE_JOB_ATTRS, r)) )
+
+def merge_retried_entry(earlier, later, missing):
+    '''values of a retried job merged from an earlier and a later entry (e.g. in the log file or in the database):
+       the values of the later entry, except the ones it does not provide (None or the value in missing)'''
+    return tuple( p if v is None or v == m else v for p, v, m in zip(earlier, later, missing) )
+
+def __merge_retried_records__(records, logger):
+    '''merge the records of retried jobs (seperate entry in log file with same job id) into one record;
+       attributes provided by the later entry override the ones of the earlier entry'''
+
+    ## attribute values of a job entry that does not provide the attribute
+    missing = COMPLETE_JOB_SCHEMA.defaults
+
+    rlist = []
+    ridx  = {}  ## index of records in rlist by job id
+
+    nretried = 0
+    for r in records:
+
+        i = ridx.get(r[0])
+        if i is None:
+            ridx[r[0]] = len(rlist)
+            rlist.append( r )
+            continue
+
+        nretried += 1
+
+        rlist[i] = merge_retried_entry(rlist[i], r, missing)
+
+    if nretried:
+        logger.info('merged %d entries of retried jobs' % nretried)
 
-        return cjobs
+    return rlist
+
+def __merge_retried_jobs__(jobs, logger):
+    '''merge the retried jobs (seperate entry in log file with same job id) into one Job object,
+       following the rules of __merge_retried_records__'''
+    return map( __record_job__, __merge_retried_records__( itertools.imap( __job_record__, jobs ), logger ) )
+
+def iter_complete_jobs(logdir, date, debug=False, fields=None, quality=None):
+    '''generator yielding the completed jobs on the given date expressed in format of %Y%m%d (i.e. 20140130)
+
+       the torque log (XML) files are parsed incrementally, one <Jobinfo> record at a time, so that
+       the memory usage is bounded by a single record.  A retried job (seperate entry in log file
+       with same job id) is yielded once for each of its entries; see get_complete_jobs for merging them,
+       for the fields and for the quality.'''
 
     ## get list of XML files corresponding to the jobs from the given date 
     xmlfiles = glob.glob( os.path.join(logdir, date) + '*' )
 
-    jlist = []
-
     logger = getMyLogger(os.path.basename(__file__))
 
     if debug:
         logger.setLevel(logging.DEBUG)
 
+    elements = COMPLETE_JOB_SCHEMA.elements(fields)
+
     for f in xmlfiles:
 
         logger.debug('parsing logfile: %s' % f)
 
-        cjobs = __readfix_xml__(f)
-
-        for j in cjobs:
-
-            o = Job( jid      = j['Job_Id'],                  # torque job id
-                     jname    = None,                         # torque job name
-                     jstat    = None,                         # torque job status
-                     jec      = None,                         # job exit code
-                     cstat    = 'unknown',                    # category status interpreted from jec 
-                     uid      = None,                         # job owner
-                     gid      = None,                         # job owner's group id
-                     queue    = None,                         # job queue
-                     rmem     = 0,                            # requested memory in byte 
-                     rwtime   = 0,                            # requested wall-clock time in second
-                     htypes   = None,                         # the Job's Hold_Types 
-                     jpath    = None,                         # the Job's Join_Path 
-                     cmem     = None,                         # consumed physical memory in byte
-                     cvmem    = None,                         # consumed virtual memory in byte
-                     cwtime   = None,                         # consumed wall-clock time in second
-                     cctime   = None,                         # consumed CPU time in second
-                     node     = None,                         # compute node host
-                     t_submit = None,                         # timestamp for job being submitted to Torque
-                     t_queue  = None,                         # timestamp for job being scheduled in the queue 
-                     t_start  = None,                         # timestamp for job being started on execution node 
-                     t_finish = None                          # timestamp for job being completed 
-                   )
-           
-            ## handles the retried jobs (seperate entry in log file with same job id)
-            is_newjob = True
-            try:
-                o = jlist[ jlist.index(o) ]
-                is_newjob = False
-                logger.warning('job already presented in list: %s' % o.jid)
-            except:
-                pass
- 
-            ## attributes may not be available 
-            ## - resource requirement
-            try:
-                o.jname  = j['Job_Name']
-            except KeyError,e:
-                logger.warning('cannot find "Job_Name" for job %s' % o.jid)
+        q = __new_quality__()
+        for j, offset in __iter_jobinfo__(f, elements=elements):
+            q['njobs'] += 1
+            yield __record_job__( COMPLETE_JOB_SCHEMA.extract(j, q, elements) )
 
-            ## - resource requirement
-            try:
-                o.rmem   = __convert_memory__( j['Resource_List']['mem'] )
-                o.rwtime = int( j['Resource_List']['walltime'] )
-            except KeyError,e:
-                logger.warning('cannot find "Resource_List" for job %s' % o.jid)
-            except TypeError,e:
-                logger.warning('empty "Resource_List" for job %s' % o.jid)
-            
-            ## - resource consumption
-            try:
-                o.cmem   = __convert_memory__( j['resources_used']['mem']  )
-                o.cvmem  = __convert_memory__( j['resources_used']['vmem'] )
-                o.cwtime = int( j['resources_used']['walltime'] )
-                o.cctime = int( j['resources_used']['cput'] )
+        __log_quality__(logger, f, q)
+        if quality is not None:
+            quality[f] = q
 
-                if o.cctime > o.cwtime:
-                    logger.warning('Job %s: CPU time consumption (%d) > wallclock time consumption (%d)' % (o.jid, o.cctime, o.cwtime))
+def get_complete_jobs(logdir, date, debug=False, cache=None, fields=None, quality=None):
+    '''gets all completed jobs on the given date expressed in format of %Y%m%d (i.e. 20140130)
 
-            except KeyError,e:
-                logger.warning('cannot find "resources_used" for job %s' % o.jid)
+       If a cache (see utils.Cache.JobLogCache) is given, the jobs of log files that have not changed
+       since they were cached are loaded from the cache instead of being parsed again.
 
-            ## - job exit status 
-            try:
-                o.jec   = int( j['exit_status'] )
-                o.cstat = interpret_job_ec( o.jec ) 
-            except KeyError,e:
-                logger.warning('cannot find "exit_status" for job %s' % o.jid)
+       If fields (a list of job attributes, see COMPLETE_JOB_ATTRS) is given, only those attributes
+       (and the job id) are taken from the log files; the others are left with their default values.
+       The cache is only filled by parsing all fields.
 
-            ## - job execution host 
-            try:
-                o.node = j['exec_host']
-            except KeyError,e:
-                logger.warning('cannot find "exec_host" for job %s' % o.jid)
+       Jobs with missing or invalid elements are counted per log file rather than logged one by one;
+       a summary is logged once per parsed file.  If a dictionary is given as quality, the counters
+       (see __new_quality__) are put in it keyed by the path of the log file.'''
 
-            ## - job state 
-            try:
-                o.jstat = j['job_state']
-            except KeyError,e:
-                logger.warning('cannot find "job_state" for job %s' % o.jid)
+    logger = getMyLogger(os.path.basename(__file__))
 
-            ## - job owner
-            try:
-               o.uid = j['Job_Owner'].split('@')[0]
-            except KeyError,e:
-                logger.warning('cannot find "Job_Owner" for job %s' % o.jid)
+    if debug:
+        logger.setLevel(logging.DEBUG)
 
-            ## - job owner's group
-            try:
-               o.gid = j['egroup']
-            except KeyError,e:
-                logger.warning('cannot find "egroup" for job %s' % o.jid)
+    if not cache:
+        return __merge_retried_jobs__(iter_complete_jobs(logdir, date, debug=debug, fields=fields, quality=quality), logger)
 
-            ## - job queue 
-            try:
-               o.queue = j['queue']
-            except KeyError,e:
-                logger.warning('cannot find "queue" for job %s' % o.jid)
+    records = []
+    for f in glob.glob( os.path.join(logdir, date) + '*' ):
+        recs, q = __load_logfile__( (f, cache, fields) )
+        records += recs
+        if quality is not None:
+            quality[f] = q
 
-            ## - job Hold_Types 
-            try:
-               o.htypes = j['Hold_Types']
-            except KeyError,e:
-                logger.warning('cannot find "Hold_Types" for job %s' % o.jid)
+    cache.evict()
 
-            ## - job Join_Path
-            try:
-               o.jpath = j['Join_Path']
-            except KeyError,e:
-                logger.warning('cannot find "Join_Path" for job %s' % o.jid)
+    return map( __record_job__, __merge_retried_records__(records, logger) )
 
-            ## - job submission(creation?) time 
-            try:
-               o.t_submit = int(j['ctime'])
-            except KeyError,e:
-                logger.warning('cannot find "ctime" for job %s' % o.jid)
- 
-            ## - job queue time
-            try:
-               o.t_queue  = int(j['qtime'])
-            except KeyError,e:
-                logger.warning('cannot find "qtime" for job %s' % o.jid)
+def __parse_logfile__(myfile, fields=None):
+    '''parse the torque log (XML) file into a list of compact job records (tuples following COMPLETE_JOB_ATTRS),
+       only the given fields are taken if fields is not None.  It returns a tuple of (records, parse-quality counters).'''
 
-            ## - job start time 
-            try:
-                o.t_start = int( j['start_time'] )
-            except KeyError,e:
-                logger.warning('cannot find "start_time" for job %s' % o.jid)
+    logger = getMyLogger(os.path.basename(__file__))
 
-            ## - job complete time 
-            try:
-                o.t_finish = int( j['comp_time'] )
-            except KeyError,e:
-                logger.warning('cannot find "comp_time" for job %s' % o.jid)
+    logger.debug('parsing logfile: %s' % myfile)
+
+    elements = COMPLETE_JOB_SCHEMA.elements(fields)
+
+    quality = __new_quality__()
+
+    extract = COMPLETE_JOB_SCHEMA.extract
+    records = [ extract(j, quality, elements) for j, offset in __iter_jobinfo__(myfile, elements=elements) ]
+    quality['njobs'] = len(records)
+
+    __log_quality__(logger, myfile, quality)
+
+    return records, quality
 
-            if is_newjob:
-                jlist.append( o )
+def __load_logfile__(args):
+    '''get the compact job records and the parse-quality counters of the torque log (XML) file given by
+       args = (myfile, cache, fields), from the cache if the file has not changed since it was cached'''
+
+    myfile, cache, fields = args
+
+    cached = None
+    if cache:
+        cached = cache.get(myfile)
+
+    if cached is not None:
+        return cached
+
+    records, quality = __parse_logfile__(myfile, fields)
+
+    ## records with a part of the fields would be incomplete for the other users of the cache
+    if cache and fields is None:
+        cache.put(myfile, records, quality)
+
+    return records, quality
+
+def __iter_period_records__(logdir, dates, nworkers, cache, fields, quality, logger):
+    '''generator yielding a tuple of (date, merged compact job records of the date) for each of the
+       given dates in order, the torque log files are parsed by a pool of nworkers processes if nworkers > 1.
+       The parse-quality counters of the log files are put in quality if it is not None.'''
+
+    ## get list of XML files corresponding to the jobs from each of the given dates
+    xmlfiles = map( lambda d:glob.glob( os.path.join(logdir, d) + '*' ), dates )
+
+    pool = None
+    if nworkers > 1:
+        pool = multiprocessing.Pool(nworkers)
+
+    try:
+        ## results come back in the order of the files, regardless which worker finishes first
+        fargs = map( lambda f:(f, cache, fields), sum(xmlfiles, []) )
+        if pool:
+            records = pool.imap( __load_logfile__, fargs )
+        else:
+            records = itertools.imap( __load_logfile__, fargs )
+
+        for d, files in zip(dates, xmlfiles):
+            logger.info('collecting jobs on %s' % d)
+
+            recs = []
+            for f in files:
+                r, q = records.next()
+                recs += r
+                if quality is not None:
+                    quality[f] = q
+
+            ## retried jobs are merged within the same date, as get_complete_jobs does
+            yield d, __merge_retried_records__(recs, logger)
+
+        if pool:
+            pool.close()
+    except:
+        if pool:
+            pool.terminate()
+        raise
+    finally:
+        if pool:
+            pool.join()
+
+    if cache:
+        cache.evict()
+
+def get_complete_jobs_period(logdir, dates, nworkers=1, debug=False, cache=None, fields=None, quality=None):
+    '''gets all completed jobs on the given dates, each expressed in format of %Y%m%d (i.e. 20140130)
+
+       With nworkers > 1, the torque log files are parsed by a pool of nworkers processes.  The result
+       is identical to the concatenation of get_complete_jobs on each of the dates in the given order.
+       See get_complete_jobs for the cache, the fields and the quality.'''
+
+    logger = getMyLogger(os.path.basename(__file__))
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    jlist = []
+    for d, records in __iter_period_records__(logdir, dates, nworkers, cache, fields, quality, logger):
+        jlist += map( __record_job__, records )
 
     return jlist
 
-def get_mentat_node_properties(debug=False):
-    '''get memtat node properties (memory, ncores, network, no. active VNC sessions)'''
+def get_complete_jobs_table(logdir, dates, nworkers=1, debug=False, cache=None, fields=None, quality=None):
+    '''gets all completed jobs on the given dates as a JobTable, see get_complete_jobs_period'''
+
     logger = getMyLogger(os.path.basename(__file__))
 
     if debug:
         logger.setLevel(logging.DEBUG)
 
+    ## only the records of one date are kept as Python objects at a time
+    tables = []
+    for d, records in __iter_period_records__(logdir, dates, nworkers, cache, fields, quality, logger):
+        tables.append( JobTable.from_records(records) )
+        del records
+
+    return JobTable.concat(tables)
+
+def get_appended_jobs(logfile, checkpoint=None, debug=False):
+    '''gets the completed jobs appended to the torque log (XML) file since the given checkpoint
+
+       The checkpoint is a tuple of (inode, byte offset) as returned by a previous call; the file is
+       parsed from the beginning if no checkpoint is given, or if the file has been replaced (i.e. a
+       different inode) or truncated since then.  Only complete <Jobinfo> records are taken; a record
+       still being written is picked up by the next call.
+
+       It returns a tuple of (list of Job objects, new checkpoint).'''
+
+    logger = getMyLogger(os.path.basename(__file__))
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    st = os.stat(logfile)
+
+    ## the offset in a compressed file refers to the decompressed content, it cannot be checked against the file size;
+    ## compressed files are not appended to anyway
+    offset = 0
+    if checkpoint and checkpoint[0] == st.st_ino and (checkpoint[1] <= st.st_size or __logfile_compression__(logfile)):
+        offset = checkpoint[1]
+
+    logger.debug('parsing logfile: %s from byte %d' % (logfile, offset))
+
+    quality = __new_quality__()
+
+    jobs = []
+    for j, offset_done in __iter_jobinfo__(logfile, offset=offset, tail=True):
+        quality['njobs'] += 1
+        jobs.append( __record_job__( COMPLETE_JOB_SCHEMA.extract(j, quality) ) )
+        offset = offset_done
+
+    if jobs:
+        __log_quality__(logger, logfile, quality)
+
+    return __merge_retried_jobs__(jobs, logger), (st.st_ino, offset)
+
+
+## shell script run on a mentat node to get its properties:
+##  - number of cores
+##  - total memory
+##  - number of VNC sessions
+##  - load average
+##  - top 5 processes according to CPU utilization
+MENTAT_PROBE_SCRIPT = 'grep processor /proc/cpuinfo | wc -l | xargs echo \'ncores: \'; grep MemTotal /proc/meminfo; ps aux | grep Xvnc | grep -v grep | wc -l | xargs echo \'VNC sessions: \'; cat /proc/loadavg | xargs echo \'Load average: \'; ps -eo pcpu,pmem,pid,user,etime,args | grep -v \'ps -eo pcpu,pmem,pid,user,etime,args\' | sort -n -k 1 -r | grep -v \'%CPU\' | head -5'
+
+RE_MENTAT_NCORES  = re.compile('^ncores:\s+(\d+)$')
+RE_MENTAT_MEMORY  = re.compile('^MemTotal:\s+((\d+)\s+(\S+))$')
+RE_MENTAT_NXVNC   = re.compile('^VNC sessions:\s+(\d+)$')
+RE_MENTAT_LOADAVG = re.compile('^Load average:\s+([\d|\.]+)\s+([\d|\.]+)\s+([\d|\.]+)\s+([\d|/]+)\s+.*$')
+RE_MENTAT_TOP_PS  = re.compile('^[\d|\.]+\s+[\d|\.]+\s+[\d]+.*$')
+
+def __new_mentat_node__(host):
+    '''Node of the given mentat host with the default attributes, before the output of MENTAT_PROBE_SCRIPT is applied'''
+    return Node(host     = host,         ## hostname
+                stat     = 'free',       ## state, down if the host cannot be probed
+                ncores   = 0,            ## number of CPU cores
+                mem      = 0.,           ## total physical memory
+                nxvnc    = 0,            ## number of Xvnc session
+                load_1m  = 0,            ## 1 min. load average 
+                load_5m  = 0,            ## 5 min. load average 
+                load_10m = 0,            ## 10 min. load average 
+                total_ps = 0,            ## total processes 
+                top_ps   = [])           ## top processes
+
+def __set_mentat_node_property__(n, l):
+    '''set the property given by the (stripped) line l of the output of MENTAT_PROBE_SCRIPT on the mentat node n'''
+
     conv_mem_gb = { 'kB': 1024**2, 'mB': 1024 }
 
+    m = RE_MENTAT_NCORES.match(l)
+    if m:
+        n.ncores = int( m.group(1) )
+        return
+
+    m = RE_MENTAT_MEMORY.match(l)
+    if m:
+        n.mem = math.ceil( float( m.group(2) ) / conv_mem_gb[ m.group(3) ] )
+        return
+
+    m = RE_MENTAT_NXVNC.match(l)
+    if m:
+        n.nxvnc = int( m.group(1) )
+        return
+
+    m = RE_MENTAT_LOADAVG.match(l)
+    if m:
+        n.load_1m  = float( m.group(1) ) 
+        n.load_5m  = float( m.group(2) ) 
+        n.load_10m = float( m.group(3) ) 
+        n.total_ps = int( m.group(4).split('/')[1] )
+        return
+
+    m = RE_MENTAT_TOP_PS.match(l)
+    if m:
+        n.top_ps.append(l)
+        return
+
+def get_mentat_node_properties(debug=False):
+    '''get memtat node properties (memory, ncores, network, no. active VNC sessions)'''
+    logger = getMyLogger(os.path.basename(__file__))
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
     s = Shell(debug=False)
 
-    ## get memtat node properties 
-    ##  - node name
-    ##  - number of cores
-    ##  - total memory
-    ##  - number of VNC sessions
-    ##  - top 5 processes according to CPU utilization 
-    cmd = 'cluster-ssh -m "grep processor /proc/cpuinfo | wc -l | xargs echo \'ncores: \'; grep MemTotal /proc/meminfo; ps aux | grep Xvnc | grep -v grep | wc -l | xargs echo \'VNC sessions: \'; cat /proc/loadavg | xargs echo \'Load average: \'; ps -eo pcpu,pmem,pid,user,etime,args | grep -v \'ps -eo pcpu,pmem,pid,user,etime,args\' | sort -n -k 1 -r | grep -v \'%CPU\' | head -5"'
+    ## get memtat node properties, see MENTAT_PROBE_SCRIPT
+    cmd = 'cluster-ssh -m "%s"' % MENTAT_PROBE_SCRIPT
     rc, output, m = s.cmd1(cmd, allowed_exit=[0,255], timeout=300)
 
     re_node_name = re.compile('^\-*\s+(\S+)\s+\-*$')
-    re_ncores    = re.compile('^ncores:\s+(\d+)$')
-    re_memory    = re.compile('^MemTotal:\s+((\d+)\s+(\S+))$')
-    re_nxvnc     = re.compile('^VNC sessions:\s+(\d+)$')
-    re_loadavg   = re.compile('^Load average:\s+([\d|\.]+)\s+([\d|\.]+)\s+([\d|\.]+)\s+([\d|/]+)\s+.*$')
-    re_top_ps    = re.compile('^[\d|\.]+\s+[\d|\.]+\s+[\d]+.*$')
     nodes = []
 
     if rc not in [0,255]:
@@ -307,57 +1027,73 @@ def get_mentat_node_properties(debug=False):
 
             m = re_node_name.match(l)
             if m:
-                n = Node(host     = m.group(1),   ## hostname
-                         ncores   = 0,            ## number of CPU cores
-                         mem      = 0.,           ## total physical memory
-                         nxvnc    = 0,            ## number of Xvnc session
-                         load_1m  = 0,            ## 1 min. load average 
-                         load_5m  = 0,            ## 5 min. load average 
-                         load_10m = 0,            ## 10 min. load average 
-                         total_ps = 0,            ## total processes 
-                         top_ps   = [])           ## top processes
-
-                nodes.append( n )
+                nodes.append( __new_mentat_node__( m.group(1) ) )
                 continue
 
-            m = re_ncores.match(l)
-            if m:
-                nodes[-1].ncores = int( m.group(1) )
-                continue
+            if nodes:
+                __set_mentat_node_property__(nodes[-1], l)
 
-            m = re_memory.match(l)
-            if m:
-                nodes[-1].mem = math.ceil( float( m.group(2) ) / conv_mem_gb[ m.group(3) ] )
-                continue
+    return nodes
 
-            m = re_nxvnc.match(l)
-            if m:
-                nodes[-1].nxvnc = int( m.group(1) )
-                continue
+def __probe_mentat_node__(host, s_cmd, timeout, logger):
+    '''run MENTAT_PROBE_SCRIPT on the mentat host through the command template s_cmd (see get_mentat_nodes),
+       the output is applied to the Node of the host as it comes in; the Node is marked down if the command
+       fails or does not finish within the timeout'''
 
-            m = re_loadavg.match(l)
-            if m:
-                nodes[-1].load_1m  = float( m.group(1) ) 
-                nodes[-1].load_5m  = float( m.group(2) ) 
-                nodes[-1].load_10m = float( m.group(3) ) 
-                nodes[-1].total_ps = int( m.group(4).split('/')[1] )
-                continue
+    n = __new_mentat_node__(host)
 
-            m = re_top_ps.match(l)
-            if m:
-                nodes[-1].top_ps.append(l)
-                continue
+    cmd = '%s %s' % (s_cmd % {'host': host}, pipes.quote(MENTAT_PROBE_SCRIPT))
 
-    return nodes
+    s = Shell(debug=False)
+    out = s.stream(cmd, allowed_exit=None, timeout=timeout)
+    for l in out:
+        __set_mentat_node_property__(n, l.strip())
+
+    if out.rc != 0:
+        logger.warning('mentat node %s marked down, command %s return non-exit code: %d' % (host, s_cmd % {'host': host}, out.rc))
+        n = __new_mentat_node__(host)
+        n.stat = 'down'
 
-def get_cluster_node_properties(debug=False):
-    '''parse pbsnodes -a to get node properties'''
+    return n
+
+def get_mentat_nodes(hosts, s_cmd='ssh -o BatchMode=yes -o ConnectTimeout=10 %(host)s', timeout=30, nthreads=8, debug=False):
+    '''get the properties of the given mentat hosts as get_mentat_node_properties does, probing the hosts concurrently
+
+       The command template s_cmd gives the command to run a shell script on the host %(host)s; the script
+       (MENTAT_PROBE_SCRIPT) is appended to it as a single quoted argument.  At most nthreads hosts are probed
+       at the same time, each within the given timeout in seconds, so that an unreachable or hanging host
+       cannot hold up the poll; such a host is returned with stat set to down.  The nodes are returned in
+       the order of the hosts.'''
+
+    from Scheduler import Scheduler
 
     logger = getMyLogger(os.path.basename(__file__))
 
     if debug:
         logger.setLevel(logging.DEBUG)
 
+    ## a host listed twice is probed once
+    hosts = sorted( set(hosts), key=hosts.index )
+
+    sched = Scheduler(nthreads=nthreads, debug=debug)
+    for h in hosts:
+        sched.submit(h, __probe_mentat_node__, h, s_cmd, timeout, logger)
+    sched.run()
+
+    nodes = []
+    for h in hosts:
+        try:
+            nodes.append( sched.result(h) )
+        except Exception, e:
+            n = __new_mentat_node__(h)
+            n.stat = 'down'
+            nodes.append( n )
+
+    return nodes
+
+def get_cluster_node_speeds(debug=False):
+    '''get the scale factor of the CPU speed of the cluster nodes from cluster-torqueconfig, as a dictionary of host -> speed'''
+
     s = Shell(debug=False)
 
     ## get scale factor for node speed
@@ -373,113 +1109,276 @@ def get_cluster_node_properties(debug=False):
             if m:
                 speeds[m.group(1)] = float(m.group(2))
 
+    return speeds
+
+def set_cluster_node_speeds(nodes, speeds):
+    '''set the CPU speed of the nodes from the dictionary of host -> speed, see get_cluster_node_speeds'''
+
+    for n in nodes:
+        try:
+            n.cpu_speed = speeds[n.host]
+        except KeyError, e:
+            pass
+
+def __new_node__(host):
+    '''Node of the given host with the default attributes, before the output of pbsnodes is applied'''
+    return Node(host          = host,        # hostname
+                stat          = 'free',      # state
+                ncores        = 1,           # ncores
+                ncores_idle   = 1,           # ncores idling
+                ncores_inter  = 0,           # ncores running interactive jobs 
+                ncores_matlab = 0,           # ncores running batch-mode matlab jobs 
+                ncores_vgl    = 0,           # ncores running vgl jobs
+                ncores_batch  = 0,           # ncores running batch jobs
+                cpu_type      = '',          # CPU type
+                cpu_speed     = 1.0,         # CPU speed scale 
+                mem           = 1,           # memory total
+                memleft       = 1,           # memory left
+                memleft_c     = 1,           # avg. memory left per core
+                ngpus         = 0,           # number of GPUs
+                net           = '',          # network connectivity
+                interactive   = False,       # node allowing interactive jobs 
+                matlab        = False,       # node allowing matlab batch jobs 
+                vgl           = False,       # node allowing VirtualGL jobs 
+                batch         = False,       # node allowing batch jobs 
+                props         = [])          # other queue properties
+
+## node properties giving the memory and the network of the node, e.g. ram64gb and network10GigE
+RE_NODE_MEM = re.compile('^ram(\d+)gb$')
+RE_NODE_NET = re.compile('^network(\S+)$')
+
+def __set_node_properties__(n, properties):
+    '''set the CPU type, memory, network and supported job types of the node n from its (comma-separated) properties'''
+
+    data = properties.split(',')
+
+    ## TODO: find a better way to get CPU type
+    n.cpu_type = ' '.join(data[0:2])
+
+    for d in data[2:]:
+        mm = RE_NODE_MEM.match(d)
+        if mm:
+            n.mem     = int( mm.group(1) )
+            n.memleft = n.mem
+            continue
+        mm = RE_NODE_NET.match(d)
+        if mm:
+            n.net = mm.group(1)
+            continue
+
+        n.props.append(d)
+
+    ## update job type support according to node properties
+    n.interactive = 'interactive' in n.props
+    n.matlab      = 'matlab'      in n.props
+    n.vgl         = 'vgl'         in n.props
+    n.batch       = 'batch'       in n.props
+
+def get_cluster_node_properties(debug=False, speeds=None):
+    '''parse pbsnodes -a to get node properties
+
+       The CPU speed of the nodes is taken from the given dictionary of host -> speed, or from
+       get_cluster_node_speeds if speeds is None.  Pass an empty dictionary to leave the speed
+       out, e.g. to set it with set_cluster_node_speeds from a concurrent call.'''
+
+    logger = getMyLogger(os.path.basename(__file__))
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    if speeds is None:
+        speeds = get_cluster_node_speeds(debug=debug)
+
     ## get node information 
     nodes = []
 
     cmd = 'pbsnodes -a'
-    s = Shell(debug=False)
-    rc, output, m = s.cmd1(cmd, allowed_exit=[0,255], timeout=300)
 
-    if rc != 0:
-        logger.error('command %s return non-exit code: %d' % (cmd, rc))
-    else:
-        re_host = re.compile('^(\S+)$')
-        re_stat = re.compile('^\s+state\s+\=\s+(\S+)$')
-        re_np   = re.compile('^\s+np\s+\=\s+(\d+)$')
-        re_ngp  = re.compile('^\s+gpus\s+\=\s+(\d+)$')
-        re_prop = re.compile('^\s+properties\s+\=\s+(\S+)$')
-        re_mem  = re.compile('^ram(\d+)gb$')
-        re_net  = re.compile('^network(\S+)$')
+    re_host = re.compile('^(\S+)$')
+    re_stat = re.compile('^\s+state\s+\=\s+(\S+)$')
+    re_np   = re.compile('^\s+np\s+\=\s+(\d+)$')
+    re_ngp  = re.compile('^\s+gpus\s+\=\s+(\d+)$')
+    re_prop = re.compile('^\s+properties\s+\=\s+(\S+)$')
 
-        output = output.split('\n')
+    s = Shell(debug=False)
+    out = s.stream(cmd, allowed_exit=[0,255], timeout=300)
 
-        n = None
-        for l in output:
+    ## a node ends with an empty line, the end of the output counts as one
+    n = None
+    for l in itertools.chain(out, ['']):
 
-            l = l.rstrip()
+        l = l.rstrip()
 
-            m = re_host.match(l)
-            if m:
-                n = Node(host          = m.group(1),  # hostname
-                         stat          = 'free',      # state
-                         ncores        = 1,           # ncores
-                         ncores_idle   = 1,           # ncores idling
-                         ncores_inter  = 0,           # ncores running interactive jobs 
-                         ncores_matlab = 0,           # ncores running batch-mode matlab jobs 
-                         ncores_vgl    = 0,           # ncores running vgl jobs
-                         ncores_batch  = 0,           # ncores running batch jobs
-                         cpu_type      = '',          # CPU type
-                         cpu_speed     = 1.0,         # CPU speed scale 
-                         mem           = 1,           # memory total
-                         memleft       = 1,           # memory left
-                         memleft_c     = 1,           # avg. memory left per core
-                         ngpus         = 0,           # number of GPUs
-                         net           = '',          # network connectivity
-                         interactive   = False,       # node allowing interactive jobs 
-                         matlab        = False,       # node allowing matlab batch jobs 
-                         vgl           = False,       # node allowing VirtualGL jobs 
-                         batch         = False,       # node allowing batch jobs 
-                         props         = [])          # other queue properties
-                continue
+        m = re_host.match(l)
+        if m:
+            n = __new_node__( m.group(1) )
+            continue
  
-            m = re_stat.match(l)
-            if m:
-                n.stat = m.group(1)
-                continue
+        m = re_stat.match(l)
+        if m:
+            n.stat = m.group(1)
+            continue
  
-            m = re_np.match(l)
-            if m:
-                n.ncores      = int(m.group(1))
-                n.ncores_idle = n.ncores 
-                continue
+        m = re_np.match(l)
+        if m:
+            n.ncores      = int(m.group(1))
+            n.ncores_idle = n.ncores 
+            continue
  
-            m = re_prop.match(l)
-            if m:
-                data = m.group(1).split(',')
+        m = re_prop.match(l)
+        if m:
+            __set_node_properties__(n, m.group(1))
+            continue
+            
+        m = re_ngp.match(l)
+        if m:
+            n.ngpus = int( m.group(1) )
+            continue
 
-                ## TODO: find a better way to get CPU type
-                n.cpu_type = ' '.join(data[0:2])
+        if l == '':
+            if n and n not in nodes: ## avoid duplicat node entry
+                n.memleft_c = float( n.mem / n.ncores )
+                nodes.append( n )
+            continue
 
-                ## try to get the CPU speed factor if available
-                try:
-                    n.cpu_speed = speeds[n.host]
-                except KeyError, e:
-                    pass
-
-                for d in data[2:]:
-                    mm = re_mem.match(d)
-                    if mm:
-                        n.mem     = int( mm.group(1) )
-                        n.memleft = n.mem
-                        continue
-                    mm = re_net.match(d)
-                    if mm:
-                        n.net = mm.group(1)
-                        continue
-
-                    n.props.append(d)
-
-                ## update job type support according to node properties
-                n.interactive = 'interactive' in n.props
-                n.matlab      = 'matlab'      in n.props
-                n.vgl         = 'vgl'         in n.props
-                n.batch       = 'batch'       in n.props
+    if out.rc != 0:
+        logger.error('command %s return non-exit code: %d' % (cmd, out.rc))
+        return []
 
-                continue
-                
-            m = re_ngp.match(l)
-            if m:
-                n.ngpus = int( m.group(1) )
-                continue
+#    for n in nodes:
+#        logger.debug(repr(n)) 
 
-            if l == '':
-                if n not in nodes: ## avoid duplicat node entry
-                    n.memleft_c = float( n.mem / n.ncores )
-                    nodes.append( n )
+    ## try to get the CPU speed factor if available
+    set_cluster_node_speeds(nodes, speeds)
+
+    return nodes
+
+def get_cluster_node_properties_xml(s_cmd='pbsnodes -x', debug=False, speeds=None):
+    '''run pbsnodes -x to get the nodes as get_cluster_node_properties does, see PBSNODES_NODE_SCHEMA
+
+       The XML output is parsed as it comes in.  In addition, the physical memory of the nodes (in GB,
+       not rounded) is taken from their status into physmem; it is also the memory total of the nodes
+       without a ramXXgb property.  The CPU speed of the nodes is taken as get_cluster_node_properties does.'''
+
+    from xml.parsers import expat
+
+    logger = getMyLogger(os.path.basename(__file__))
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    if speeds is None:
+        speeds = get_cluster_node_speeds(debug=debug)
+
+    nodes   = []
+    quality = __new_quality__()   ## not reported, the elements of a node are mostly optional
+
+    s = Shell(debug=False)
+    out = s.stream(s_cmd, allowed_exit=[0,255], timeout=300)
+
+    try:
+        for r in __iter_xml_records__(out.chunks(), 'Node', PBSNODES_NODE_SCHEMA.elements(PBSNODES_NODE_SCHEMA.attrs)):
+            v = dict( zip( PBSNODES_NODE_SCHEMA.attrs, PBSNODES_NODE_SCHEMA.extract(r, quality) ) )
+
+            n = __new_node__( v['host'] )
+            if n.host is None or n in nodes: ## avoid duplicat node entry
                 continue
 
-#        for n in nodes:
-#            logger.debug(repr(n)) 
+            n.stat        = v['stat']
+            n.ncores      = v['ncores']
+            n.ncores_idle = n.ncores
+            n.ngpus       = v['ngpus']
+            n.physmem     = v['physmem']
+
+            if n.physmem:
+                n.mem     = n.physmem
+                n.memleft = n.mem
+
+            if v['properties']:
+                __set_node_properties__(n, v['properties'])
+
+            n.memleft_c = float( n.mem / n.ncores )
+            nodes.append( n )
+    except expat.ExpatError, e:
+        logger.error('invalid XML output of command %s: %s' % (s_cmd, e))
+        return []
+
+    if out.rc != 0:
+        logger.error('command %s return non-exit code: %d' % (s_cmd, out.rc))
+        return []
+
+    ## try to get the CPU speed factor if available
+    set_cluster_node_speeds(nodes, speeds)
+
+    return nodes
+
+def get_cluster_node_states(debug=False):
+    '''get the state of the cluster nodes from pbsnodes -l all, as a dictionary of host -> state;
+       None if the command fails'''
+
+    logger = getMyLogger(os.path.basename(__file__))
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    cmd = 'pbsnodes -l all'
+    s = Shell(debug=False)
+    rc, output, m = s.cmd1(cmd, allowed_exit=[0,255], timeout=300)
+
+    if rc != 0:
+        logger.error('command %s return non-exit code: %d' % (cmd, rc))
+        return None
+
+    states = {}
+    for l in output.split('\n'):
+        data = l.split()
+        if len(data) >= 2:
+            states[data[0]] = data[1]
+
+    return states
+
+def get_cluster_nodes(metadata=None, speeds=None, debug=False):
+    '''get the cluster nodes as get_cluster_node_properties does, taking the almost static properties
+       of the nodes from the metadata cache (see utils.Cache.MetadataCache) if it is given
+
+       With the cache, only the state of the nodes is asked to the Torque server (see get_cluster_node_states);
+       the properties from pbsnodes -a are fetched again when they expire, or when a node is not in them.
+       The CPU speed of the nodes is taken from speeds, or from the cache if speeds is None.'''
+
+    logger = getMyLogger(os.path.basename(__file__))
+
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    if metadata is None:
+        return get_cluster_node_properties(debug=debug, speeds=speeds)
+
+    if speeds is None:
+        speeds = metadata.get('node_speeds', lambda:get_cluster_node_speeds(debug=debug))
+
+    states = get_cluster_node_states(debug=debug)
+    if states is None:
+        return get_cluster_node_properties(debug=debug, speeds=speeds)
+
+    ## the cached properties are the attributes of the nodes, in their state at the time of pbsnodes -a
+    fetch = lambda:map( lambda x:x.__dict__, get_cluster_node_properties(debug=debug, speeds={}) )
+
+    props = metadata.get('node_properties', fetch)
+    if props and set(states) - set( map( lambda x:x['host'], props ) ):
+        logger.info('new nodes in the cluster, fetching the node properties')
+        metadata.invalidate('node_properties')
+        props = metadata.get('node_properties', fetch)
+
+    nodes = []
+    for p in props:
+        ## nodes removed from the cluster are left out
+        if p['host'] not in states:
+            continue
+        n = Node( **dict(p, props=list(p['props'])) )
+        n.stat = states[n.host]
+        nodes.append(n)
+
+    set_cluster_node_speeds(nodes, speeds)
 
     return nodes
 
@@ -491,55 +1390,48 @@ def get_fs(s_cmd, debug=False):
     if debug:
         logger.setLevel(logging.DEBUG)
 
-    fs = {}
+    ## the sections of USER/GROUP/CLASS start with a line of the name and a line of column names,
+    ## they end with an empty line; only the first section of each kind is taken
+    fs = {'user': {}, 'group': {}, 'class': {}}
+
+    re_beg  = re.compile('^(USER|GROUP|CLASS)$')
+    re_skip = re.compile('^DEFAULT')
 
     s = Shell(debug=False)
-    rc, output, m = s.cmd1(s_cmd, allowed_exit=[0,255], timeout=300)
+    out = s.stream(s_cmd, allowed_exit=[0,255], timeout=300)
+
+    k    = None
+    skip = 0
+    done = []
+    for l in out:
+        l = l.strip()
+
+        m = re_beg.match(l)
+        if m:
+            k    = m.group(1).lower()
+            skip = 1
+            continue
+
+        if k and l == '':
+            logger.debug('end of %s section on %s output' % (k, s_cmd))
+            done.append(k)
+            k = None
+            continue
+
+        if skip:
+            skip -= 1
+            continue
+
+        if k and k not in done:
+            data = l.split()
+            if not re_skip.match( data[0] ):
+                ## remove the '*' at the tail of userid
+                fs[k][re.sub('\*$','',data[0])] = float(data[1])
+
+    if out.rc != 0:
+        logger.error('command %s return non-exit code: %d' % (s_cmd, out.rc))
+        return {}
 
-    if rc != 0:
-        logger.error('command %s return non-exit code: %d' % (cmd, rc))
-    else:
-        re_user_beg  = re.compile('^USER$')
-        re_group_beg = re.compile('^GROUP$')
-        re_class_beg = re.compile('^CLASS$')
- 
-        idx = {'user':[],'group':[],'class':[]}
-        k   = None
-        output = output.split('\n')
-        for i in xrange(len(output)):
- 
-            if re_user_beg.match(output[i].strip()):
-                k = 'user'
-                idx[k].append(i+2)
-                continue
- 
-            if re_group_beg.match(output[i].strip()):
-                k = 'group'
-                idx[k].append(i+2)
-                continue
- 
-            if re_group_beg.match(output[i].strip()):
-                k = 'class'
-                idx[k].append(i+2)
-                continue
- 
-            if k and output[i].strip() == '':
-                idx[k].append(i)
-                k = None 
-                continue
- 
-        logger.debug('line indices on %s output for USER/GROUP/CLASS' % s_cmd )
-        logger.debug(' |_ %s ' % repr(idx))
-
-        re_skip = re.compile('^DEFAULT')
-        for k,v in idx.iteritems():
-            fs[k] = {}
-            if v:
-                for line in output[v[0]:v[1]]:
-                    data  = line.strip().split()
-                    if not re_skip.match( data[0] ):
-                        ## remove the '*' at the tail of userid
-                        fs[k][re.sub('\*$','',data[0])] = float(data[1])
     return fs
 
 def get_qstat_jobs(s_cmd, node_domain_suffix='dccn.nl', debug=False):
@@ -556,9 +1448,6 @@ def get_qstat_jobs(s_cmd, node_domain_suffix='dccn.nl', debug=False):
 
     jlist = {}
 
-    s = Shell(debug=False)
-    rc, output, m = s.cmd1(s_cmd, allowed_exit=[0,255], timeout=300)
-
     re_jinfo  = re.compile ( '^(\S+)\s+'                  +    # job id
                              '(\w+)\s+'                   +    # user id
                              '(\w+)\s+'                   +    # queue name
@@ -573,42 +1462,93 @@ def get_qstat_jobs(s_cmd, node_domain_suffix='dccn.nl', debug=False):
                              '(.*)$' )                         # computer node and session
                              #'((((dccn-c\d+)/(\d+\+?))|-{2,}){1,})$' )   # computer node and session
 
-    if rc != 0:
-        logger.error('command %s return non-exit code: %d' % (s_cmd, rc))
-    else:
+    def __apply_domain_suffix__(node_hostname):
+        host = node_hostname.split('/')[0]
+        if host != '--':
+            host += '.' + node_domain_suffix
+        return host 
 
-        def __apply_domain_suffix__(node_hostname):
-            host = node_hostname.split('/')[0]
-            if host != '--':
-                host += '.' + node_domain_suffix
-            return host 
+    ## the jobs are parsed as the lines of the command output come in
+    s = Shell(debug=False)
+    out = s.stream(s_cmd, allowed_exit=[0,255], timeout=300)
 
-        for l in output.split('\n'):
-            l = l.strip()
-            m = re_jinfo.match(l)
+    for l in out:
+        l = l.strip()
+        m = re_jinfo.match(l)
 
-            if m:
-                nodelist = ['']
-                if m.group(12) != '==':
-                    nodelist = map( lambda x:__apply_domain_suffix__(x), m.group(12).split('+'))
-
-                j = Job( jid   = m.group(1)               ,
-                         uid   = m.group(2)               ,
-                         queue = m.group(3)               ,
-                         jname = m.group(4)               ,
-                         sid   = m.group(5)               ,
-                         nds   = m.group(6)               ,
-                         tsk   = m.group(7)               ,
-                         rmem  = int(m.group(8))          ,
-                         rtime = __proc_walltime__(m.group(9)),
-                         jstat = m.group(10)              ,
-                         ctime = m.group(11)              ,
-                         node  = nodelist                 )
-
-                if j.jstat not in jlist.keys():
-                    jlist[j.jstat] = []
-
-                jlist[j.jstat].append(j)
+        if m:
+            nodelist = ['']
+            if m.group(12) != '==':
+                nodelist = map( lambda x:__apply_domain_suffix__(x), m.group(12).split('+'))
+
+            j = Job( jid   = m.group(1)               ,
+                     uid   = m.group(2)               ,
+                     queue = m.group(3)               ,
+                     jname = m.group(4)               ,
+                     sid   = m.group(5)               ,
+                     nds   = m.group(6)               ,
+                     tsk   = m.group(7)               ,
+                     rmem  = int(m.group(8))          ,
+                     rtime = __proc_walltime__(m.group(9)),
+                     jstat = m.group(10)              ,
+                     ctime = m.group(11)              ,
+                     node  = nodelist                 )
+
+            if j.jstat not in jlist:
+                jlist[j.jstat] = []
+
+            jlist[j.jstat].append(j)
+
+    if out.rc != 0:
+        logger.error('command %s return non-exit code: %d' % (s_cmd, out.rc))
+        return {}
+
+    return jlist
+
+def get_qstat_jobs_xml(s_cmd='qstat -f -x', node_domain_suffix='dccn.nl', debug=False):
+    '''run qstat -f -x to get all job status as get_qstat_jobs does, see QSTAT_JOB_SCHEMA
+
+       The XML output is parsed as it comes in.  The requested memory is not rounded, and the jobs also
+       come with the resources used so far: cmem and cvmem in GB, cwtime and cctime in seconds.  The
+       node of a job lists its hosts once per slot, or is ['--'] if the job is not running.'''
+
+    from xml.parsers import expat
+
+    logger = getMyLogger(os.path.basename(__file__))
+    if debug:
+        logger.setLevel(logging.DEBUG)
+
+    def __apply_domain_suffix__(node_hostname):
+        if '.' not in node_hostname:
+            node_hostname += '.' + node_domain_suffix
+        return node_hostname
+
+    jlist   = {}
+    quality = __new_quality__()
+
+    s = Shell(debug=False)
+    out = s.stream(s_cmd, allowed_exit=[0,255], timeout=300)
+
+    try:
+        for r in __iter_xml_records__(out.chunks(), 'Job', QSTAT_JOB_SCHEMA.elements(QSTAT_JOB_SCHEMA.attrs)):
+            quality['njobs'] += 1
+            j = Job( **dict( zip( QSTAT_JOB_SCHEMA.attrs, QSTAT_JOB_SCHEMA.extract(r, quality) ) ) )
+
+            j.node = map( __apply_domain_suffix__, j.node ) if j.node else ['--']
+
+            if j.jstat not in jlist:
+                jlist[j.jstat] = []
+
+            jlist[j.jstat].append(j)
+    except expat.ExpatError, e:
+        logger.error('invalid XML output of command %s: %s' % (s_cmd, e))
+        return {}
+
+    if out.rc != 0:
+        logger.error('command %s return non-exit code: %d' % (s_cmd, out.rc))
+        return {}
+
+    logger.debug('%s: %s' % (s_cmd, __quality_summary__(quality)))
 
     return jlist
 
@@ -51,11 +51,29 @@ def getConfig(config_file='config.ini'):
 
     default_cfg = {
         'DB_DATA_DIR'        : '/var/log/torque/torquemon_db',
+        'SQLITE_JOURNAL_MODE': 'wal',
+        'SQLITE_RETENTION_RAW': '0',
+        'SQLITE_RETENTION_5M' : '0',
+        'SQLITE_RETENTION_1H' : '0',
+        'SQLITE_RETENTION_1D' : '0',
+        'JOBLOG_CACHE_DIR'   : '',
+        'JOBLOG_CACHE_SIZE_MB': '1024',
+        'METADATA_CACHE_DIR' : '',
+        'METADATA_TTL_NODE_SPEEDS'    : '86400',
+        'METADATA_TTL_NODE_PROPERTIES': '3600',
+        'METADATA_TTL_FAIRSHARE'      : '0',
         'TORQUE_LOG_DIR'     : '/home/common/torque/job_logs',
         'TORQUE_BATCH_QUEUES': 'short,medium,long',
         'BIN_QSTAT_ALL'      : 'cluster-qstat',
         'BIN_FSHARE_ALL'     : 'cluster-fairshare',
+        'BIN_QSTAT_XML'      : 'qstat -f -x',
+        'BIN_PBSNODES_XML'   : 'pbsnodes -x',
+        'COLLECTOR_FORMAT'   : 'text',
         'BIN_CLUSTER_MATLAB' : 'cluster-matlab',
+        'MENTAT_HOSTS'       : '',
+        'MENTAT_PROBE_CMD'   : 'ssh -o BatchMode=yes -o ConnectTimeout=10 %(host)s',
+        'MENTAT_PROBE_TIMEOUT': '30',
+        'MENTAT_PROBE_THREADS': '8',
         'NOTIFICATION_EMAILS': '',
         'OPENTSDB_HOST'      : 'opentsdb',
         'OPENTSDB_PORT'      : '9042',
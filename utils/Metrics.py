@@ -111,7 +111,8 @@ class ClusterAccounting:
             date = (datetime.date.today() - datetime.timedelta(1)).strftime('%Y%m%d')
 
         self.logger.info('collecting data of jobs submitted on %s' % date)
-        jobs = get_complete_jobs(self.TORQUE_LOG_DIR, date, debug=(self.logger.level == logging.DEBUG) )
+        jobs = get_complete_jobs(self.TORQUE_LOG_DIR, date, debug=(self.logger.level == logging.DEBUG),
+                                 fields=['uid', 'gid', 'queue', 'jec', 'rmem', 'rwtime', 'cmem', 'cwtime', 'cctime', 't_finish'] )
         
         for j in filter(lambda x:(x.cwtime and x.cmem and x.cctime), jobs):
 
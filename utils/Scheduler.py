@@ -0,0 +1,81 @@
+#!/usr/bin/env python
+import time
+import Queue
+import logging
+import threading
+from Common import getMyLogger
+
+class Scheduler:
+    '''runs independent collectors concurrently in a small pool of threads
+
+       A collector is a function that runs a command through utils.Shell and parses its output,
+       e.g. get_qstat_jobs.  Shell reads the output of the command as it comes (see Stream), the
+       threads block in select on the pipes of their commands and the poll latency becomes the one
+       of the slowest command rather than the sum of all of them; the commands also sample the
+       cluster at about the same moment.
+
+       The start and end time of each collector is kept in timing, as a dictionary of
+       name -> (start timestamp, end timestamp).'''
+
+    def __init__(self, nthreads=4, debug=False):
+        self.nthreads = nthreads
+        self.tasks    = []
+        self.results  = {}
+        self.errors   = {}
+        self.timing   = {}
+
+        self.logger = getMyLogger(self.__class__.__name__)
+        if debug:
+            self.logger.setLevel(logging.DEBUG)
+
+    def submit(self, name, func, *args, **kwargs):
+        '''add the collector func(*args, **kwargs) under the given name, it is started by run'''
+        self.tasks.append( (name, func, args, kwargs) )
+
+    def __worker__(self, q):
+        '''take the collectors from the queue q and run them until the queue is empty'''
+
+        while True:
+            try:
+                name, func, args, kwargs = q.get_nowait()
+            except Queue.Empty, e:
+                return
+
+            t0 = time.time()
+            try:
+                self.results[name] = func(*args, **kwargs)
+            except Exception, e:
+                self.logger.error('collector %s failed: %s' % (name, repr(e)))
+                self.errors[name] = e
+            t1 = time.time()
+
+            self.timing[name] = (t0, t1)
+            self.logger.debug('collector %s took %.1f s' % (name, t1 - t0))
+
+    def run(self):
+        '''run the submitted collectors and wait for all of them to finish'''
+
+        q = Queue.Queue()
+        for t in self.tasks:
+            q.put(t)
+        self.tasks = []
+
+        threads = []
+        for i in xrange( min(self.nthreads, q.qsize()) ):
+            t = threading.Thread(target=self.__worker__, args=(q,))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        ## join with a timeout, so that the main thread remains responsive to KeyboardInterrupt
+        for t in threads:
+            while t.isAlive():
+                t.join(1)
+
+    def result(self, name):
+        '''the return value of the collector, the exception raised by the collector is raised again'''
+
+        if name in self.errors:
+            raise self.errors[name]
+
+        return self.results[name]
@@ -0,0 +1,310 @@
+#!/usr/bin/env python
+import os
+import time
+import json
+import heapq
+import sqlite3
+import logging
+import datetime
+import itertools
+from Common import getMyLogger
+
+class ShardCatalog:
+    '''catalog of the SQLite databases (shards) of a script, one per year or month, in a directory,
+       e.g. mm_trackTorque_2015.db or mm_trackTorqueJobs_201501.db
+
+       Only the existing shards are listed, so that no empty database is created by opening the shard
+       of a period without data.  The shards of a period ending before the time range of a query are
+       left out by their name, as the time column of their rows (e.g. the timestamp of rsrc or the
+       t_submit of jobs) is before the end of the period.  The other ones are left out by the min. and
+       max. value of the time column of the table, kept in a manifest file next to the shards as long
+       as the size and modification time of the shard (and its WAL file) are unchanged.
+
+       A query is run on each shard with the time range, the WHERE clause, the ORDER BY and the LIMIT
+       pushed down, and the sorted rows of the shards are merged into one sorted stream: one shard
+       after the other if their time ranges do not overlap, with a k-way merge otherwise.'''
+
+    ## format of the part of the shard name after the prefix, by period
+    PERIODS = {'year': '%Y', 'month': '%Y%m'}
+
+    def __init__(self, dirpath, prefix, period='year', debug=False):
+        self.dirpath  = dirpath
+        self.prefix   = prefix
+        self.period   = period
+        self.manifest = None        ## fname -> {'stamp': ..., 'bounds': {table.column: [min, max]}}
+        self.changed  = False
+
+        self.logger = getMyLogger(self.__class__.__name__)
+        if debug:
+            self.logger.setLevel(logging.DEBUG)
+
+    def __manifest_fpath__(self):
+        '''path of the manifest file'''
+        return os.path.join(self.dirpath, '%s_manifest.json' % self.prefix)
+
+    def __load_manifest__(self):
+        '''the manifest, loaded from the manifest file on the first call'''
+
+        if self.manifest is None:
+            self.manifest = {}
+            try:
+                f = open(self.__manifest_fpath__(), 'r')
+                try:
+                    self.manifest = json.load(f)
+                finally:
+                    f.close()
+            except (IOError, ValueError), e:
+                self.logger.debug('manifest not loaded: %s' % repr(e))
+
+        return self.manifest
+
+    def __save_manifest__(self):
+        '''write the manifest file if it has changed, e.g. by a web server without write access it is just left as it is'''
+
+        if not self.changed:
+            return
+
+        ## write to a temporary file first, so that concurrent readers never see a partial file
+        fpath = self.__manifest_fpath__()
+        tmp   = '%s.%d.tmp' % (fpath, os.getpid())
+        try:
+            f = open(tmp, 'w')
+            try:
+                json.dump(self.manifest, f)
+            finally:
+                f.close()
+            os.rename(tmp, fpath)
+            self.changed = False
+        except (IOError, OSError), e:
+            self.logger.debug('manifest not saved: %s' % repr(e))
+
+    def __stamp__(self, fpath):
+        '''size and modification time of the shard and its WAL file, identifying its content'''
+
+        stamp = []
+        for f in [fpath, fpath + '-wal']:
+            try:
+                st = os.stat(f)
+                stamp += [st.st_size, st.st_mtime]
+            except OSError, e:
+                stamp += [0, 0]
+
+        return stamp
+
+    def path(self, t=None):
+        '''path of the shard of the time t (a date or datetime, default now), whether it exists or not'''
+
+        if t is None:
+            t = datetime.datetime.now()
+
+        return os.path.join(self.dirpath, '%s_%s.db' % (self.prefix, t.strftime(self.PERIODS[self.period])))
+
+    def __period_end__(self, name):
+        '''end (in seconds since the epoch) of the period of the shard with the given name after the prefix'''
+
+        t = datetime.datetime.strptime(name, self.PERIODS[self.period])
+        if self.period == 'year':
+            t = t.replace(year=t.year+1)
+        elif t.month == 12:
+            t = t.replace(year=t.year+1, month=1)
+        else:
+            t = t.replace(month=t.month+1)
+
+        return int( time.mktime(t.timetuple()) )
+
+    def bounds(self, fpath, table, column='timestamp'):
+        '''[min, max] of the column of the table in the shard, None if the table is missing or empty'''
+
+        manifest = self.__load_manifest__()
+
+        stamp = self.__stamp__(fpath)
+        entry = manifest.get(os.path.basename(fpath))
+        if entry is None or entry['stamp'] != stamp:
+            entry = manifest[os.path.basename(fpath)] = {'stamp': stamp, 'bounds': {}}
+
+        k = '%s.%s' % (table, column)
+        if k not in entry['bounds']:
+            conn = sqlite3.connect(fpath)
+            try:
+                b = list( conn.execute('SELECT min(%s), max(%s) FROM %s' % (column, column, table)).fetchone() )
+                if b[0] is None:
+                    b = None
+            except sqlite3.Error, e:
+                self.logger.debug('no bounds of %s in %s: %s' % (k, fpath, repr(e)))
+                b = None
+            finally:
+                conn.close()
+
+            entry['bounds'][k] = b
+            self.changed = True
+
+        return entry['bounds'][k]
+
+    def shards(self, table=None, column='timestamp', t_min=None, t_max=None):
+        '''list of (path, [min, max] of the column) of the existing shards in the order of time, leaving out
+           the ones of a period ending before t_min; given the table, only the shards with rows of the
+           table having the column in [t_min, t_max)'''
+
+        width = len( datetime.date.today().strftime(self.PERIODS[self.period]) )
+
+        try:
+            fnames = sorted( os.listdir(self.dirpath) )
+        except OSError, e:
+            self.logger.warning('no shards in %s: %s' % (self.dirpath, repr(e)))
+            return []
+
+        l = []
+        for fname in fnames:
+            name = fname[len(self.prefix)+1:-3]
+            if not (fname.startswith(self.prefix + '_') and fname.endswith('.db') and name.isdigit() and len(name) == width):
+                continue
+
+            try:
+                t_end = self.__period_end__(name)
+            except ValueError, e:
+                continue
+
+            ## the time column of the rows of a shard is before the end of its period, the shard is not opened if that is before t_min
+            if t_min is not None and t_end <= t_min:
+                continue
+
+            fpath = os.path.join(self.dirpath, fname)
+
+            if table is None:
+                l.append( (fpath, None) )
+                continue
+
+            b = self.bounds(fpath, table, column)
+            if b is None or (t_min is not None and b[1] < t_min) or (t_max is not None and b[0] >= t_max):
+                continue
+
+            l.append( (fpath, b) )
+
+        self.__save_manifest__()
+
+        return l
+
+    def __iterate__(self, fpath, sql, params):
+        '''iterator over the rows of the query on the shard, the shard is closed at the end'''
+
+        conn = sqlite3.connect(fpath)
+        conn.row_factory = sqlite3.Row
+        try:
+            for r in conn.execute(sql, params):
+                yield r
+        finally:
+            conn.close()
+
+    def __fetch__(self, fpath, sql, params):
+        '''list of the rows of the query on the shard'''
+
+        rows = list( self.__iterate__(fpath, sql, params) )
+        self.logger.debug('%d rows from %s' % (len(rows), fpath))
+
+        return rows
+
+    def query(self, table, where='', params=(), order_by=[('timestamp', 'DESC')], limit=0, column='timestamp', t_min=None, t_max=None, nthreads=1,
+              columns=['*'], group_by=[]):
+        '''iterator over the rows (sqlite3.Row) of the table with the column in [t_min, t_max) and the
+           WHERE clause where (with the parameters params) over the shards, sorted by order_by, a list
+           of (column, ASC|DESC); limit 0 is no limit.  With nthreads > 1, the shards are scanned
+           concurrently in nthreads threads and their rows are held in memory.
+
+           The columns (SQL expressions, e.g. aggregates) are selected from the table, grouped by the
+           group_by columns in each shard; the groups of different shards having the same group_by
+           values are left to be combined by the caller, they follow each other if sorted on them.'''
+
+        shards = self.shards(table, column, t_min, t_max)
+
+        clauses = []
+        args    = []
+        if t_min is not None:
+            clauses.append('%s >= ?' % column)
+            args.append(t_min)
+        if t_max is not None:
+            clauses.append('%s < ?' % column)
+            args.append(t_max)
+        if where:
+            clauses.append('(%s)' % where)
+        args += list(params)
+
+        sql = 'SELECT %s FROM %s' % (','.join(columns), table)
+        if clauses:
+            sql += ' WHERE %s' % ' AND '.join(clauses)
+        if group_by:
+            sql += ' GROUP BY %s' % ','.join(group_by)
+        if order_by:
+            sql += ' ORDER BY %s' % ','.join( [ '%s %s' % (c, d) for c, d in order_by ] )
+        if limit > 0:
+            sql += ' LIMIT %d' % limit
+
+        self.logger.debug('SQL query on %d shards: %s' % (len(shards), sql))
+
+        if nthreads > 1 and len(shards) > 1:
+            from Scheduler import Scheduler
+            sched = Scheduler(nthreads=nthreads)
+            for fpath, b in shards:
+                sched.submit(fpath, self.__fetch__, fpath, sql, args)
+            sched.run()
+            streams = [ sched.result(fpath) for fpath, b in shards ]
+        else:
+            streams = [ self.__iterate__(fpath, sql, args) for fpath, b in shards ]
+
+        rows = self.__merge__(streams, [ b for fpath, b in shards ], order_by, column)
+
+        if limit > 0:
+            rows = itertools.islice(rows, limit)
+
+        return rows
+
+    def __merge__(self, streams, bounds, order_by, column):
+        '''merge the sorted streams of rows of the shards (with the given bounds of the column) into one'''
+
+        if not order_by:
+            return itertools.chain(*streams)
+
+        desc = [ d.upper() == 'DESC' for c, d in order_by ]
+
+        ## the shards are in the order of time, they can be read one after the other if their ranges do not overlap
+        if order_by[0][0] == column and all( [ bounds[i][1] < bounds[i+1][0] for i in xrange(len(bounds) - 1) ] ):
+            if desc[0]:
+                streams = streams[::-1]
+            return itertools.chain(*streams)
+
+        return self.__kway_merge__(streams, [ c for c, d in order_by ], desc)
+
+    def __kway_merge__(self, streams, columns, desc):
+        '''k-way merge of the sorted streams of rows on the columns, in descending order where desc is True'''
+
+        class __Key__(object):
+            __slots__ = ['values']
+
+            def __init__(self, r):
+                self.values = [ r[c] for c in columns ]
+
+            def __eq__(self, other):
+                return self.values == other.values
+
+            def __lt__(self, other):
+                for a, b, d in zip(self.values, other.values, desc):
+                    if a != b:
+                        return a > b if d else a < b
+                return False
+
+        ## the ties are broken by the order of the shards, i.e. the rows and streams are never compared
+        heap = []
+        for i, s in enumerate(streams):
+            s = iter(s)
+            for r in s:
+                heap.append( (__Key__(r), i, r, s) )
+                break
+        heapq.heapify(heap)
+
+        while heap:
+            k, i, r, s = heap[0]
+            yield r
+            for r in s:
+                heapq.heapreplace(heap, (__Key__(r), i, r, s))
+                break
+            else:
+                heapq.heappop(heap)
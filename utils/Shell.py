@@ -21,6 +21,10 @@
 # 
 #     rc,output,m=shell.cmd1('edg-get-job-status -all')
 #
+# Output is returned as a string, without checking the exit status
+#
+#     rc,output=shell.run('edg-get-job-status -all')
+#
 # Output is not captured. Useful for commands that require interactions
 #
 #     rc=shell.system('grid-proxy-init')
@@ -32,7 +36,7 @@
 #
 #     fullpath=shell.wrapper('lcg-cp')
 
-import os, re, tempfile, time, signal
+import os, re, tempfile, time, signal, select, errno, subprocess
 
 #import Ganga.Utility.logging
 #logger = Ganga.Utility.logging.getLogger()
@@ -41,6 +45,122 @@ import os, re, tempfile, time, signal
 from utils.Common import *
 logger = getMyLogger(__name__)
 
+class Stream:
+   """Output of a command executed by Shell.stream or Shell.run
+
+   Iterating over the Stream yields the lines of the output (without the line ends) as they arrive,
+   so that the output can be parsed while the command runs. The exit status rc is set once the
+   output is exhausted. If allowed_exit is given, an exit status not in it is reported as by
+   Shell.cmd1, with the first bytes of the output, and found tells if the command was found.
+   """
+
+   BYTES = 4096
+   GRACE = 5      # seconds given to the command after SIGTERM, before SIGKILL
+
+   def __init__(self,shell,cmd,allowed_exit=None,timeout=None):
+      self.shell        = shell
+      self.cmd          = cmd
+      self.allowed_exit = allowed_exit
+      self.timeout      = timeout
+      self.rc           = None
+      self.found        = True
+      self.head         = ''       # first bytes of the output, for the report of the exit status
+
+   def __head__(self,data):
+      if len(self.head) < Stream.BYTES:
+         self.head += data[:Stream.BYTES-len(self.head)]
+
+   def __killpg__(self,p,sig):
+      logger.debug('killing process group %d with signal %d',p.pid,sig)
+      try:
+         os.killpg(p.pid,sig)
+      except OSError:
+         pass
+
+   def chunks(self):
+      "Generator of the chunks of the output as they arrive"
+
+      logger.debug('Running shell command: %s' % self.cmd)
+      try:
+         p = subprocess.Popen(['/bin/sh','-c',self.cmd], stdout=subprocess.PIPE, stderr=subprocess.STDOUT,
+                              env=self.shell.env, close_fds=True, preexec_fn=os.setsid)
+      except OSError, (num,text):
+         logger.warning( 'Problem with shell command: %s, %s', num,text)
+         self.rc = 255
+      else:
+         fd       = p.stdout.fileno()
+         signals  = [signal.SIGTERM, signal.SIGKILL]
+         deadline = None
+         if self.timeout:
+            deadline = time.time() + self.timeout
+
+         exhausted = False
+         try:
+            while 1:
+               ## wake up every second to check if the shell has exited
+               wait = 1.0
+               if deadline is not None:
+                  wait = min(wait, max(0, deadline - time.time()))
+
+               try:
+                  r,w,x = select.select([fd],[],[],wait)
+               except select.error, (num,text):
+                  if num == errno.EINTR:
+                     continue
+                  raise
+
+               if r:
+                  data = os.read(fd, 65536)
+                  if not data:
+                     exhausted = True
+                     break
+                  self.__head__(data)
+                  yield data
+                  continue
+
+               ## the shell has exited, but a process it left in the background holds the pipe open
+               if p.poll() is not None:
+                  exhausted = True
+                  break
+
+               if deadline is None or time.time() < deadline:
+                  continue
+
+               ## timeout reached: escalate from SIGTERM to SIGKILL
+               if not signals:
+                  logger.warning('process group %d survived SIGKILL: %s', p.pid,self.cmd)
+                  break
+               sig = signals.pop(0)
+               if sig == signal.SIGTERM:
+                  logger.warning('Command interrupted - timeout %ss reached: %s', self.timeout,self.cmd)
+               self.__killpg__(p,sig)
+               deadline = time.time() + Stream.GRACE
+         finally:
+            ## also when the iteration is given up, in which case the command gets SIGPIPE on its next write;
+            ## a command not writing (anymore) is escalated from SIGTERM to SIGKILL as on timeout
+            p.stdout.close()
+            while not exhausted and signals and p.poll() is None:
+               sig = signals.pop(0)
+               self.__killpg__(p,sig)
+               t_grace = time.time() + Stream.GRACE
+               while p.poll() is None and time.time() < t_grace:
+                  time.sleep(0.1)
+            self.rc = p.wait()
+
+      if self.allowed_exit is not None:
+         self.found = self.shell.__check__(self.cmd,self.rc,self.head,self.allowed_exit)
+
+   def __iter__(self):
+      rest = ''
+      for data in self.chunks():
+         lines = data.split('\n')
+         lines[0] = rest + lines[0]
+         rest = lines.pop()
+         for l in lines:
+            yield l
+      if rest:
+         yield rest
+
 class Shell:
 
    #exceptions=getConfig('Shell')['IgnoredVars']
@@ -100,66 +220,78 @@ class Shell:
 
       self.dirname=None
 
-   def cmd(self,cmd,soutfile=None,allowed_exit=[0], capture_stderr=False,timeout=None, mention_outputfile_on_errors=True):
-      "Execute an OS command and captures the stderr and stdout which are returned in a file"
- 
-      if not soutfile: soutfile=tempfile.mktemp('.out')
-         
-      logger.debug('Running shell command: %s' % cmd)
-      try:
-         t0 = time.time()
-         already_killed = False
-         timeout0 = timeout
-         pid = os.spawnve(os.P_NOWAIT,'/bin/sh',['/bin/sh','-c','%s > %s 2>&1' % (cmd,soutfile)],self.env)         
-         while 1:
-            wpid,sts = os.waitpid(pid,os.WNOHANG)
-            if wpid!=0:
-               if os.WIFSIGNALED(sts):
-                  rc = -os.WTERMSIG(sts)
-                  break
-               elif os.WIFEXITED(sts):
-                  rc = os.WEXITSTATUS(sts)
-                  break
-            if timeout and time.time()-t0>timeout:
-               logger.warning('Command interrupted - timeout %ss reached: %s', timeout0,cmd)
-               if already_killed:
-                  sig = signal.SIGKILL
-               else:
-                  sig = signal.SIGTERM
-               logger.debug('killing process %d with signal %d',pid,sig)
-               os.kill(pid,sig)
-               t0=time.time()
-               timeout = 5 # wait just 5 seconds before killing with SIGKILL
-               already_killed = True
-            time.sleep(0.1)            
+   def run(self,cmd,timeout=None):
+      """Execute an OS command and captures the stderr and stdout through a pipe, returns (rc, output)
+
+      The command runs in its own process group. When the timeout is reached, the process group
+      gets SIGTERM, then SIGKILL 5 seconds later. The output is read until the pipe is closed or,
+      if the command leaves processes in the background that hold the pipe open, until the shell
+      has exited. As for os.waitpid, rc is the negative signal number if the command was killed
+      by a signal.
+      """
+
+      s = Stream(self,cmd,timeout=timeout)
+      output = ''.join(s.chunks())
+
+      return s.rc, output
+
+   def stream(self,cmd,allowed_exit=[0],timeout=None):
+      """Execute an OS command as Shell.run does, but returns a Stream iterating over the lines of the
+      stderr and stdout as they arrive; the exit status is in the rc attribute of the Stream once all
+      lines are read
+
+      for l in s.stream('qstat'): ...
+      """
+
+      return Stream(self,cmd,allowed_exit,timeout)
+
+   def __check__(self,cmd,rc,output,allowed_exit,soutfile=None):
+      "Report the exit status not in allowed_exit and check if the command is found, returns False if the command is not found"
 
-      except OSError, (num,text):
-         logger.warning( 'Problem with shell command: %s, %s', num,text)
-         rc = 255
-      
       BYTES = 4096
       if rc not in allowed_exit:
          logger.warning('exit status [%d] of command %s',rc,cmd)
-         if mention_outputfile_on_errors:
+         if soutfile:
             logger.warning('full output is in file: %s',soutfile)
-         logger.warning('<first %d bytes of output>\n%s',BYTES,file(soutfile).read(BYTES))
+         logger.warning('<first %d bytes of output>\n%s',BYTES,output[:BYTES])
          logger.warning('<end of first %d bytes of output>',BYTES)
          
 #FIXME /bin/sh might have also other error messages                                                                                            
       m = None
       if rc != 0:
-         m = re.search('command not found\n',file(soutfile).read())
+         m = re.search('command not found\n',output)
          if m: logger.warning('command %s not found',cmd)
-                                                                                                       
-      return rc,soutfile,m is None
+
+      return m is None
+
+   def cmd(self,cmd,soutfile=None,allowed_exit=[0], capture_stderr=False,timeout=None, mention_outputfile_on_errors=True):
+      "Execute an OS command and captures the stderr and stdout which are returned in a file"
+ 
+      rc,output = self.run(cmd,timeout)
+
+      if soutfile:
+         f = open(soutfile,'w')
+      else:
+         fd,soutfile = tempfile.mkstemp('.out')
+         f = os.fdopen(fd,'w')
+      try:
+         f.write(output)
+      finally:
+         f.close()
+
+      if not mention_outputfile_on_errors:
+         m = self.__check__(cmd,rc,output,allowed_exit)
+      else:
+         m = self.__check__(cmd,rc,output,allowed_exit,soutfile)
+
+      return rc,soutfile,m
 
    def cmd1(self,cmd,allowed_exit=[0],capture_stderr=False,timeout=None):
        "Executes an OS command and captures the stderr and stdout which are returned as a string"
        
-       rc,outfile,m = self.cmd(cmd,None,allowed_exit,capture_stderr,timeout,mention_outputfile_on_errors=False)
-       output=file(outfile).read()
-       os.unlink(outfile)
-       
+       rc,output = self.run(cmd,timeout)
+       m = self.__check__(cmd,rc,output,allowed_exit)
+
        return rc,output, m
        
    def system(self,cmd,allowed_exit=[0], stderr_file=None):
@@ -0,0 +1,339 @@
+#!/usr/bin/env python
+import time
+import sqlite3
+import logging
+from Common import getMyLogger
+
+class SQLiteStore:
+    '''SQLite database in which the tables of a snapshot (e.g. a poll of mm_trackTorque.py) are written
+       in a single transaction
+
+       The connection is opened on the first use and kept open until close, e.g. across the polls of
+       the daemon mode.  The tables are given as a list of (table name, CREATE TABLE IF NOT EXISTS
+       statement); they are all created in one go when the connection is opened.
+
+       The rows of the snapshot are added per table with stage, and written to the database with
+       commit: all of them or none, at the cost of a single fsync.  The database is put in the journal
+       mode journal_mode, by default WAL, in which the readers (e.g. the CGI scripts) do not wait for
+       the writer, nor the writer for the readers.  The readers then need write access to the directory
+       of the database, for the -wal and -shm files; use journal_mode='delete' if they have not.
+
+       The migrations are a list of (version, description, list of SQL statements), e.g. to create
+       indexes; a statement can also be a function taking the connection, for a change depending on
+       the content of the database.  When the connection is opened, the migrations of a version above the one recorded in
+       the schema_version table of the database are applied in the order of their version, each in
+       its own transaction; readers of a WAL database go on reading meanwhile.
+
+       The rollups are Rollup objects of tables of the database, their latest buckets are updated by
+       the commit of new rows in these tables, in the same transaction; the rows older than the
+       retention (in days, by resolution) are then deleted.'''
+
+    ## pragmas set on every connection: with WAL, synchronous=NORMAL only fsyncs at checkpoints,
+    ## a committed transaction may be lost on a power failure but the database cannot get corrupted
+    PRAGMAS = [('synchronous' , 'NORMAL'),
+               ('cache_size'  , '-16384'),   ## in KiB, i.e. 16 MB
+               ('temp_store'  , 'MEMORY')]
+
+    def __init__(self, fpath, tables, migrations=(), rollups=(), retention={}, journal_mode='wal', timeout=30, debug=False):
+        self.fpath        = fpath
+        self.tables       = tables
+        self.migrations   = sorted(migrations)
+        self.rollups      = rollups
+        self.retention    = retention
+        self.journal_mode = journal_mode
+        self.timeout      = timeout      ## seconds to wait for a lock held by another writer
+        self.conn         = None
+        self.pending      = []           ## staged (table, INSERT statement, rows)
+
+        self.logger = getMyLogger(self.__class__.__name__)
+        if debug:
+            self.logger.setLevel(logging.DEBUG)
+
+    def connect(self):
+        '''the connection to the database, opened and set up on the first call'''
+
+        if self.conn is not None:
+            return self.conn
+
+        conn = sqlite3.connect(self.fpath, timeout=self.timeout)
+
+        try:
+            mode = conn.execute('PRAGMA journal_mode=%s' % self.journal_mode).fetchone()[0]
+            if mode.lower() != self.journal_mode.lower():
+                self.logger.warning('journal mode %s of database %s instead of %s' % (mode, self.fpath, self.journal_mode))
+
+            for k, v in self.PRAGMAS:
+                conn.execute('PRAGMA %s=%s' % (k, v))
+
+            for table, sql in self.tables:
+                conn.execute(sql)
+            conn.execute('CREATE TABLE IF NOT EXISTS schema_version (version INTEGER PRIMARY KEY, t_applied INTEGER, description TEXT)')
+            conn.commit()
+
+            self.__migrate__(conn)
+        except sqlite3.Error, e:
+            conn.close()
+            raise
+
+        self.logger.debug('opened database %s' % self.fpath)
+
+        self.conn = conn
+        return self.conn
+
+    def __migrate__(self, conn):
+        '''apply the migrations of a version above the schema version of the database'''
+
+        version = conn.execute('SELECT max(version) FROM schema_version').fetchone()[0] or 0
+
+        for v, description, statements in self.migrations:
+            if v <= version:
+                continue
+
+            ## the transaction is managed here, the sqlite3 module would commit before each CREATE statement
+            conn.isolation_level = None
+            try:
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    ## another writer may have applied the migration in the meantime
+                    if conn.execute('SELECT version FROM schema_version WHERE version=?', (v,)).fetchone() is None:
+                        for sql in statements:
+                            if callable(sql):
+                                sql(conn)
+                            else:
+                                conn.execute(sql)
+                        conn.execute('INSERT INTO schema_version VALUES (?,?,?)', (v, int(time.time()), description))
+                    conn.execute('COMMIT')
+                except sqlite3.Error, e:
+                    conn.execute('ROLLBACK')
+                    raise
+            finally:
+                conn.isolation_level = ''
+
+            self.logger.info('database %s migrated to schema version %d: %s' % (self.fpath, v, description))
+
+    def version(self):
+        '''schema version of the database, i.e. the version of the last migration applied'''
+        return self.connect().execute('SELECT max(version) FROM schema_version').fetchone()[0] or 0
+
+    def backfill(self):
+        '''fill the rollup tables from the rows of their tables, e.g. the rows written before the rollups'''
+
+        conn = self.connect()
+        for rollup in self.rollups:
+            n = rollup.backfill(conn)
+            self.logger.info('rollup tables of %s in database %s backfilled in %d transactions' % (rollup.table, self.fpath, n))
+
+    def stage(self, table, rows, sql=None):
+        '''add the rows to be inserted into the table by the next commit, sql is the INSERT statement
+           with a parameter per column; by default the rows give the values of all columns of the table'''
+
+        rows = list(rows)
+        if not rows:
+            return
+
+        if sql is None:
+            sql = 'INSERT INTO %s VALUES (%s)' % (table, ','.join(['?'] * len(rows[0])))
+
+        self.pending.append( (table, sql, rows) )
+
+    def commit(self):
+        '''write the staged rows in a single transaction, it returns True if they are committed'''
+
+        pending = self.pending
+        self.pending = []
+
+        if not pending:
+            return True
+
+        try:
+            conn = self.connect()
+        except sqlite3.Error, e:
+            self.logger.error('cannot open database %s: %s' % (self.fpath, repr(e)))
+            return False
+
+        try:
+            for table, sql, rows in pending:
+                conn.executemany(sql, rows)
+                self.logger.debug('%d rows staged into table %s' % (len(rows), table))
+
+            tables = set( map(lambda x:x[0], pending) )
+            for rollup in self.rollups:
+                if rollup.table in tables:
+                    rollup.update(conn, self.retention)
+            conn.commit()
+        except Exception, e:
+            self.logger.error('rollback of the transaction on database %s: %s' % (self.fpath, repr(e)))
+            conn.rollback()
+            return False
+
+        return True
+
+    def query(self, sql, params=()):
+        '''list of the rows returned by the SELECT statement sql'''
+        return self.connect().execute(sql, params).fetchall()
+
+    def close(self):
+        '''close the connection, the rows not yet committed are dropped'''
+
+        self.pending = []
+        if self.conn is not None:
+            self.conn.close()
+            self.conn = None
+
+def migrate_databases(fpaths, tables, migrations, rollups=(), journal_mode='wal', debug=False):
+    '''apply the migrations to existing databases, e.g. the yearly or monthly databases of the past,
+       and backfill their rollup tables; it returns the schema version by path, None for a database
+       that cannot be migrated'''
+
+    logger = getMyLogger(SQLiteStore.__name__)
+
+    versions = {}
+    for fpath in fpaths:
+        store = SQLiteStore(fpath, tables, migrations, rollups, journal_mode=journal_mode, debug=debug)
+        try:
+            versions[fpath] = store.version()
+            store.backfill()
+        except sqlite3.Error, e:
+            logger.error('cannot migrate database %s: %s' % (fpath, repr(e)))
+            versions[fpath] = None
+        finally:
+            store.close()
+
+    return versions
+
+class Rollup:
+    '''downsampled copies of a time-series table, e.g. rsrc, at the resolutions of RESOLUTIONS
+
+       The rollup table of a resolution, e.g. rsrc_5m, has a row per time bucket (timestamp is the
+       start of the bucket) and per series, i.e. per value of the key columns (e.g. host).  It holds
+       the number of samples in the bucket (nsamples), the last value of the label columns (e.g. stat)
+       and, for each value column, the mean under the name of the column, and the min., max. and last
+       value with the suffixes _min, _max and _last.
+
+       The tables are filled in SQL: the first resolution from the table itself and the other ones
+       from the resolution before, as the rows of the table are added in the order of time, update
+       recomputes only the latest bucket of each resolution.  The rows written before the rollup
+       tables are there are rolled up by backfill, a day per transaction.  The mean of a coarser resolution is the
+       mean of the buckets weighted by their nsamples, it is off for a column with NULL values.'''
+
+    ## name and length in seconds of the resolutions, from the finest to the coarsest; the raw rows are
+    ## taken to be a minute apart, the default interval of mm_trackTorque.py
+    RESOLUTIONS = [('5m', 300), ('1h', 3600), ('1d', 86400)]
+
+    def __init__(self, table, keys, values, labels=()):
+        self.table  = table
+        self.keys   = list(keys)      ## columns identifying a series besides timestamp
+        self.values = list(values)    ## numeric columns
+        self.labels = list(labels)    ## columns of which the last value is kept
+
+    def __table__(self, resolution):
+        '''name of the rollup table of the given resolution, the table itself for raw'''
+        if resolution == 'raw':
+            return self.table
+        return '%s_%s' % (self.table, resolution)
+
+    def __aggregate_sql__(self, resolution, where):
+        '''INSERT statement aggregating the rows of the resolution before (or the table) selected by where'''
+
+        names = [ r for r, l in self.RESOLUTIONS ]
+        i     = names.index(resolution)
+        src   = self.__table__( (['raw'] + names)[i] )
+        dst   = self.__table__( resolution )
+        span  = self.RESOLUTIONS[i][1]
+
+        cols = ['timestamp'] + self.keys + ['nsamples'] + self.labels
+        sels = ['a.t_bucket'] + [ 'a.%s' % k for k in self.keys ] + ['a.n'] + [ 's.%s' % k for k in self.labels ]
+        aggs = ['timestamp/%d*%d AS t_bucket' % (span, span)] + self.keys + ['max(timestamp) AS t_last']
+
+        if i == 0:
+            aggs.append('count(*) AS n')
+        else:
+            aggs.append('sum(nsamples) AS n')
+
+        for v in self.values:
+            cols += [ v, v + '_min', v + '_max', v + '_last' ]
+            sels += [ 'a.%s' % v, 'a.%s_min' % v, 'a.%s_max' % v ]
+            if i == 0:
+                sels.append( 's.%s' % v )
+                aggs.append( 'avg(%s) AS %s, min(%s) AS %s_min, max(%s) AS %s_max' % (v, v, v, v, v, v) )
+            else:
+                ## the mean is weighted by the number of samples of the bucket
+                sels.append( 's.%s_last' % v )
+                aggs.append( 'sum(%s*nsamples)/sum(CASE WHEN %s IS NULL THEN NULL ELSE nsamples END) AS %s, min(%s_min) AS %s_min, max(%s_max) AS %s_max' % (v, v, v, v, v, v, v) )
+
+        ## the last values are taken from the row of the latest timestamp in the bucket
+        join = ['s.timestamp = a.t_last'] + [ 's.%s = a.%s' % (k, k) for k in self.keys ]
+
+        return 'INSERT OR REPLACE INTO %s (%s) SELECT %s FROM (SELECT %s FROM %s WHERE %s GROUP BY %s) a JOIN %s s ON %s' % (
+                   dst, ','.join(cols), ','.join(sels), ','.join(aggs), src, where, ','.join(['t_bucket'] + self.keys), src, ' AND '.join(join))
+
+    def tables(self):
+        '''list of (table name, CREATE TABLE IF NOT EXISTS statement) of the rollup tables'''
+
+        l = []
+        for r, span in self.RESOLUTIONS:
+            cols  = [ 'timestamp INTEGER' ] + [ '%s TEXT' % k for k in self.keys ] + [ 'nsamples INTEGER' ] + [ '%s TEXT' % k for k in self.labels ]
+            for v in self.values:
+                cols += [ '%s REAL' % v, '%s_min REAL' % v, '%s_max REAL' % v, '%s_last REAL' % v ]
+            cols.append( 'UNIQUE (%s)' % ','.join(['timestamp'] + self.keys) )
+            l.append( (self.__table__(r), 'CREATE TABLE IF NOT EXISTS %s (%s)' % (self.__table__(r), ', '.join(cols))) )
+
+        return l
+
+    def backfill(self, conn, span=86400):
+        '''fill the rollup tables from all the rows of the table, span seconds (a multiple of the coarsest
+           resolution) per transaction, so that another writer waits for one of them at most; it returns
+           the number of transactions'''
+
+        t_min, t_max = conn.execute('SELECT min(timestamp), max(timestamp) FROM %s' % self.table).fetchone()
+        if t_min is None:
+            return 0
+
+        n = 0
+
+        ## the transactions are managed here, as in SQLiteStore.__migrate__
+        conn.isolation_level = None
+        try:
+            for t in xrange(t_min / span * span, t_max + 1, span):
+                conn.execute('BEGIN IMMEDIATE')
+                try:
+                    for r, l in self.RESOLUTIONS:
+                        conn.execute(self.__aggregate_sql__(r, 'timestamp >= %d AND timestamp < %d' % (t, t + span)))
+                    conn.execute('COMMIT')
+                except sqlite3.Error, e:
+                    conn.execute('ROLLBACK')
+                    raise
+                n += 1
+        finally:
+            conn.isolation_level = ''
+
+        return n
+
+    def update(self, conn, retention={}):
+        '''recompute the latest bucket of each resolution, and delete the rows older than the retention
+           (in days, by resolution or raw; 0 or missing keeps all rows) with respect to the latest row'''
+
+        t = conn.execute('SELECT max(timestamp) FROM %s' % self.table).fetchone()[0]
+        if t is None:
+            return
+
+        for r, span in self.RESOLUTIONS:
+            t_bucket = t / span * span
+            conn.execute(self.__aggregate_sql__(r, 'timestamp >= %d AND timestamp < %d' % (t_bucket, t_bucket + span)))
+
+        for r in ['raw'] + [ r for r, span in self.RESOLUTIONS ]:
+            days = retention.get(r, 0)
+            if days > 0:
+                conn.execute('DELETE FROM %s WHERE timestamp < ?' % self.__table__(r), (t - days * 86400,))
+
+def rollup_resolution(period, retention={}, max_points=2500):
+    '''the resolution (raw or one of Rollup.RESOLUTIONS) to query the data of the last period seconds:
+       the finest one giving at most max_points samples per series and keeping the rows of the period
+       given the retention (in days, by resolution or raw)'''
+
+    for r, span in [('raw', 60)] + Rollup.RESOLUTIONS:
+        days = retention.get(r, 0)
+        if period / span <= max_points and (days <= 0 or days * 86400 >= period):
+            return r
+
+    return Rollup.RESOLUTIONS[-1][0]